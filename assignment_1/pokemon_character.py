@@ -1,5 +1,13 @@
-import random
-import math
+import os
+import sys
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_core import RuleSet
+
+# rules of the battles: base stats, no type chart, critical hits and pps consumed
+rules = RuleSet("base", None, "speed", track_pps=True)
 
 class PokemonCharacter:
     """
@@ -66,38 +74,14 @@ class PokemonCharacter:
         - opponent_pokemon: PokemonCharacter object representing the pokemon that is being attacked.
         """
 
-        # get the selected move from the moves of the pokemin
-        move = None
-        for m in self.moves:
-            if m["name"] == move_name:
-                move = m
-                break
-
         # print some information about the move
         print(f"{self.name} used {move_name}!")
 
-        # reduce the power points (pp) of the move, independently of whether the move succeeds or not
-        self.curr_pps[move_name] -= 1
-
-        # the move succeeds with a probability equal to its accuracy
-        if random.random() < move["accuracy"]:
-
-            # compute the damage dealt by the move to the opponent pokemon
-            stability = 1.5 if move["type"] in self.types else 1.0
-            effect = 1
-            critical = 2 if random.random() < (self.base_stats["speed"] / 512) else 1
-            luck = random.uniform(0.85, 1.0)
-            modifier = stability * effect * critical * luck
-            attack = self.base_stats["attack"] if move["category"] == "physical" else self.base_stats["special"]
-            defense = opponent_pokemon.base_stats["defense"] if move["category"] == "physical" else opponent_pokemon.base_stats["special"]
-            damage = math.floor(((2 * self.level + 10) / 250 * (attack / defense) * move["power"] + 2) * modifier)
-
-            # apply the damage to the opponent pokemon
-            opponent_pokemon.curr_hp -= damage
+        # use the move with the rules of the assignment (see battle_core.py)
+        damage = rules.use_move(self, move_name, opponent_pokemon)
 
-            # print some information about the move
+        # print some information about the damage dealt, if the move succeeds
+        if damage is not None:
             print(f"The move dealt a damage of {damage} HP to {opponent_pokemon.name}.")
-        
-        # if the move fails, just print information
         else:
             print(f"{self.name}'s {move_name} missed!")
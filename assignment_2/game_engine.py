@@ -1,13 +1,40 @@
+import os
+import sys
 import random
 from pokemon_trainer import PokemonTrainer
-from pokemon_character import PokemonCharacter
-from pokemon_moves import moves
 from pokemon import starter_pokemon, wild_pokemon
-from utils import clear_terminal, type_text, choose_option
+from utils import clear_terminal, type_text, flush_output, ask_option, ask_text, run_steps, record
+from policies import RandomPolicy
+from savegame import save_game, load_game
+from registry import registry
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encounters import EncounterTable
+
+def encounter_table(weighted=False):
+    """
+    Builds the table sampling the wild pokemon in constant time.
+
+    Parameters:
+    - weighted: boolean, True to sample the wild pokemon with probabilities proportional to their encounter weights, False to sample them uniformly at random.
+
+    Returns:
+    - wild_encounters: EncounterTable object whose samples are the dictionaries of the wild pokemon.
+    """
+
+    return EncounterTable([{"pokemon": pokemon, "weight": pokemon.get("encounter_weight", 1) if weighted else 1} for pokemon in wild_pokemon])
+
+# table to sample the wild pokemon, uniformly at random by default (see main.py --weighted_encounters for their encounter weights)
+wild_encounters = encounter_table()
+
+# policy choosing the moves of the opponent pokemon, uniformly at random by default (see policies.make_policy for smarter ones)
+opponent_policy = RandomPolicy()
 
 def pokemon_from_dict(pokemon_info):
     """
-    Initializes a PokemonCharacter object from an input dictionary.
+    Initializes a PokemonCharacter object from an input dictionary, whose species is looked up by name in the registry.
 
     Parameters:
     - pokemon_info: dictionary that must have the following entries:
@@ -21,17 +48,8 @@ def pokemon_from_dict(pokemon_info):
     - pokemon: PokemonCharacter initialized with the input information.
     """
 
-    # initialize a PokemonCharacter with the input information
-    moves_dict = {move["name"]: move for move in moves}
-    pokemon = PokemonCharacter(
-        name=pokemon_info["name"],
-        national_pokedex_number=pokemon_info["national_pokedex_number"],
-        types=pokemon_info["types"],
-        base_stats=pokemon_info["base_stats"],
-        moves=[moves_dict[m] for m in pokemon_info["moves"]]
-    )
-
-    return pokemon
+    # initialize a PokemonCharacter referencing the shared records of the species and of its moves
+    return registry.new_pokemon(registry.species_record(pokemon_info["name"]))
 
 def initialize_pokemon_trainer():
     """
@@ -39,6 +57,7 @@ def initialize_pokemon_trainer():
     - a name chosen by the user;
     - a starter pokemon chosen by the user among Charmander, Squirtle and Bulbasaur;
     - 10 potions and 10 pokeballs as items.
+    It is a generator of the requests of input to the player (see utils.ask_option), to be run with yield from.
 
     Returns:
     - trainer: PokemonTrainer object representing the initialized pokemon trainer.
@@ -46,14 +65,14 @@ def initialize_pokemon_trainer():
 
     # ask the user (i.e., the pokemon trainer) to enter his name
     type_text("\nHello pokemon trainer! What is your name?\n")
-    trainer_name = input("> ")
+    trainer_name = yield from ask_text()
     clear_terminal()
     
     # create the pokemon trainer
     trainer = PokemonTrainer(trainer_name)
 
     # make the user choose the starter pokemon
-    starter_pokemon_choice = choose_option([pokemon["name"] for pokemon in starter_pokemon], f"Ok {trainer_name}, I want you to choose one of the following pokemon:")
+    starter_pokemon_choice = yield from ask_option([pokemon["name"] for pokemon in starter_pokemon], f"Ok {trainer_name}, I want you to choose one of the following pokemon:")
     clear_terminal()
 
     # create the starter pokemon and add it to the pokemon trainer's list
@@ -71,6 +90,7 @@ def initialize_pokemon_trainer():
 def attack(pokemon_trainer, opponent_pokemon):
     """
     The active pokemon of the pokemon trainer attacks the opponent pokemon.
+    It is a generator of the requests of input to the player (see utils.ask_option), to be run with yield from.
 
     Parameters:
     - pokemon_trainer: PokemonTrainer object representing the character that leads the battle.
@@ -88,7 +108,7 @@ def attack(pokemon_trainer, opponent_pokemon):
     # make the pokemon trainer choose a move that still has some pps
     possible_moves = [move_name for move_name, pp in pokemon_trainer.active_pokemon.curr_pps.items() if pp > 0]
     options = [f"{move_name} | {pp} PP" for move_name, pp in pokemon_trainer.active_pokemon.curr_pps.items() if pp > 0]
-    chosen_move = possible_moves[choose_option(options, question_sentence=f"Which move do you want {pokemon_trainer.active_pokemon.name} to use?")]
+    chosen_move = possible_moves[(yield from ask_option(options, f"Which move do you want {pokemon_trainer.active_pokemon.name} to use?"))]
 
     # make the active pokemon attack the opponent pokemon with the chosen move
     pokemon_trainer.active_pokemon.use_move(chosen_move, opponent_pokemon)
@@ -104,6 +124,7 @@ def attack(pokemon_trainer, opponent_pokemon):
 def use_item(pokemon_trainer, opponent_pokemon):
     """
     Makes the pokemon trainer choose an item among the available ones and applies it.
+    It is a generator of the requests of input to the player (see utils.ask_option), to be run with yield from.
 
     Parameters:
     - pokemon_trainer: PokemonTrainer object representing the character that leads the battle.
@@ -117,7 +138,7 @@ def use_item(pokemon_trainer, opponent_pokemon):
     # make the trainer choose which item has to be used
     items = [item_name for item_name in pokemon_trainer.items.keys()]
     options = [f"{item_name} | {quantity}" for item_name, quantity in pokemon_trainer.items.items()]
-    chosen_item = items[choose_option(options, "What item do you want to use?")]
+    chosen_item = items[(yield from ask_option(options, "What item do you want to use?"))]
 
     # apply a potion to the pokemon trainer's active pokemon
     if chosen_item == "potion":
@@ -172,6 +193,7 @@ def run_away(pokemon_trainer, opponent_pokemon):
 def change_pokemon(pokemon_trainer):
     """
     Changes the active pokemon during a battle.
+    It is a generator of the requests of input to the player (see utils.ask_option), to be run with yield from.
 
     Parameters:
     - pokemon_trainer: PokemonTrainer object representing the character that leads the battle.
@@ -186,7 +208,7 @@ def change_pokemon(pokemon_trainer):
     
     # there is at least a pokemon that can be used
     if available_pokemon:
-        chosen_pokemon = available_pokemon[choose_option(available_pokemon_to_display, "What pokemon do you want to become active?")]
+        chosen_pokemon = available_pokemon[(yield from ask_option(available_pokemon_to_display, "What pokemon do you want to become active?"))]
         pokemon_trainer.change_active_pokemon(chosen_pokemon)
         return True
     
@@ -199,6 +221,7 @@ def opponent_pokemon_turn(pokemon_trainer, opponent_pokemon):
     Makes the opponent pokemon attack the active pokemon of the trainer.
     If the trainer's active pokemon is defeated, then a new active pokemon is chosen in the trainer's list, if any.
     If there is no pokemon in the trainer's list that is not K.O., then True is returned.
+    It is a generator of the requests of input to the player (see utils.ask_option), to be run with yield from.
 
     Parameters:
     - pokemon_trainer: PokemonTrainer object representing the character that leads the battle.
@@ -216,8 +239,9 @@ def opponent_pokemon_turn(pokemon_trainer, opponent_pokemon):
         type_text(f"\nOh no! {opponent_pokemon.name} finished all the PPs!\n")
         return False
 
-    # make the opponent pokemon attack the trainer's active pokemon with a move sampled uniformly at random among the available ones
-    opponent_pokemon.use_move(random.choice([move_name for move_name, pp in opponent_pokemon.curr_pps.items() if pp > 0]), pokemon_trainer.active_pokemon)
+    # make the opponent pokemon attack the trainer's active pokemon with a move chosen by the opponent policy among the available ones
+    available_moves = [move_name for move_name, pp in opponent_pokemon.curr_pps.items() if pp > 0]
+    opponent_pokemon.use_move(opponent_policy.choose(opponent_pokemon, pokemon_trainer.active_pokemon, available_moves), pokemon_trainer.active_pokemon)
     
     # check whether the trainer's active pokemon is defeated
     if pokemon_trainer.active_pokemon.curr_hp <= 0:
@@ -226,7 +250,7 @@ def opponent_pokemon_turn(pokemon_trainer, opponent_pokemon):
         type_text(f"\n{pokemon_trainer.active_pokemon.name} is defeated!\n")
 
         # if all trainer's pokemon are defeated, then the battle ends and the pokemon trainer has to go to the pokemon center
-        if not change_pokemon(pokemon_trainer):
+        if not (yield from change_pokemon(pokemon_trainer)):
             type_text(f"\nAll {pokemon_trainer.name}'s pokemon are K.O., so {pokemon_trainer.name} loses the battle!\n")
             return True
     
@@ -266,9 +290,13 @@ def check_pps(pokemon_trainer, opponent_pokemon):
 def battle(pokemon_trainer, opponent_pokemon):
     """
     Runs a battle against an opponent pokemon.
+    It is a generator of the requests of input to the player (see utils.ask_option), to be run with yield from.
 
     Parameter:
     - pokemon_trainer: PokemonTrainer object representing the character that leads the battle.
+
+    Returns:
+    - outcome: string with the outcome of the battle: "win", "caught", "escaped", "lost" or "no_pps".
     """
 
     # options among which the pokemon trainer has to choose during an iteration of the battle
@@ -288,16 +316,16 @@ def battle(pokemon_trainer, opponent_pokemon):
 
         # make the pokemon trainer choose what to do in this iteration
         type_text(f"\nIt's the turn of {pokemon_trainer.active_pokemon.name}.\n")
-        choice_id = choose_option(options)
+        choice_id = yield from ask_option(options)
 
         # the pokemon trainer decides to attack
         if choice_id == 0:
-            if attack(pokemon_trainer, opponent_pokemon):
-                return                                      # the battle ends, because the opponent pokemon is defeated
+            if (yield from attack(pokemon_trainer, opponent_pokemon)):
+                return "win"                                # the battle ends, because the opponent pokemon is defeated
 
         # the pokemon trainer wants to change the active pokemon
         elif choice_id == 1:
-            if not change_pokemon(pokemon_trainer):
+            if not (yield from change_pokemon(pokemon_trainer)):
                 continue                                    # the change cannot be done, because the active pokemon is the only pokemon left, so the user must choose another option
         
         # the pokemon trainer wants to use an item
@@ -309,26 +337,25 @@ def battle(pokemon_trainer, opponent_pokemon):
                 continue                                  # the user needs to select another action, because it is not possible to use items
 
             # make the user choose an item and use it
-            if use_item(pokemon_trainer, opponent_pokemon):
-                return                                    # the battle ends, because the opponent pokemon has been catched
+            if (yield from use_item(pokemon_trainer, opponent_pokemon)):
+                return "caught"                           # the battle ends, because the opponent pokemon has been catched
         
         # the pokemon trainer wants to run away
         elif choice_id == 3:
             if run_away(pokemon_trainer, opponent_pokemon):
-                return                                    # the battle ends, becasue the pokemon trainer has run away
+                return "escaped"                          # the battle ends, becasue the pokemon trainer has run away
 
         # make the opponent pokemon attack the trainer's active pokemon with a move sampled uniformly at random among the available ones
-        if opponent_pokemon_turn(pokemon_trainer, opponent_pokemon):
+        if (yield from opponent_pokemon_turn(pokemon_trainer, opponent_pokemon)):
             
             # the pokemon trainer goes to the pokemon center since all trainer's pokemon are K.O.
             pokemon_center_action(pokemon_trainer)
             
-            return                                        # the battle ends, because the trainer's pokemon are K.O.
+            return "lost"                                 # the battle ends, because the trainer's pokemon are K.O.
 
         # check whether all trainer's pokemon as well as the wild pokemon have all moves with pps that are finished
         if check_pps(pokemon_trainer, opponent_pokemon):
-            print("..")
-            return                                        # the battle ends, because all trainer's pokemon and the wild pokemon have no more pps
+            return "no_pps"                               # the battle ends, because all trainer's pokemon and the wild pokemon have no more pps
 
         # update the round number
         round += 1
@@ -336,9 +363,13 @@ def battle(pokemon_trainer, opponent_pokemon):
 def explore_action(pokemon_trainer):
     """
     Makes the pokemon trainer explore the world, with a given probability of finding a wild pokemon opponent.
+    It is a generator of the requests of input to the player (see utils.ask_option), to be run with yield from.
 
     Parameter:
     - pokemon_trainer: PokemonTrainer object representing the character that takes the action.
+
+    Returns:
+    - outcome: string with the outcome of the battle (see battle), or None if no wild pokemon has been encountered.
     """
 
     # probability of finding a wild pokemon
@@ -353,18 +384,22 @@ def explore_action(pokemon_trainer):
     # a wild pokemon has been encountered
     if random.random() <= 0.8:
         
-        # sample uniformly at random a wild pokemon among the loaded ones
-        sampled_pokemon = pokemon_from_dict(random.choice(wild_pokemon))
+        # sample a wild pokemon among the loaded ones
+        sampled_pokemon, _ = wild_encounters.sample()
+        sampled_pokemon = pokemon_from_dict(sampled_pokemon)
+        record("encounter", sampled_pokemon.national_pokedex_number)
 
         # print some information
         type_text(f"A wild {sampled_pokemon.name} appears!\n")
 
         # start a battle against the sampled wild pokemon
-        battle(pokemon_trainer, sampled_pokemon)
+        return (yield from battle(pokemon_trainer, sampled_pokemon))
     
     # no wild pokemon has been encounterd
     else:
+        record("encounter", 0)
         type_text("There is no wild pokemon around.\n")
+        return None
 
 def pokemon_center_action(pokemon_trainer):
     """
@@ -380,15 +415,9 @@ def pokemon_center_action(pokemon_trainer):
     type_text(" ...", delay=0.5)
     type_text("\n")
 
-    # restore the hp of every pokemon in the pokemon trainer's list
+    # restore the hp and the pp of every pokemon in the pokemon trainer's list
     for pokemon in pokemon_trainer.pokemon_list:
-        pokemon.curr_hp = pokemon.base_stats["hp"]
-    
-    # restore the pp of every move of each pokemon
-    for pokemon in pokemon_trainer.pokemon_list:
-        for move in pokemon.moves:
-            move_name = move["name"]
-            pokemon.curr_pps[move_name] = move["pp"]
+        pokemon.restore()
 
     # print some information
     type_text("\nAll your pokemon are restored.\n\nHope not to see you soon!\n")
@@ -423,13 +452,26 @@ def pokemon_store_action(pokemon_trainer):
     # print some information
     type_text("\nThank you for purchasing! See you soon!\n")
 
-def run_game():
+def game_steps(save_path=None):
     """
-    Runs the game.
+    Runs the game as a generator of the requests of input to the player, so that it can be driven by the standard input (see run_game)
+    or by a non-blocking server (see game_server.py).
+
+    Parameters:
+    - save_path: string with the path of the file where the game is saved when the player quits, and from which it is restored if it exists, or None not to save it.
+
+    Returns:
+    - stats: dictionary with the number of actions of each kind and of battles with each outcome in the session.
     """
 
-    # initialize the pokemon trainer
-    trainer = initialize_pokemon_trainer()
+    # restore the saved pokemon trainer, or initialize a new one
+    if save_path is not None and os.path.exists(save_path):
+        trainer = load_game(save_path)
+    else:
+        trainer = yield from initialize_pokemon_trainer()
+
+    # statistics of the session
+    stats = {"actions": 0, "explorations": 0, "encounters": 0, "win": 0, "caught": 0, "escaped": 0, "lost": 0, "no_pps": 0, "center": 0, "store": 0}
 
     # print a welcome message
     type_text(f"\nWelcome to the Pokemon World, {trainer.name}!\n")
@@ -441,15 +483,43 @@ def run_game():
     while True:
 
         # make the player choose the next action
-        chosen_id = choose_option(actions)
+        chosen_id = yield from ask_option(actions)
 
         # run the action selected by the user
+        stats["actions"] += 1
         if chosen_id == 0:
-            explore_action(trainer)
+            outcome = yield from explore_action(trainer)
+            stats["explorations"] += 1
+            if outcome is not None:
+                stats["encounters"] += 1
+                stats[outcome] += 1
         elif chosen_id == 1:
             pokemon_center_action(trainer)
+            stats["center"] += 1
         elif chosen_id == 2:
             pokemon_store_action(trainer)
+            stats["store"] += 1
         elif chosen_id == 3:
+            if save_path is not None:
+                save_game(trainer, save_path)
+                type_text(f"\nThe game has been saved to {save_path}.")
             type_text("\nThe game has been successfully closed. Thank you for playing!\n")
             break
+
+    # show the last frame
+    flush_output()
+
+    return stats
+
+def run_game(save_path=None):
+    """
+    Runs the game, reading the decisions of the player from the standard input or from the agent, if any (see utils.set_agent).
+
+    Parameters:
+    - save_path: see game_steps.
+
+    Returns:
+    - stats: see game_steps.
+    """
+
+    return run_steps(game_steps(save_path))
@@ -0,0 +1,362 @@
+import io
+import re
+import time
+import random
+import asyncio
+import argparse
+import utils
+from utils import Renderer, set_renderer
+from game_engine import game_steps
+from headless_driver import ScriptedAgent
+
+# line sent after the output of a step when the server waits for the input of the player
+PROMPT = "> \n"
+
+# line of an option in the output of the game, e.g., "0: Explore"
+option_pattern = re.compile(r"^(\d+): (.*)$")
+
+class GameSession:
+    """
+    Session of the game of a player connected to the server, advanced one step at a time: each line typed by the player runs the game up to its next request of input.
+    A session only keeps the generator of the game (see game_engine.game_steps), its pending request and a buffer of output.
+    """
+
+    def __init__(self):
+        """
+        A GameSession is initialized with a new game, not started yet.
+        """
+
+        self.output = io.StringIO()
+        self.renderer = Renderer(self.output)
+        self.steps = game_steps()
+        self.request = None
+        self.stats = None
+
+    @property
+    def finished(self):
+        """
+        Whether the game of the session is over.
+        """
+
+        return self.stats is not None
+
+    def take_output(self):
+        """
+        Returns the output produced since the last call and empties the buffer.
+
+        Returns:
+        - text: string with the output.
+        """
+
+        text = self.output.getvalue()
+        self.output.seek(0)
+        self.output.truncate()
+        return text
+
+    def advance(self, answer=None):
+        """
+        Runs the game up to its next request of input, with the output sent to the session.
+        The renderer of the game is swapped only for the duration of the step, which never blocks, so that sessions can share the event loop.
+
+        Parameters:
+        - answer: answer to the pending request, or None to start the game.
+
+        Returns:
+        - text: string with the output of the step, including the question and options of the next request.
+        """
+
+        previous_renderer = utils.renderer
+        set_renderer(self.renderer)
+        try:
+            self.request = next(self.steps) if self.request is None else self.steps.send(answer)
+            self.show_request()
+        except StopIteration as stop:
+            self.stats = stop.value
+            self.request = None
+        finally:
+            set_renderer(previous_renderer)
+        return self.take_output()
+
+    def show_request(self):
+        """
+        Shows the question and options of the pending request, as choose_option does.
+        """
+
+        if self.request[0] == "option":
+            self.renderer.write(f"\n{self.request[2]}\n")
+            self.show_options()
+
+    def show_options(self):
+        """
+        Shows the options of the pending request.
+        """
+
+        for i, option in enumerate(self.request[1]):
+            self.renderer.write(f"{i}: {option}\n")
+
+    def start(self):
+        """
+        Starts the game.
+
+        Returns:
+        - text: string with the output up to the first request of input.
+        """
+
+        return self.advance()
+
+    def handle_line(self, line):
+        """
+        Answers the pending request with a line typed by the player, asking again if it is not a valid option.
+
+        Parameters:
+        - line: string with the line, without the final newline.
+
+        Returns:
+        - text: string with the output of the step.
+        """
+
+        # lines of text are answered as they are
+        if self.request[0] == "text":
+            return self.advance(line)
+
+        # options must be one of the displayed numbers
+        try:
+            choice_id = int(line)
+        except ValueError:
+            choice_id = -1
+        if not 0 <= choice_id < len(self.request[1]):
+            self.renderer.write("\nInvalid choice. Please, choose one of the numbers displayed for the options:\n")
+            self.show_options()
+            self.renderer.flush()
+            return self.take_output()
+        return self.advance(choice_id)
+
+class GameServer:
+    """
+    Server running many game sessions on a single event loop, one per connection, with a line protocol:
+    the server sends the output of the game followed by the prompt line "> " when it waits for a line of input, and closes the connection when the game is over.
+    """
+
+    def __init__(self, max_sessions=1000, idle_timeout=600.0):
+        """
+        A GameServer is initialized with no session.
+
+        Parameters:
+        - max_sessions: integer with the maximum number of simultaneous sessions.
+        - idle_timeout: float with the number of seconds without input after which a session is closed.
+        """
+
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.n_active = 0
+        self.n_sessions = 0
+        self.n_steps = 0
+        self.step_seconds = 0.0
+
+    def step(self, session, line=None):
+        """
+        Runs a step of a session, keeping track of the time spent in the steps.
+
+        Parameters:
+        - session: GameSession object.
+        - line: string with the line typed by the player, or None to start the game.
+
+        Returns:
+        - text: string with the output of the step.
+        """
+
+        start_time = time.perf_counter()
+        text = session.start() if line is None else session.handle_line(line)
+        self.step_seconds += time.perf_counter() - start_time
+        self.n_steps += 1
+        return text
+
+    def stats(self):
+        """
+        Returns the statistics of the server.
+
+        Returns:
+        - stats: dictionary with the number of active and served sessions, of steps and the mean time of a step in milliseconds.
+        """
+
+        return {"active": self.n_active, "sessions": self.n_sessions, "steps": self.n_steps, "step_ms": self.step_seconds / max(self.n_steps, 1) * 1000}
+
+    async def handle_client(self, reader, writer):
+        """
+        Serves a player, running the steps of the game with the lines the player sends.
+
+        Parameters:
+        - reader: asyncio StreamReader of the connection.
+        - writer: asyncio StreamWriter of the connection.
+        """
+
+        # refuse the connection if the server is full
+        if self.n_active >= self.max_sessions:
+            writer.write(b"The server is full, please try again later.\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        self.n_active += 1
+        self.n_sessions += 1
+        try:
+            session = GameSession()
+            text = self.step(session)
+            while True:
+                writer.write((text + ("" if session.finished else PROMPT)).encode())
+                await writer.drain()
+                if session.finished:
+                    break
+                line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                if not line:
+                    break
+                text = self.step(session, line.decode(errors="replace").strip())
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.n_active -= 1
+            writer.close()
+
+async def serve(server, host="127.0.0.1", port=8766, unix_socket=None):
+    """
+    Runs the server until it is interrupted.
+
+    Parameters:
+    - server: GameServer object.
+    - host: string with the local address to listen on.
+    - port: integer with the port to listen on.
+    - unix_socket: path to a UNIX socket to listen on instead of host and port.
+    """
+
+    if unix_socket is not None:
+        listener = await asyncio.start_unix_server(server.handle_client, path=unix_socket, backlog=server.max_sessions)
+    else:
+        listener = await asyncio.start_server(server.handle_client, host, port, backlog=server.max_sessions)
+    print(f"Game server listening on {unix_socket if unix_socket is not None else f'{host}:{port}'}")
+    async with listener:
+        await listener.serve_forever()
+
+async def play_client(agent, think_time=0.0, host="127.0.0.1", port=8766, unix_socket=None):
+    """
+    Stand-in for a player: plays a session on a running server with the decisions of an agent, reading the options from the output of the game.
+
+    Parameters:
+    - agent: agent object, e.g., headless_driver.ScriptedAgent (see utils.set_agent).
+    - think_time: float with the mean number of seconds that the player waits before answering, drawn from an exponential distribution.
+    - host: string with the address of the server.
+    - port: integer with the port of the server.
+    - unix_socket: path to the UNIX socket of the server, used instead of host and port.
+
+    Returns:
+    - latencies: list of floats with the seconds between each line sent and the following prompt.
+    """
+
+    # connect to the server
+    if unix_socket is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_socket)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    latencies = []
+    lines = []
+    sent_time = None
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            line = line.decode()
+
+            # collect the output up to the prompt
+            if line != PROMPT:
+                lines.append(line.rstrip("\n"))
+                continue
+            if sent_time is not None:
+                latencies.append(time.perf_counter() - sent_time)
+
+            # find the question and the options at the end of the output
+            options = []
+            while lines and option_pattern.match(lines[-1]):
+                options.insert(0, option_pattern.match(lines.pop()).group(2))
+            question_sentence = lines[-1] if lines else ""
+            lines = []
+
+            # answer with the agent, after thinking
+            if think_time > 0:
+                await asyncio.sleep(agent.rng.expovariate(1 / think_time))
+            answer = agent.choose_option(options, question_sentence) if options else agent.read_text()
+            writer.write(f"{answer}\n".encode())
+            await writer.drain()
+            sent_time = time.perf_counter()
+    finally:
+        writer.close()
+
+    return latencies
+
+async def run_test_clients(n_clients, max_actions, think_time=0.0, random_seed=27, host="127.0.0.1", port=8766, unix_socket=None):
+    """
+    Plays many sessions at the same time on a running server and measures the latency of its answers.
+
+    Parameters:
+    - n_clients: integer with the number of simultaneous sessions.
+    - max_actions: integer with the number of actions of the main menu after which each agent quits.
+    - think_time: see play_client.
+    - random_seed: integer with the random seed of the agents.
+    - host, port, unix_socket: see play_client.
+
+    Returns:
+    - latencies: list of floats with the latencies of all the sessions, in seconds.
+    """
+
+    rng = random.Random(random_seed)
+    results = await asyncio.gather(*[play_client(ScriptedAgent(rng.getrandbits(32), max_actions), think_time, host, port, unix_socket) for _ in range(n_clients)])
+    return [latency for latencies in results for latency in latencies]
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Runs a server hosting many game sessions at once over a line protocol, or test clients playing on it.")
+
+    # arguments
+    parser.add_argument("--host", type=str, required=False, default="127.0.0.1", help="Local address to listen on, or of the server for the test clients.")
+    parser.add_argument("--port", type=int, required=False, default=8766, help="Port to listen on, or of the server for the test clients.")
+    parser.add_argument("--unix_socket", type=str, required=False, default=None, help="Path to a UNIX socket to use instead of host and port.")
+    parser.add_argument("--max_sessions", type=int, required=False, default=1000, help="Maximum number of simultaneous sessions.")
+    parser.add_argument("--idle_timeout", type=float, required=False, default=600.0, help="Number of seconds without input after which a session is closed.")
+    parser.add_argument("--random_seed", type=int, required=False, default=None, help="Random seed of the games of the server, or of the agents of the test clients.")
+    parser.add_argument("--test_clients", type=int, required=False, default=0, help="Number of simultaneous test clients to run against a running server, instead of running the server.")
+    parser.add_argument("--max_actions", type=int, required=False, default=50, help="Number of actions of the main menu after which a test client quits.")
+    parser.add_argument("--think_time", type=float, required=False, default=0.0, help="Mean number of seconds that a test client waits before answering.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # play with the test clients and print the latencies
+    if args.test_clients > 0:
+        start_time = time.perf_counter()
+        latencies = sorted(asyncio.run(run_test_clients(args.test_clients, args.max_actions, args.think_time, 27 if args.random_seed is None else args.random_seed, args.host, args.port, args.unix_socket)))
+        elapsed = time.perf_counter() - start_time
+        print(f"{args.test_clients} sessions, {len(latencies)} steps in {elapsed:.2f} s ({len(latencies) / elapsed:.0f} steps/s)")
+        print(f"latency: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms | p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms | max {latencies[-1] * 1000:.2f} ms")
+
+    # run the server
+    else:
+        if args.random_seed is not None:
+            random.seed(args.random_seed)
+        server = GameServer(args.max_sessions, args.idle_timeout)
+        try:
+            asyncio.run(serve(server, args.host, args.port, args.unix_socket))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(server.stats())
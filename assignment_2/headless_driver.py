@@ -0,0 +1,262 @@
+import io
+import time
+import random
+import argparse
+from game_engine import run_game
+from utils import set_headless, set_agent
+
+class SessionAborted(Exception):
+    """
+    Exception raised by an agent when a session takes more decisions than allowed, e.g., because the game is stuck.
+    """
+
+class RandomAgent:
+    """
+    Agent choosing every option uniformly at random, quitting the game after a given number of actions.
+    """
+
+    def __init__(self, seed=0, max_actions=50, max_decisions=10000):
+        """
+        A RandomAgent is initialized with its own random generator, so that its choices do not change the draws of the game.
+
+        Parameters:
+        - seed: integer with the seed of the random generator of the agent.
+        - max_actions: integer with the number of actions of the main menu after which the agent quits.
+        - max_decisions: integer with the maximum number of decisions of a session, after which SessionAborted is raised.
+        """
+
+        self.rng = random.Random(seed)
+        self.max_actions = max_actions
+        self.max_decisions = max_decisions
+        self.n_actions = 0
+        self.n_decisions = 0
+
+    def read_text(self):
+        """
+        Returns the name of the trainer.
+
+        Returns:
+        - text: string with the name.
+        """
+
+        return "Agent"
+
+    def choose_option(self, options, question_sentence):
+        """
+        Chooses an option. See utils.choose_option.
+
+        Parameters:
+        - options: list of strings with the options.
+        - question_sentence: string with the question.
+
+        Returns:
+        - choice_id: integer with the index of the chosen option.
+        """
+
+        # stop sessions that never end
+        self.n_decisions += 1
+        if self.n_decisions > self.max_decisions:
+            raise SessionAborted(f"More than {self.max_decisions} decisions in a session.")
+
+        # quit after max_actions actions of the main menu
+        if options[-1] == "Quit":
+            self.n_actions += 1
+            if self.n_actions > self.max_actions:
+                return len(options) - 1
+            return self.choose_action(options)
+
+        return self.choose(options, question_sentence)
+
+    def choose_action(self, options):
+        """
+        Chooses an action of the main menu other than quitting.
+
+        Parameters:
+        - options: list of strings with the actions.
+
+        Returns:
+        - choice_id: integer with the index of the chosen action.
+        """
+
+        return self.rng.randrange(len(options) - 1)
+
+    def choose(self, options, question_sentence):
+        """
+        Chooses an option of any other question.
+
+        Parameters:
+        - options: list of strings with the options.
+        - question_sentence: string with the question.
+
+        Returns:
+        - choice_id: integer with the index of the chosen option.
+        """
+
+        return self.rng.randrange(len(options))
+
+class ScriptedAgent(RandomAgent):
+    """
+    Agent playing like a careful player: it mostly explores, goes to the center and to the store regularly, attacks with the move with most pps left,
+    gives potions, tries to catch wild pokemon and sends out the healthiest pokemon.
+    """
+
+    def __init__(self, seed=0, max_actions=50, max_decisions=10000, starter=None, center_every=5, store_every=10, item_probability=0.1, catch_probability=0.5):
+        """
+        A ScriptedAgent is initialized with its habits.
+
+        Parameters:
+        - seed, max_actions, max_decisions: see RandomAgent.
+        - starter: integer with the index of the starter pokemon to choose, or None to choose it at random.
+        - center_every: integer with the number of explorations between two visits to the pokemon center.
+        - store_every: integer with the number of explorations between two visits to the pokemon store.
+        - item_probability: float with the probability of using an item instead of attacking.
+        - catch_probability: float with the probability that the item used is a pokeball rather than a potion.
+        """
+
+        super().__init__(seed, max_actions, max_decisions)
+        self.starter = starter
+        self.center_every = center_every
+        self.store_every = store_every
+        self.item_probability = item_probability
+        self.catch_probability = catch_probability
+        self.explorations_since_center = 0
+        self.explorations_since_store = 0
+
+    def choose_action(self, options):
+        """
+        Chooses an action of the main menu other than quitting. See RandomAgent.choose_action.
+        """
+
+        # visit the center and the store regularly, explore otherwise
+        if self.explorations_since_center >= self.center_every:
+            self.explorations_since_center = 0
+            return 1
+        if self.explorations_since_store >= self.store_every:
+            self.explorations_since_store = 0
+            return 2
+        self.explorations_since_center += 1
+        self.explorations_since_store += 1
+        return 0
+
+    def choose(self, options, question_sentence):
+        """
+        Chooses an option of any other question. See RandomAgent.choose.
+        """
+
+        # starter pokemon
+        if question_sentence.startswith("Ok ") and self.starter is not None:
+            return self.starter
+
+        # battle menu: attack, sometimes use an item, never change pokemon voluntarily nor run away
+        if options[0] == "Attack":
+            return 2 if self.rng.random() < self.item_probability else 0
+
+        # move with most pps left, from options "move | pps PP"
+        if question_sentence.startswith("Which move"):
+            return max(range(len(options)), key=lambda i: int(options[i].split(" | ")[1].split()[0]))
+
+        # pokeball or potion, from options "item | quantity"
+        if question_sentence.startswith("What item"):
+            items = [option.split(" | ")[0] for option in options]
+            wanted = "pokeball" if self.rng.random() < self.catch_probability else "potion"
+            return items.index(wanted) if wanted in items else 0
+
+        # healthiest pokemon, from options "pokemon | hp HP"
+        if question_sentence.startswith("What pokemon"):
+            return max(range(len(options)), key=lambda i: int(options[i].split(" | ")[1].split()[0]))
+
+        return super().choose(options, question_sentence)
+
+def run_sessions(n_sessions, make_agent, random_seed=27, keep_output=False):
+    """
+    Runs complete game sessions with the decisions taken by agents, with no output and no delays.
+
+    Parameters:
+    - n_sessions: integer with the number of sessions.
+    - make_agent: function (session_seed) -> agent, building the agent of a session.
+    - random_seed: integer with the random seed of the sessions.
+    - keep_output: boolean indicating whether to keep the text of each session, that is otherwise discarded.
+
+    Returns:
+    - sessions: list of dictionaries with the statistics of each session, as returned by run_game, plus its seed, its duration and whether it has been aborted.
+    """
+
+    rng = random.Random(random_seed)
+    sessions = []
+    try:
+        for _ in range(n_sessions):
+
+            # seed the game and its agent
+            session_seed = rng.getrandbits(32)
+            random.seed(session_seed)
+            buffer = io.StringIO() if keep_output else None
+            set_headless(True, buffer)
+            set_agent(make_agent(session_seed))
+
+            # play the session
+            start_time = time.perf_counter()
+            try:
+                stats = run_game()
+                aborted = False
+            except SessionAborted:
+                stats = {}
+                aborted = True
+            sessions.append({"seed": session_seed, "aborted": aborted, "seconds": time.perf_counter() - start_time, **stats, **({"output": buffer.getvalue()} if keep_output else {})})
+    finally:
+        set_agent(None)
+        set_headless(False)
+
+    return sessions
+
+def aggregate(sessions):
+    """
+    Aggregates the statistics of the sessions.
+
+    Parameters:
+    - sessions: list of dictionaries returned by run_sessions.
+
+    Returns:
+    - totals: dictionary with the total of each statistic, the number of aborted sessions and the number of sessions per second.
+    """
+
+    totals = {"sessions": len(sessions), "aborted": sum(session["aborted"] for session in sessions)}
+    for session in sessions:
+        for key, value in session.items():
+            if key not in ["seed", "aborted", "seconds", "output"]:
+                totals[key] = totals.get(key, 0) + value
+    totals["sessions_per_second"] = len(sessions) / max(sum(session["seconds"] for session in sessions), 1e-9)
+    return totals
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Plays complete game sessions with scripted agents instead of the keyboard, with no output.")
+
+    # arguments
+    parser.add_argument("--n_sessions", type=int, required=False, default=1000, help="Number of sessions.")
+    parser.add_argument("--agent", type=str, required=False, default="scripted", choices=["random", "scripted"], help="Agent taking the decisions.")
+    parser.add_argument("--max_actions", type=int, required=False, default=50, help="Number of actions of the main menu after which the agent quits.")
+    parser.add_argument("--max_decisions", type=int, required=False, default=10000, help="Maximum number of decisions of a session, after which it is aborted.")
+    parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed of the sessions.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # play the sessions
+    agent_class = ScriptedAgent if args.agent == "scripted" else RandomAgent
+    sessions = run_sessions(args.n_sessions, lambda seed: agent_class(seed, args.max_actions, args.max_decisions), args.random_seed)
+
+    # print the aggregate statistics
+    totals = aggregate(sessions)
+    for key, value in totals.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
@@ -1,4 +1,56 @@
+import sys
+import argparse
+import game_engine
 from game_engine import run_game
+from policies import ExpectedDamageTable, make_policy
+from utils import Renderer, set_renderer
+from session_recording import record_session
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Runs the pokemon game.")
+
+    # arguments
+    parser.add_argument("--opponent_policy", type=str, required=False, default="random", choices=["random", "greedy", "epsilon_greedy", "softmax", "search"], help="Policy choosing the moves of the opponent pokemons.")
+    parser.add_argument("--weighted_encounters", action="store_true", help="Encounter the wild pokemons with probabilities proportional to their encounter weights, instead of uniformly at random.")
+    parser.add_argument("--search_time", type=float, required=False, default=0.05, help="Maximum number of seconds of a decision of the \"search\" policy.")
+    parser.add_argument("--save_file", type=str, required=False, default=None, help="File where the game is saved when quitting, and from which it is restored if it exists.")
+    parser.add_argument("--record", type=str, required=False, default=None, help="File where the seed and the decisions of a new game are recorded, to replay it with session_recording.py.")
+    parser.add_argument("--typewriter", action="store_true", help="Write the text one character at a time, with pauses, if the output is a terminal.")
+
+    # a recorded game starts from scratch and with random opponents encountered uniformly, to be replayed exactly
+    args = parser.parse_args()
+    if args.record is not None and (args.save_file is not None or args.opponent_policy != "random" or args.weighted_encounters):
+        parser.error("--record requires a new game with the random opponent policy and uniform encounters.")
+
+    return args
 
 if __name__ == '__main__':
-    run_game()
+
+    # parse command line arguments
+    args = parse_args()
+
+    # set the policy of the opponent pokemons
+    if args.opponent_policy != "random":
+        game_engine.opponent_policy = make_policy(args.opponent_policy, ExpectedDamageTable(), time_budget=args.search_time)
+
+    # set the distribution of the wild pokemons
+    if args.weighted_encounters:
+        game_engine.wild_encounters = game_engine.encounter_table(weighted=True)
+
+    # set the rendering mode
+    if args.typewriter:
+        set_renderer(Renderer(sys.stdout, typewriter=True))
+
+    # play, recording the game if requested
+    if args.record is not None:
+        record_session(args.record)
+    else:
+        run_game(args.save_file)
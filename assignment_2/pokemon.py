@@ -30,6 +30,7 @@ wild_pokemon = [
         "name": "Caterpie",
         "types": ["bug"],
         "base_stats": {"hp": 45, "attack": 30, "defense": 35, "speed": 45, "special": 20},
+        "encounter_weight": 30,
         "moves" : ["twineedle"]  
     },
 
@@ -38,6 +39,7 @@ wild_pokemon = [
         "name": "Pidgey",
         "types": ["normal", "flying"],
         "base_stats": {"hp": 40, "attack": 45, "defense": 40, "speed": 56, "special": 35},
+        "encounter_weight": 40,
         "moves" : ["tackle", "peck"]
     },
 
@@ -46,6 +48,7 @@ wild_pokemon = [
         "name": "Rattata",
         "types": ["normal"],
         "base_stats": {"hp": 30, "attack": 56, "defense": 35, "speed": 72, "special": 25},
+        "encounter_weight": 30,
         "moves" : ["tackle"]
     }
 ]
\ No newline at end of file
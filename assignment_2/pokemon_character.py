@@ -1,13 +1,24 @@
-import random
-import math
+import os
+import sys
 from utils import type_text
 
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_core import RuleSet
+
+# rules of the battles: base stats, no type chart, critical hits and pps consumed
+rules = RuleSet("base", None, "speed", track_pps=True)
+
 class PokemonCharacter:
     """
     Class to represent a pokemon in the pokemon game.
     """
 
-    def __init__(self, name, base_stats, moves, national_pokedex_number, types=["normal"]):
+    # attributes of a pokemon, stored without a per-object dictionary to keep live pokemon small
+    __slots__ = ["name", "national_pokedex_number", "level", "types", "base_stats", "curr_hp", "moves", "max_pps", "curr_pps"]
+
+    def __init__(self, name, base_stats, moves, national_pokedex_number, types=["normal"], max_pps=None):
         """
         A pokemon character is initialized by setting the parameters below.
 
@@ -30,6 +41,7 @@ class PokemonCharacter:
                  - "pp": integer with the maximum number of times that the move can be used.
         - national_pokedex_number: integer with the national pokedex number of the pokemon.
         - types: list with the types of the pokemon. By default, the pokemon is of type "normal".
+        - max_pps: dictionary with the maximum pp of each move, by name, shared with other pokemon (see registry.py), or None to build it from moves.
         """
 
         # name of the pokemon
@@ -54,9 +66,16 @@ class PokemonCharacter:
         self.moves = moves
 
         # initialize the PP of the moves to the maximum
-        self.curr_pps = {}
-        for move in self.moves:
-            self.curr_pps[move["name"]] = move["pp"]
+        self.max_pps = {move["name"]: move["pp"] for move in self.moves} if max_pps is None else max_pps
+        self.curr_pps = dict(self.max_pps)
+
+    def restore(self):
+        """
+        Restores the HP of the pokemon and the PP of all its moves to the maximum.
+        """
+
+        self.curr_hp = self.base_stats["hp"]
+        self.curr_pps.update(self.max_pps)
     
     def use_move(self, move_name, opponent_pokemon):
         """
@@ -67,38 +86,14 @@ class PokemonCharacter:
         - opponent_pokemon: PokemonCharacter object representing the pokemon that is being attacked.
         """
 
-        # get the selected move from the moves of the pokemin
-        move = None
-        for m in self.moves:
-            if m["name"] == move_name:
-                move = m
-                break
-
         # print some information about the move
         type_text(f"{self.name} uses {move_name}!\n")
 
-        # reduce the power points (pp) of the move, independently of whether the move succeeds or not
-        self.curr_pps[move_name] -= 1
-
-        # the move succeeds with a probability equal to its accuracy
-        if random.random() < move["accuracy"]:
-
-            # compute the damage dealt by the move to the opponent pokemon
-            stability = 1.5 if move["type"] in self.types else 1.0
-            effect = 1
-            critical = 2 if random.random() < (self.base_stats["speed"] / 512) else 1
-            luck = random.uniform(0.85, 1.0)
-            modifier = stability * effect * critical * luck
-            attack = self.base_stats["attack"] if move["category"] == "physical" else self.base_stats["special"]
-            defense = opponent_pokemon.base_stats["defense"] if move["category"] == "physical" else opponent_pokemon.base_stats["special"]
-            damage = math.floor(((2 * self.level + 10) / 250 * (attack / defense) * move["power"] + 2) * modifier)
-
-            # apply the damage to the opponent pokemon
-            opponent_pokemon.curr_hp -= damage
+        # use the move with the rules of the assignment (see battle_core.py)
+        damage = rules.use_move(self, move_name, opponent_pokemon)
 
-            # print some information about the move
+        # print some information about the damage dealt, if the move succeeds
+        if damage is not None:
             type_text(f"It dealt a damage of {damage} HP to {opponent_pokemon.name}.\n")
-        
-        # if the move fails, just print information
         else:
             type_text(f"{self.name}'s {move_name} missed!\n")
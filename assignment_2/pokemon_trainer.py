@@ -1,6 +1,5 @@
-import time
 import random
-from utils import type_text
+from utils import type_text, pause
 
 class PokemonTrainer:
     """
@@ -126,7 +125,7 @@ class PokemonTrainer:
             if random.random() < catch_probability:
                 for i in range(1, 4):
                     type_text(f"{i}... ")
-                    time.sleep(0.5)
+                    pause(0.5)
                 type_text(f"Yes! Congratulations! {self.name} catched a {opponent_pokemon.name}!\nThe catched {opponent_pokemon.name} has been added to yuour list of pokemon.\n")
                 
                 # there is no more space for a new pokemon
@@ -143,7 +142,7 @@ class PokemonTrainer:
             else:
                 for i in range(1, 3):
                     type_text(f"{i}... ")
-                    time.sleep(0.5)
+                    pause(0.5)
                 type_text(f"The wild {opponent_pokemon.name} broke free!\n")
                 return False
 
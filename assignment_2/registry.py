@@ -0,0 +1,83 @@
+import sys
+from types import MappingProxyType
+from pokemon_character import PokemonCharacter
+from pokemon_moves import moves
+from pokemon import starter_pokemon, wild_pokemon
+
+class Registry:
+    """
+    Class holding one read-only record for each move and each species, with integer ids, built once and shared by all the pokemon of all the games.
+    Records are read like the dictionaries they are built from (e.g., move["power"]), but cannot be modified.
+    """
+
+    def __init__(self, move_list, species_list):
+        """
+        A Registry is initialized by freezing the input moves and species.
+
+        Parameters:
+        - move_list: list of dictionaries with the moves (see pokemon_moves.py).
+        - species_list: list of dictionaries with the species (see pokemon.py), whose moves are names in move_list.
+        """
+
+        # moves, with the id of each move and its name interned
+        self.moves = tuple(MappingProxyType({**move, "name": sys.intern(move["name"]), "id": i}) for i, move in enumerate(move_list))
+        self.move_ids = {move["name"]: move["id"] for move in self.moves}
+
+        # species, referencing the records of their moves and with the maximum pps of their moves, used to restore them in bulk
+        self.species = []
+        for i, species in enumerate(species_list):
+            species_moves = tuple(self.moves[self.move_ids[name]] for name in species["moves"])
+            self.species.append(MappingProxyType({
+                **species,
+                "id": i,
+                "name": sys.intern(species["name"]),
+                "types": tuple(species["types"]),
+                "base_stats": MappingProxyType(dict(species["base_stats"])),
+                "moves": species_moves,
+                "max_pps": MappingProxyType({move["name"]: move["pp"] for move in species_moves})
+            }))
+        self.species = tuple(self.species)
+        self.species_ids = {species["name"]: species["id"] for species in self.species}
+        self.species_by_number = {species["national_pokedex_number"]: species for species in self.species}
+
+    def move(self, name):
+        """
+        Returns the record of a move.
+
+        Parameters:
+        - name: string with the name of the move.
+
+        Returns:
+        - move: read-only record of the move.
+        """
+
+        return self.moves[self.move_ids[name]]
+
+    def species_record(self, name):
+        """
+        Returns the record of a species.
+
+        Parameters:
+        - name: string with the name of the species.
+
+        Returns:
+        - species: read-only record of the species.
+        """
+
+        return self.species[self.species_ids[name]]
+
+    def new_pokemon(self, species):
+        """
+        Creates a pokemon of a species, referencing the records of the species and of its moves instead of copying them.
+
+        Parameters:
+        - species: read-only record of the species.
+
+        Returns:
+        - pokemon: PokemonCharacter object with full HP and PP.
+        """
+
+        return PokemonCharacter(species["name"], species["base_stats"], species["moves"], species["national_pokedex_number"], species["types"], species["max_pps"])
+
+# registry of the moves and species of the game
+registry = Registry(moves, starter_pokemon + wild_pokemon)
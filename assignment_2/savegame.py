@@ -0,0 +1,224 @@
+import struct
+from pokemon_trainer import PokemonTrainer
+from registry import registry
+
+# identifier and version of the format of the saved games, increased at each incompatible change
+MAGIC = b"PKSV"
+VERSION = 1
+
+# species are stored by national pokedex number, moves by their id in the registry and items by index, not as copies of the dictionaries
+item_names = ["potion", "pokeball"]
+item_ids = {item: i for i, item in enumerate(item_names)}
+
+# little-endian layouts of the parts of a save
+header_format = struct.Struct("<4sB")
+name_format = struct.Struct("<H")
+count_format = struct.Struct("<B")
+item_format = struct.Struct("<BI")
+team_format = struct.Struct("<BB")
+pokemon_format = struct.Struct("<HBhB")
+move_format = struct.Struct("<BH")
+record_format = struct.Struct("<I")
+
+# active pokemon index stored when the trainer has no active pokemon
+no_active = 255
+
+def encode_trainer(trainer):
+    """
+    Encodes the state of a pokemon trainer, without the header: name, items and, for each pokemon, species, level, current HP and current PP of each move.
+
+    Parameters:
+    - trainer: PokemonTrainer object.
+
+    Returns:
+    - data: bytes with the encoded state.
+    """
+
+    # name
+    name = trainer.name.encode("utf-8")
+    parts = [name_format.pack(len(name)), name]
+
+    # items
+    parts.append(count_format.pack(len(trainer.items)))
+    for item, quantity in trainer.items.items():
+        if item not in item_ids:
+            raise ValueError(f"The item {item} cannot be saved.")
+        parts.append(item_format.pack(item_ids[item], quantity))
+
+    # pokemon, with the index of the active one
+    active = no_active
+    for i, pokemon in enumerate(trainer.pokemon_list):
+        if pokemon is trainer.active_pokemon:
+            active = i
+    parts.append(team_format.pack(len(trainer.pokemon_list), active))
+    for pokemon in trainer.pokemon_list:
+        if pokemon.national_pokedex_number not in registry.species_by_number:
+            raise ValueError(f"The species of {pokemon.name} cannot be saved.")
+        parts.append(pokemon_format.pack(pokemon.national_pokedex_number, pokemon.level, pokemon.curr_hp, len(pokemon.moves)))
+        for move in pokemon.moves:
+            parts.append(move_format.pack(registry.move_ids[move["name"]], pokemon.curr_pps[move["name"]]))
+
+    return b"".join(parts)
+
+def decode_trainer(data, offset=0):
+    """
+    Decodes the state of a pokemon trainer encoded by encode_trainer.
+
+    Parameters:
+    - data: bytes with the encoded state.
+    - offset: integer with the position of the state in data.
+
+    Returns:
+    - trainer: PokemonTrainer object with the decoded state.
+    - offset: integer with the position right after the state in data.
+    """
+
+    # name
+    (length,) = name_format.unpack_from(data, offset)
+    offset += name_format.size
+    name = data[offset:offset + length].decode("utf-8")
+    offset += length
+
+    # items, set directly to restore them silently
+    trainer = PokemonTrainer(name)
+    (n_items,) = count_format.unpack_from(data, offset)
+    offset += count_format.size
+    for _ in range(n_items):
+        item_id, quantity = item_format.unpack_from(data, offset)
+        offset += item_format.size
+        trainer.items[item_names[item_id]] = quantity
+
+    # pokemon, built from the records of their species, with the pps of the moves with the given ids
+    n_pokemon, active = team_format.unpack_from(data, offset)
+    offset += team_format.size
+    for _ in range(n_pokemon):
+        number, level, curr_hp, n_moves = pokemon_format.unpack_from(data, offset)
+        offset += pokemon_format.size
+        pokemon = registry.new_pokemon(registry.species_by_number[number])
+        pokemon.level = level
+        pokemon.curr_hp = curr_hp
+        for _ in range(n_moves):
+            move_id, pp = move_format.unpack_from(data, offset)
+            offset += move_format.size
+            move_name = registry.moves[move_id]["name"]
+            if move_name not in pokemon.curr_pps:
+                raise ValueError(f"{pokemon.name} cannot have the move {move_name}.")
+            pokemon.curr_pps[move_name] = pp
+        trainer.pokemon_list.append(pokemon)
+    trainer.active_pokemon = None if active == no_active else trainer.pokemon_list[active]
+
+    return trainer, offset
+
+def check_header(data):
+    """
+    Checks that the input data starts with the header of the current format.
+
+    Parameters:
+    - data: bytes with a save.
+
+    Returns:
+    - offset: integer with the position right after the header.
+    """
+
+    if len(data) < header_format.size:
+        raise ValueError("The data is too short to be a saved game.")
+    magic, version = header_format.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("The data is not a saved game.")
+    if version != VERSION:
+        raise ValueError(f"The saved game has version {version}, but only version {VERSION} can be loaded.")
+    return header_format.size
+
+def dump_state(trainer):
+    """
+    Encodes the state of the game, i.e., of the pokemon trainer, in a compact versioned binary format.
+
+    Parameters:
+    - trainer: PokemonTrainer object.
+
+    Returns:
+    - data: bytes with the saved game.
+    """
+
+    return header_format.pack(MAGIC, VERSION) + encode_trainer(trainer)
+
+def load_state(data):
+    """
+    Restores the state of the game saved by dump_state.
+
+    Parameters:
+    - data: bytes with the saved game.
+
+    Returns:
+    - trainer: PokemonTrainer object with the restored state.
+    """
+
+    trainer, _ = decode_trainer(data, check_header(data))
+    return trainer
+
+def dump_states(trainers):
+    """
+    Encodes the states of many games at once, e.g., to snapshot headless sessions, with a single header and the length of each state.
+
+    Parameters:
+    - trainers: list of PokemonTrainer objects.
+
+    Returns:
+    - data: bytes with the saved games.
+    """
+
+    parts = [header_format.pack(MAGIC, VERSION), record_format.pack(len(trainers))]
+    for trainer in trainers:
+        state = encode_trainer(trainer)
+        parts.append(record_format.pack(len(state)))
+        parts.append(state)
+    return b"".join(parts)
+
+def load_states(data):
+    """
+    Restores the states of the games saved by dump_states.
+
+    Parameters:
+    - data: bytes with the saved games.
+
+    Returns:
+    - trainers: list of PokemonTrainer objects with the restored states.
+    """
+
+    offset = check_header(data)
+    (n_states,) = record_format.unpack_from(data, offset)
+    offset += record_format.size
+    trainers = []
+    for _ in range(n_states):
+        (length,) = record_format.unpack_from(data, offset)
+        offset += record_format.size
+        trainer, _ = decode_trainer(data, offset)
+        trainers.append(trainer)
+        offset += length
+    return trainers
+
+def save_game(trainer, path):
+    """
+    Saves the state of the game to a file.
+
+    Parameters:
+    - trainer: PokemonTrainer object.
+    - path: string with the path of the file.
+    """
+
+    with open(path, "wb") as file:
+        file.write(dump_state(trainer))
+
+def load_game(path):
+    """
+    Loads the state of the game from a file written by save_game.
+
+    Parameters:
+    - path: string with the path of the file.
+
+    Returns:
+    - trainer: PokemonTrainer object with the restored state.
+    """
+
+    with open(path, "rb") as file:
+        return load_state(file.read())
@@ -0,0 +1,335 @@
+import io
+import sys
+import time
+import random
+import struct
+import argparse
+from game_engine import run_game
+from utils import Renderer, set_renderer, set_headless, set_agent, set_recorder
+
+# identifier and version of the format of the recordings, increased at each incompatible change
+MAGIC = b"PKRC"
+VERSION = 1
+
+# little-endian layouts of the header and of the events: a one-byte tag followed by the value
+header_format = struct.Struct("<4sBQ")
+tag_format = struct.Struct("<B")
+option_format = struct.Struct("<B")
+length_format = struct.Struct("<H")
+encounter_format = struct.Struct("<H")
+
+# tag of each kind of event
+tags = {"option": 0, "text": 1, "encounter": 2}
+kinds = {tag: kind for kind, tag in tags.items()}
+
+class ReplayDivergence(Exception):
+    """
+    Exception raised when a replayed session does not follow its recording, e.g., because the game logic or the random draws have changed.
+    """
+
+class ReplayStopped(Exception):
+    """
+    Exception raised when a replay reaches the event at which it has to stop.
+    """
+
+class SessionRecorder:
+    """
+    Recorder of the seed of a session and of its stream of events: options chosen, lines of text read and wild pokemon encountered.
+    """
+
+    def __init__(self, seed):
+        """
+        A SessionRecorder is initialized with the seed of the session and no event.
+
+        Parameters:
+        - seed: integer with the seed of the random generator of the session.
+        """
+
+        self.seed = seed
+        self.events = []
+
+    def record(self, kind, value):
+        """
+        Records an event. See utils.set_recorder.
+
+        Parameters:
+        - kind: string with the kind of the event.
+        - value: integer or string with its value.
+        """
+
+        self.events.append((kind, value))
+
+    def to_bytes(self):
+        """
+        Encodes the recording in a compact binary stream.
+
+        Returns:
+        - data: bytes with the recording.
+        """
+
+        return encode_recording(self.seed, self.events)
+
+    def save(self, path):
+        """
+        Saves the recording to a file.
+
+        Parameters:
+        - path: string with the path of the file.
+        """
+
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+def encode_recording(seed, events):
+    """
+    Encodes a seed and a list of events in a compact binary stream.
+
+    Parameters:
+    - seed: integer with the seed of the session.
+    - events: list of tuples (kind, value) with the events of the session.
+
+    Returns:
+    - data: bytes with the recording.
+    """
+
+    parts = [header_format.pack(MAGIC, VERSION, seed)]
+    for kind, value in events:
+        parts.append(tag_format.pack(tags[kind]))
+        if kind == "option":
+            parts.append(option_format.pack(value))
+        elif kind == "text":
+            text = value.encode("utf-8")
+            parts.append(length_format.pack(len(text)))
+            parts.append(text)
+        else:
+            parts.append(encounter_format.pack(value))
+    return b"".join(parts)
+
+def decode_recording(data):
+    """
+    Decodes a recording encoded by encode_recording.
+
+    Parameters:
+    - data: bytes with the recording.
+
+    Returns:
+    - seed: integer with the seed of the session.
+    - events: list of tuples (kind, value) with the events of the session.
+    """
+
+    # header
+    if len(data) < header_format.size:
+        raise ValueError("The data is too short to be a recording.")
+    magic, version, seed = header_format.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("The data is not a recording.")
+    if version != VERSION:
+        raise ValueError(f"The recording has version {version}, but only version {VERSION} can be replayed.")
+
+    # events
+    offset = header_format.size
+    events = []
+    while offset < len(data):
+        (tag,) = tag_format.unpack_from(data, offset)
+        offset += tag_format.size
+        kind = kinds[tag]
+        if kind == "option":
+            (value,) = option_format.unpack_from(data, offset)
+            offset += option_format.size
+        elif kind == "text":
+            (length,) = length_format.unpack_from(data, offset)
+            offset += length_format.size
+            value = data[offset:offset + length].decode("utf-8")
+            offset += length
+        else:
+            (value,) = encounter_format.unpack_from(data, offset)
+            offset += encounter_format.size
+        events.append((kind, value))
+
+    return seed, events
+
+class ReplayAgent:
+    """
+    Agent taking the decisions of a recorded session and checking that the game produces the recorded events.
+    It is both the agent (see utils.set_agent) and the recorder (see utils.set_recorder) of the replayed session.
+    """
+
+    def __init__(self, events, stop_at=None, interactive=False):
+        """
+        A ReplayAgent is initialized at the start of the recorded events.
+
+        Parameters:
+        - events: list of tuples (kind, value) with the recorded events.
+        - stop_at: integer with the number of events after which the replay stops, or None to replay all of them.
+        - interactive: boolean indicating whether, when the replay stops, the user goes on playing with the keyboard instead of raising ReplayStopped.
+        """
+
+        self.events = events
+        self.stop_at = len(events) if stop_at is None else min(stop_at, len(events))
+        self.interactive = interactive
+        self.position = 0
+
+    def next_event(self, kind):
+        """
+        Returns the value of the next recorded event, that must be of the input kind.
+
+        Parameters:
+        - kind: string with the expected kind of event.
+
+        Returns:
+        - value: integer or string with the value of the event, or None if the replay has stopped and the user goes on playing.
+        """
+
+        # stop the replay
+        if self.position >= self.stop_at:
+            if not self.interactive:
+                raise ReplayStopped(f"The replay stopped after {self.position} events.")
+
+            # hand the session over to the user, rendering again to the terminal
+            set_agent(None)
+            set_recorder(None)
+            set_renderer(Renderer(sys.stdout))
+            return None
+
+        # check that the game asks for the recorded event
+        recorded_kind, value = self.events[self.position]
+        if recorded_kind != kind:
+            raise ReplayDivergence(f"Event {self.position}: expected {recorded_kind} {value!r}, got a request of {kind}.")
+        self.position += 1
+        return value
+
+    def choose_option(self, options, question_sentence):
+        """
+        Chooses the recorded option. See utils.choose_option.
+
+        Parameters:
+        - options: list of strings with the options.
+        - question_sentence: string with the question.
+
+        Returns:
+        - choice_id: integer with the index of the recorded option, or None when the user goes on playing.
+        """
+
+        return self.next_event("option")
+
+    def read_text(self):
+        """
+        Returns the recorded line of text. See utils.read_text.
+
+        Returns:
+        - text: string with the recorded text, or None when the user goes on playing.
+        """
+
+        return self.next_event("text")
+
+    def record(self, kind, value):
+        """
+        Checks that an event of the game matches the recording. Options and texts have already been consumed when they were asked for.
+
+        Parameters:
+        - kind: string with the kind of the event.
+        - value: integer or string with its value.
+        """
+
+        if kind in ["option", "text"]:
+            return
+        recorded_value = self.next_event(kind)
+        if recorded_value is not None and recorded_value != value:
+            raise ReplayDivergence(f"Event {self.position - 1}: expected {kind} {recorded_value!r}, got {value!r}.")
+
+def record_session(path, seed=None):
+    """
+    Runs an interactive session, recording its seed and events to a file, also if the session is interrupted.
+    The session must be played with the default, random opponent policy to be replayed exactly.
+
+    Parameters:
+    - path: string with the path of the file of the recording.
+    - seed: integer with the seed of the session, or None to draw it at random.
+
+    Returns:
+    - stats: dictionary with the statistics of the session, as returned by run_game.
+    """
+
+    # seed the session
+    seed = random.SystemRandom().getrandbits(63) if seed is None else seed
+    random.seed(seed)
+    recorder = SessionRecorder(seed)
+    set_recorder(recorder)
+
+    try:
+        return run_game()
+    finally:
+        set_recorder(None)
+        recorder.save(path)
+
+def replay_session(data, stop_at=None, interactive=False, keep_output=False):
+    """
+    Replays a recorded session at full speed, with no rendering, up to its end or up to a given event.
+
+    Parameters:
+    - data: bytes with the recording.
+    - stop_at: integer with the number of events after which the replay stops, or None to replay all of them.
+    - interactive: boolean indicating whether the user goes on playing from the point where the replay stops.
+    - keep_output: boolean indicating whether to keep the text of the replayed session, that is otherwise discarded.
+
+    Returns:
+    - result: dictionary with the statistics of the session as returned by run_game (empty if the replay stopped before its end),
+              the number of replayed events, the duration of the replay and, if kept, its output.
+    """
+
+    # start from the recorded seed, with the recorded decisions
+    seed, events = decode_recording(data)
+    random.seed(seed)
+    buffer = io.StringIO() if keep_output else None
+    agent = ReplayAgent(events, stop_at, interactive)
+    set_headless(True, buffer)
+    set_agent(agent)
+    set_recorder(agent)
+
+    # replay the session
+    start_time = time.perf_counter()
+    try:
+        stats = run_game()
+    except ReplayStopped:
+        stats = {}
+    finally:
+        set_agent(None)
+        set_recorder(None)
+        set_headless(False)
+
+    return {**stats, "events": agent.position, "seconds": time.perf_counter() - start_time, **({"output": buffer.getvalue()} if keep_output else {})}
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Replays recorded game sessions at full speed, e.g., to reproduce bugs or as regression tests.")
+
+    # arguments
+    parser.add_argument("recordings", type=str, nargs="+", help="Files with the recorded sessions (see main.py --record).")
+    parser.add_argument("--stop_at", type=int, required=False, default=None, help="Number of events after which the replay stops.")
+    parser.add_argument("--interactive", action="store_true", help="Go on playing with the keyboard from the point where the replay stops.")
+    parser.add_argument("--show_output", action="store_true", help="Print the text of the replayed session.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # replay the sessions
+    total_seconds = 0
+    for path in args.recordings:
+        with open(path, "rb") as file:
+            result = replay_session(file.read(), args.stop_at, args.interactive, args.show_output)
+        total_seconds += result["seconds"]
+        if args.show_output:
+            print(result.pop("output"))
+        print(f"{path}: {result['events']} events in {result['seconds'] * 1000:.1f} ms | " + " | ".join(f"{key} {value}" for key, value in result.items() if key not in ["events", "seconds"]))
+    print(f"{len(args.recordings)} sessions replayed in {total_seconds:.2f} s")
@@ -0,0 +1,439 @@
+import csv
+import time
+import random
+import argparse
+import multiprocessing
+from pokemon_trainer import PokemonTrainer
+from pokemon import starter_pokemon, wild_pokemon
+from game_engine import pokemon_from_dict, wild_encounters
+from policies import ExpectedDamageTable, make_policy
+from utils import set_headless
+
+# all pokemon that can be in a team, by name
+all_pokemon = {pokemon["name"]: pokemon for pokemon in starter_pokemon + wild_pokemon}
+
+class NoSwitchPolicy:
+    """
+    Switching policy that never changes the active pokemon voluntarily.
+    When the active pokemon is defeated, it is replaced by the first pokemon of the team that can still fight.
+    """
+
+    def choose(self, trainer, opponent, forced):
+        """
+        Chooses the pokemon that becomes active.
+
+        Parameters:
+        - trainer: PokemonTrainer object representing the trainer.
+        - opponent: PokemonCharacter object representing the opponent pokemon.
+        - forced: boolean indicating whether the active pokemon has been defeated and must be replaced.
+
+        Returns:
+        - pokemon: PokemonCharacter object of the team that becomes active, or None to keep the active one.
+        """
+
+        # keep the active pokemon as long as it can fight
+        if not forced:
+            return None
+
+        # first pokemon of the team that can fight
+        for pokemon in trainer.pokemon_list:
+            if pokemon is not trainer.active_pokemon and pokemon.curr_hp > 0:
+                return pokemon
+        return None
+
+class MatchupSwitchPolicy:
+    """
+    Switching policy that keeps active the pokemon of the team with the best matchup against the opponent.
+    The matchup of a pokemon is the expected damage of its best move with pps left minus the mean expected damage of the moves of the opponent.
+    """
+
+    def __init__(self, damage_table, margin=2.0):
+        """
+        A MatchupSwitchPolicy is initialized with the table of expected damages and the margin needed to switch.
+
+        Parameters:
+        - damage_table: ExpectedDamageTable object.
+        - margin: float with the minimum improvement of the matchup, in HP, for a voluntary switch.
+        """
+
+        # table of expected damages and margin
+        self.damage_table = damage_table
+        self.margin = margin
+
+    def matchup(self, pokemon, opponent):
+        """
+        Computes the matchup of a pokemon against the opponent.
+
+        Parameters:
+        - pokemon: PokemonCharacter object representing a pokemon of the team.
+        - opponent: PokemonCharacter object representing the opponent pokemon.
+
+        Returns:
+        - matchup: float with the matchup, in HP.
+        """
+
+        # damage dealt with the best move that can be used, if any
+        dealt = max([self.damage_table.get(pokemon, move, opponent) for move in pokemon.moves if pokemon.curr_pps[move["name"]] > 0], default=0)
+
+        # damage received from a move of the opponent chosen at random
+        received = sum(self.damage_table.get(opponent, move, pokemon) for move in opponent.moves) / len(opponent.moves)
+
+        return dealt - received
+
+    def choose(self, trainer, opponent, forced):
+        """
+        Chooses the pokemon that becomes active. See NoSwitchPolicy.choose.
+        """
+
+        # best pokemon of the team that can fight, other than the active one
+        candidates = [pokemon for pokemon in trainer.pokemon_list if pokemon is not trainer.active_pokemon and pokemon.curr_hp > 0]
+        if not candidates:
+            return None
+        best = max(candidates, key=lambda pokemon: self.matchup(pokemon, opponent))
+
+        # switch only if forced or if the matchup improves enough
+        if forced or self.matchup(best, opponent) > self.matchup(trainer.active_pokemon, opponent) + self.margin:
+            return best
+        return None
+
+class ThresholdItemPolicy:
+    """
+    Item policy that gives a potion when the active pokemon has few hps left and throws a pokeball when the opponent has few hps left.
+    """
+
+    def __init__(self, potion_below=0.3, pokeball_below=None):
+        """
+        A ThresholdItemPolicy is initialized with the hp fractions below which the items are used.
+
+        Parameters:
+        - potion_below: float with the fraction of hps of the active pokemon below which a potion is given, or None to never give potions.
+        - pokeball_below: float with the fraction of hps of the opponent below which a pokeball is thrown, or None to never throw pokeballs.
+        """
+
+        # thresholds of the items
+        self.potion_below = potion_below
+        self.pokeball_below = pokeball_below
+
+    def choose(self, trainer, opponent):
+        """
+        Chooses the item to use in this round.
+
+        Parameters:
+        - trainer: PokemonTrainer object representing the trainer.
+        - opponent: PokemonCharacter object representing the opponent pokemon.
+
+        Returns:
+        - item: string with the name of the item to use, or None to attack.
+        """
+
+        # throw a pokeball at a weak opponent
+        if self.pokeball_below is not None and "pokeball" in trainer.items and opponent.curr_hp / opponent.base_stats["hp"] < self.pokeball_below:
+            return "pokeball"
+
+        # give a potion to a weak active pokemon
+        active = trainer.active_pokemon
+        if self.potion_below is not None and "potion" in trainer.items and active.curr_hp / active.base_stats["hp"] < self.potion_below:
+            return "potion"
+
+        return None
+
+def can_fight(pokemon):
+    """
+    Checks whether a pokemon can still use a move.
+
+    Parameters:
+    - pokemon: PokemonCharacter object.
+
+    Returns:
+    - can_fight: boolean indicating whether the pokemon is not K.O. and has a move with pp > 0.
+    """
+
+    return pokemon.curr_hp > 0 and any(pp > 0 for pp in pokemon.curr_pps.values())
+
+def team_battle(trainer, opponent, move_policy, switch_policy, item_policy, opponent_policy, max_rounds=1000):
+    """
+    Runs a battle of a trainer against a wild pokemon with the rules of game_engine.battle, with scripted decisions and no output.
+    The trainer never runs away.
+
+    Parameters:
+    - trainer: PokemonTrainer object representing the trainer, with its team and items. It is modified by the battle.
+    - opponent: PokemonCharacter object representing the wild pokemon.
+    - move_policy: policy object (see policies.py) choosing the moves of the trainer's active pokemon.
+    - switch_policy: switching policy object, such as NoSwitchPolicy or MatchupSwitchPolicy.
+    - item_policy: item policy object, such as ThresholdItemPolicy.
+    - opponent_policy: policy object choosing the moves of the wild pokemon.
+    - max_rounds: integer with the maximum number of rounds, after which the battle is a draw.
+
+    Returns:
+    - record: dictionary with the outcome of the battle ("win", "caught", "loss" or "draw") and its statistics.
+    """
+
+    # statistics of the battle
+    record = {"outcome": "draw", "rounds": 0, "switches": 0, "potions": 0, "pokeballs": 0}
+
+    for round in range(1, max_rounds + 1):
+        record["rounds"] = round
+        active = trainer.active_pokemon
+
+        # the trainer may switch its active pokemon, use an item or attack
+        new_active = switch_policy.choose(trainer, opponent, forced=False)
+        item = item_policy.choose(trainer, opponent) if new_active is None else None
+        if new_active is not None:
+            trainer.active_pokemon = new_active
+            record["switches"] += 1
+        elif item == "potion":
+            trainer.use_potion()
+            record["potions"] += 1
+        elif item == "pokeball":
+            record["pokeballs"] += 1
+            try:
+                if trainer.use_pokeball(opponent):
+                    record["outcome"] = "caught"
+                    break
+            except OverflowError:
+                record["outcome"] = "caught"
+                break
+        else:
+            possible_moves = [move_name for move_name, pp in active.curr_pps.items() if pp > 0]
+            if possible_moves:
+                active.use_move(move_policy.choose(active, opponent, possible_moves), opponent)
+                if opponent.curr_hp <= 0:
+                    record["outcome"] = "win"
+                    break
+
+        # the opponent attacks the active pokemon with a move with pp > 0, if any
+        available_moves = [move_name for move_name, pp in opponent.curr_pps.items() if pp > 0]
+        if available_moves:
+            opponent.use_move(opponent_policy.choose(opponent, trainer.active_pokemon, available_moves), trainer.active_pokemon)
+
+        # a defeated active pokemon is replaced, and the battle is lost if no pokemon can replace it
+        if trainer.active_pokemon.curr_hp <= 0:
+            replacement = switch_policy.choose(trainer, opponent, forced=True)
+            if replacement is None:
+                record["outcome"] = "loss"
+                break
+            trainer.active_pokemon = replacement
+            record["switches"] += 1
+
+        # the battle ends when neither side can use a move anymore
+        if not can_fight(opponent) and not any(can_fight(pokemon) for pokemon in trainer.pokemon_list):
+            break
+
+    # state of the team at the end of the battle
+    record["fainted"] = sum(pokemon.curr_hp <= 0 for pokemon in trainer.pokemon_list)
+    record["team_hp"] = sum(max(pokemon.curr_hp, 0) for pokemon in trainer.pokemon_list) / sum(pokemon.base_stats["hp"] for pokemon in trainer.pokemon_list)
+    return record
+
+def build_trainer(team, n_potions=10, n_pokeballs=10):
+    """
+    Builds a trainer with a fresh team and its items.
+
+    Parameters:
+    - team: list of strings with the names of the pokemon of the team, the first one being active.
+    - n_potions: integer with the number of potions of the trainer.
+    - n_pokeballs: integer with the number of pokeballs of the trainer.
+
+    Returns:
+    - trainer: PokemonTrainer object.
+    """
+
+    # the items are set directly, since add_items announces them
+    trainer = PokemonTrainer("Simulated Trainer", [pokemon_from_dict(all_pokemon[name]) for name in team])
+    trainer.items = {item: quantity for item, quantity in [("potion", n_potions), ("pokeball", n_pokeballs)] if quantity > 0}
+    return trainer
+
+def simulate_team(team, n_battles, seed, settings):
+    """
+    Simulates battles of a team against wild pokemon sampled as in the game, each with a fresh team and items.
+
+    Parameters:
+    - team: list of strings with the names of the pokemon of the team.
+    - n_battles: integer with the number of battles.
+    - seed: integer with the random seed of the battles.
+    - settings: dictionary with the policies and items of the simulation (see build_settings).
+
+    Returns:
+    - records: list of dictionaries, one for each battle.
+    """
+
+    # no output and no delays in the battles, restoring the output afterwards
+    set_headless()
+    random.seed(seed)
+
+    # run the battles
+    records = []
+    try:
+        for battle_id in range(1, n_battles + 1):
+            trainer = build_trainer(team, settings["n_potions"], settings["n_pokeballs"])
+            opponent, _ = wild_encounters.sample()
+            opponent = pokemon_from_dict(opponent)
+            record = team_battle(trainer, opponent, settings["move_policy"], settings["switch_policy"], settings["item_policy"], settings["opponent_policy"], settings["max_rounds"])
+            records.append({"team": "+".join(team), "battle": battle_id, "seed": seed, "opponent": opponent.name, **record})
+    finally:
+        set_headless(False)
+
+    return records
+
+def simulate_team_job(job):
+    """
+    Runs simulate_team in a worker process of simulate_teams.
+
+    Parameters:
+    - job: tuple with the team, the number of battles, the seed and the settings.
+
+    Returns:
+    - records: list of dictionaries, one for each battle.
+    """
+
+    return simulate_team(*job)
+
+def build_settings(move_policy="random", opponent_policy="random", switch_policy="none", potion_below=0.3, pokeball_below=None, n_potions=10, n_pokeballs=10, max_rounds=1000):
+    """
+    Builds the policies and items of a simulation.
+
+    Parameters:
+    - move_policy: string with the name of the policy of the trainer's moves (see policies.make_policy).
+    - opponent_policy: string with the name of the policy of the wild pokemon's moves.
+    - switch_policy: string with the name of the switching policy, "none" or "matchup".
+    - potion_below: float with the fraction of hps below which a potion is given, or None.
+    - pokeball_below: float with the fraction of hps of the opponent below which a pokeball is thrown, or None.
+    - n_potions: integer with the number of potions at the beginning of each battle.
+    - n_pokeballs: integer with the number of pokeballs at the beginning of each battle.
+    - max_rounds: integer with the maximum number of rounds of a battle.
+
+    Returns:
+    - settings: dictionary with the policy objects, the items and the maximum number of rounds.
+    """
+
+    damage_table = ExpectedDamageTable()
+    return {
+        "move_policy": make_policy(move_policy, damage_table),
+        "opponent_policy": make_policy(opponent_policy, damage_table),
+        "switch_policy": MatchupSwitchPolicy(damage_table) if switch_policy == "matchup" else NoSwitchPolicy(),
+        "item_policy": ThresholdItemPolicy(potion_below, pokeball_below),
+        "n_potions": n_potions,
+        "n_pokeballs": n_pokeballs,
+        "max_rounds": max_rounds
+    }
+
+def simulate_teams(teams, n_battles, settings, random_seed=27, n_workers=1, chunk_size=10000):
+    """
+    Simulates battles of many teams, splitting them in chunks run by a pool of worker processes.
+    Each chunk has its own seed drawn from random_seed, so the results do not depend on the number of workers.
+
+    Parameters:
+    - teams: list of teams, each a list of strings with the names of its pokemon.
+    - n_battles: integer with the number of battles of each team.
+    - settings: dictionary with the policies and items of the simulation (see build_settings).
+    - random_seed: integer with the random seed of the simulation.
+    - n_workers: integer with the number of worker processes.
+    - chunk_size: integer with the maximum number of battles of a chunk.
+
+    Returns:
+    - records: list of dictionaries, one for each battle.
+    """
+
+    # split the battles of each team in chunks with their own seeds
+    rng = random.Random(random_seed)
+    jobs = []
+    for team in teams:
+        for first in range(0, n_battles, chunk_size):
+            jobs.append((team, min(chunk_size, n_battles - first), rng.getrandbits(32), settings))
+
+    # run the chunks in the worker processes, or in the main process with a single worker
+    if n_workers <= 1:
+        chunks = [simulate_team_job(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(n_workers) as pool:
+            chunks = pool.map(simulate_team_job, jobs, chunksize=1)
+
+    # number the battles of each team consecutively
+    records = []
+    counters = {}
+    for chunk in chunks:
+        for record in chunk:
+            counters[record["team"]] = counters.get(record["team"], 0) + 1
+            records.append({**record, "battle": counters[record["team"]]})
+
+    return records
+
+def summarize(records):
+    """
+    Summarizes the outcomes of the battles of each team.
+
+    Parameters:
+    - records: list of dictionaries, one for each battle.
+
+    Returns:
+    - summary: dictionary with, for each team, the number of battles, the rate of each outcome and the mean rounds, fainted pokemon and hps left.
+    """
+
+    summary = {}
+    for record in records:
+        team = summary.setdefault(record["team"], {"battles": 0, "win": 0, "caught": 0, "loss": 0, "draw": 0, "rounds": 0, "fainted": 0, "team_hp": 0})
+        team["battles"] += 1
+        team[record["outcome"]] += 1
+        for key in ["rounds", "fainted", "team_hp"]:
+            team[key] += record[key]
+
+    # turn the counts into rates and means
+    for team in summary.values():
+        for key in ["win", "caught", "loss", "draw", "rounds", "fainted", "team_hp"]:
+            team[key] /= team["battles"]
+
+    return summary
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Simulates battles of pokemon teams against wild pokemon, with scripted decisions and no output.")
+
+    # arguments
+    parser.add_argument("--teams", type=str, nargs="+", required=False, default=["Bulbasaur", "Charmander", "Squirtle", "Bulbasaur,Charmander,Squirtle"], help="Teams to simulate, each a comma-separated list of pokemon names.")
+    parser.add_argument("--n_battles", type=int, required=False, default=1000, help="Number of battles of each team.")
+    parser.add_argument("--move_policy", type=str, required=False, default="random", choices=["random", "greedy", "epsilon_greedy", "softmax", "search"], help="Policy choosing the moves of the trainer's pokemon.")
+    parser.add_argument("--opponent_policy", type=str, required=False, default="random", choices=["random", "greedy", "epsilon_greedy", "softmax", "search"], help="Policy choosing the moves of the wild pokemon.")
+    parser.add_argument("--switch_policy", type=str, required=False, default="none", choices=["none", "matchup"], help="Policy switching the active pokemon.")
+    parser.add_argument("--potion_below", type=float, required=False, default=0.3, help="Fraction of hps of the active pokemon below which a potion is given. Negative values disable potions.")
+    parser.add_argument("--pokeball_below", type=float, required=False, default=None, help="Fraction of hps of the wild pokemon below which a pokeball is thrown. If not set, no pokeball is thrown.")
+    parser.add_argument("--n_potions", type=int, required=False, default=10, help="Number of potions at the beginning of each battle.")
+    parser.add_argument("--n_pokeballs", type=int, required=False, default=10, help="Number of pokeballs at the beginning of each battle.")
+    parser.add_argument("--max_rounds", type=int, required=False, default=1000, help="Maximum number of rounds of a battle.")
+    parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed of the simulation.")
+    parser.add_argument("--n_workers", type=int, required=False, default=1, help="Number of worker processes.")
+    parser.add_argument("--output", type=str, required=False, default=None, help="Path to the .csv file where to save a row for each battle.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+    teams = [team.split(",") for team in args.teams]
+    unknown = {name for team in teams for name in team} - set(all_pokemon)
+    if unknown:
+        raise ValueError(f"Unknown pokemon {sorted(unknown)}. They must be among {sorted(all_pokemon)}.")
+
+    # simulate the battles
+    settings = build_settings(args.move_policy, args.opponent_policy, args.switch_policy, args.potion_below if args.potion_below >= 0 else None, args.pokeball_below, args.n_potions, args.n_pokeballs, args.max_rounds)
+    start_time = time.time()
+    records = simulate_teams(teams, args.n_battles, settings, args.random_seed, args.n_workers)
+    elapsed = time.time() - start_time
+
+    # save a row for each battle
+    if args.output is not None:
+        with open(args.output, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=list(records[0].keys()))
+            writer.writeheader()
+            writer.writerows(records)
+
+    # print the outcomes of each team
+    for team, stats in summarize(records).items():
+        print(f"{team}: win {stats['win'] * 100:.1f}% | caught {stats['caught'] * 100:.1f}% | loss {stats['loss'] * 100:.1f}% | draw {stats['draw'] * 100:.1f}% | {stats['rounds']:.1f} rounds | {stats['fainted']:.2f} fainted | {stats['team_hp'] * 100:.1f}% HP left")
+    print(f"{len(records)} battles in {elapsed:.1f} s ({len(records) / elapsed:.0f} battles/s)")
@@ -3,35 +3,203 @@ import sys
 import platform
 import time
 
-def clear_terminal():
+# ANSI escape sequence moving the cursor to the top left corner and clearing the screen
+CLEAR_SEQUENCE = "\033[H\033[2J"
+
+class Renderer:
     """
-    Clears the terminal.
+    Terminal renderer collecting the text of the current frame and writing it at once when the user has to read it,
+    i.e., before waiting for an input, before a pause, or when flushed.
+    The screen is cleared with ANSI escape sequences rather than a new process. The typewriter effect, writing one character at a time,
+    is an optional visual mode that is only used on terminals: if the output is redirected, the text is rendered instantly.
     """
 
-    # clear the terminal based on the OS
-    os.system("cls" if platform.system() == "Windows" else "clear")
+    def __init__(self, stream=sys.stdout, typewriter=False, delay=0.03):
+        """
+        A Renderer is initialized with its output stream and its mode.
+
+        Parameters:
+        - stream: object with write and flush methods (e.g., sys.stdout or io.StringIO) receiving the text, or None to discard it.
+        - typewriter: boolean indicating whether to write one character at a time when the stream is a terminal.
+        - delay: float with the default time in seconds between two characters in typewriter mode.
+        """
+
+        self.stream = stream
+        self.is_terminal = stream is not None and hasattr(stream, "isatty") and stream.isatty()
+        self.typewriter = typewriter and self.is_terminal
+        self.delay = delay
+        self.frame = []
+
+        # let the Windows console interpret ANSI escape sequences
+        if self.is_terminal and platform.system() == "Windows":
+            os.system("")
+
+    def write(self, text, delay=None):
+        """
+        Adds the input text to the current frame, or types it in typewriter mode.
+
+        Parameters:
+        - text: string with the text.
+        - delay: float with the time in seconds between two characters in typewriter mode, or None to use the default one.
+        """
+
+        # no output
+        if self.stream is None:
+            return
+
+        # buffer the text until the frame is flushed
+        if not self.typewriter:
+            self.frame.append(text)
+            return
+
+        # type the text one character at a time after the rest of the frame
+        self.flush()
+        for char in text:
+            self.stream.write(char)
+            self.stream.flush()
+            time.sleep(self.delay if delay is None else delay)
+
+    def clear(self):
+        """
+        Starts a new frame on a clear screen. The text of the current frame that has not been shown yet is dropped,
+        since it would be cleared as soon as it is written. Nothing is cleared if the output is not a terminal.
+        """
+
+        if not self.is_terminal:
+            return
+        if self.typewriter:
+            self.stream.write(CLEAR_SEQUENCE)
+            self.stream.flush()
+        else:
+            self.frame = [CLEAR_SEQUENCE]
+
+    def flush(self):
+        """
+        Writes the current frame with a single write.
+        """
 
-def type_text(text, delay=0.03):
+        if self.frame:
+            self.stream.write("".join(self.frame))
+            self.frame = []
+        if self.stream is not None:
+            self.stream.flush()
+
+    def pause(self, seconds):
+        """
+        Shows the current frame and waits for the input time in typewriter mode, otherwise does nothing.
+
+        Parameters:
+        - seconds: float with the time to wait in seconds.
+        """
+
+        if self.typewriter:
+            self.flush()
+            time.sleep(seconds)
+
+# renderer of all the output of the game (see set_renderer)
+renderer = Renderer()
+
+# agent taking the decisions of the player instead of the standard input, if any (see set_agent)
+agent = None
+
+# recorder of the decisions and of the events of the session, if any (see set_recorder)
+recorder = None
+
+def set_renderer(new_renderer):
     """
-    Prints the input text to the standard output by writing a character at each delay time.
-    It makes the printed text more game-like.
+    Sets the renderer of all the output of the game, after showing what is left in the frame of the previous one.
 
     Parameters:
-    - text: string with the text to be printed in the standard output.
-    - delay: float representing the time in seconds to wait before printing the next character in the string.
+    - new_renderer: Renderer object.
+    """
+
+    global renderer
+    renderer.flush()
+    renderer = new_renderer
+
+def set_headless(enabled=True, buffer=None):
+    """
+    Turns the headless mode on or off. In headless mode, nothing is printed and there are no delays.
+
+    Parameters:
+    - enabled: boolean indicating whether the headless mode is on.
+    - buffer: object with a write method (e.g., io.StringIO) collecting the text that would be printed, or None to discard it.
+    """
+
+    set_renderer(Renderer(buffer) if enabled else Renderer())
+
+def set_agent(new_agent):
+    """
+    Sets the agent taking the decisions of the player, or None to read them from the standard input.
+    An agent must have the methods choose_option(options, question_sentence), returning the index of an option, and read_text(), returning a string.
+    Both can return None to let the user answer instead.
+
+    Parameters:
+    - new_agent: agent object, or None.
+    """
+
+    global agent
+    agent = new_agent
+
+def set_recorder(new_recorder):
+    """
+    Sets the recorder of the session, or None not to record it.
+    A recorder must have the method record(kind, value), called with kind "option" and the index of each chosen option, with kind "text" and each line of text read,
+    and with other kinds for the events of the game (see game_engine.explore_action).
+
+    Parameters:
+    - new_recorder: recorder object, or None.
+    """
+
+    global recorder
+    recorder = new_recorder
+
+def record(kind, value):
+    """
+    Records a decision or an event of the session, if there is a recorder.
+
+    Parameters:
+    - kind: string with the kind of the decision or event.
+    - value: integer or string with its value.
+    """
+
+    if recorder is not None:
+        recorder.record(kind, value)
+
+def pause(seconds):
+    """
+    Waits for the input time in typewriter mode. See Renderer.pause.
+
+    Parameters:
+    - seconds: float with the time to wait in seconds.
     """
 
-    # iterate through the characters in the input string
-    for char in text:
+    renderer.pause(seconds)
 
-        # write the character
-        sys.stdout.write(char)
+def clear_terminal():
+    """
+    Clears the terminal. See Renderer.clear.
+    """
 
-        # make the character immediately leave the buffer to be printed in the stdout
-        sys.stdout.flush()
+    renderer.clear()
 
-        # wait before the next iteration
-        time.sleep(delay)
+def flush_output():
+    """
+    Shows the text printed so far. See Renderer.flush.
+    """
+
+    renderer.flush()
+
+def type_text(text, delay=None):
+    """
+    Prints the input text to the standard output. In typewriter mode, a character is written at each delay time, which makes the printed text more game-like.
+
+    Parameters:
+    - text: string with the text to be printed in the standard output.
+    - delay: float representing the time in seconds to wait before printing the next character in the string, or None to use the one of the renderer.
+    """
+
+    renderer.write(text, delay)
 
 def choose_option(options, question_sentence="What do you want to do?"):
     """
@@ -48,6 +216,17 @@ def choose_option(options, question_sentence="What do you want to do?"):
     # question to be asked to the user
     type_text(f"\n{question_sentence}\n")
 
+    # the agent, if any, chooses instead of the user, unless it hands the choice over by returning None
+    if agent is not None:
+        for i, option in enumerate(options):
+            type_text(f"{i}: {option}\n")
+        choice_id = agent.choose_option(options, question_sentence)
+        if choice_id is not None:
+            if not 0 <= choice_id < len(options):
+                raise ValueError(f"The agent chose the invalid option {choice_id}.")
+            record("option", choice_id)
+            return choice_id
+
     # iterate while the user types a valid option
     while True:
 
@@ -55,7 +234,8 @@ def choose_option(options, question_sentence="What do you want to do?"):
         for i, option in enumerate(options):
             type_text(f"{i}: {option}\n")
         
-        # check whether the option is valid
+        # show the frame and check whether the typed option is valid
+        flush_output()
         no_int = False
         try:
             choice_id = int(input("> "))
@@ -69,4 +249,69 @@ def choose_option(options, question_sentence="What do you want to do?"):
         clear_terminal()
 
         # the option is valid
+        record("option", choice_id)
         return choice_id
+
+def ask_option(options, question_sentence="What do you want to do?"):
+    """
+    Asks the player to choose among the options from a step of the game, written as a generator, with chosen_id = yield from ask_option(options).
+    The generator yields the request ("option", options, question_sentence) and receives the index of the chosen option from its driver (see run_steps).
+
+    Parameters:
+    - options: list of strings with the names of the options.
+    - question_sentence: string with the question.
+
+    Returns:
+    - choice_id: integer representing the index of the chosen option in the list options.
+    """
+
+    return (yield ("option", options, question_sentence))
+
+def ask_text():
+    """
+    Asks the player a line of text from a step of the game, written as a generator, with text = yield from ask_text().
+    The generator yields the request ("text",) and receives the text from its driver (see run_steps).
+
+    Returns:
+    - text: string with the line of text.
+    """
+
+    return (yield ("text",))
+
+def run_steps(steps):
+    """
+    Runs the steps of a game, answering its requests of input with choose_option and read_text, i.e., with the standard input or the agent.
+
+    Parameters:
+    - steps: generator yielding requests of input (see ask_option and ask_text).
+
+    Returns:
+    - value: the value returned by the generator.
+    """
+
+    try:
+        request = next(steps)
+        while True:
+            answer = choose_option(request[1], request[2]) if request[0] == "option" else read_text()
+            request = steps.send(answer)
+    except StopIteration as stop:
+        return stop.value
+
+def read_text():
+    """
+    Reads a line of text typed by the user, or given by the agent if any.
+
+    Returns:
+    - text: string with the line of text.
+    """
+
+    # the agent, if any, answers instead of the user, unless it hands the answer over by returning None
+    text = agent.read_text() if agent is not None else None
+
+    # show the frame before waiting for the user
+    if text is None:
+        flush_output()
+        text = input("> ")
+
+    record("text", text)
+    return text
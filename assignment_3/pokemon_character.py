@@ -1,5 +1,10 @@
-import random
-import math
+import os
+import sys
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_core import rules_for
 # from utils import type_text
 
 class PokemonCharacter:
@@ -7,6 +12,10 @@ class PokemonCharacter:
     Class to represent a pokemon in the pokemon game.
     """
 
+    # last type chart used by a move and its compiled rules: base stats, critical hits and no pps consumed (see use_move)
+    type_chart = None
+    rules = None
+
     def __init__(self, name, base_stats, moves, national_pokedex_number, types=["normal"], level=1):
         """
         A pokemon character is initialized by setting the parameters below.
@@ -70,42 +79,10 @@ class PokemonCharacter:
                               type_effectiveness["attack_type"]["defend_type"] is a float with the type effectiveness of a move of type "attack_type" against a pokemon of type "defend_type".
         """
 
-        # get the selected move from the moves of the pokemon
-        move = None
-        for m in self.moves:
-            if m["name"] == move_name:
-                move = m
-                break
-
-        # # print some information about the move
-        # type_text(f"{self.name} uses {move_name}!\n")
-
-        # # reduce the power points (pp) of the move, independently of whether the move succeeds or not
-        # self.curr_pps[move_name] -= 1
-
-        # the move succeeds with a probability equal to its accuracy
-        if random.random() < move["accuracy"]:
-
-            # compute the effect modifier based on the move type and on the opponent pokemon type
-            effect = 1
-            for opponent_type in opponent_pokemon.types:
-                effect *= type_effectiveness[move["type"]][opponent_type]
-
-            # compute the damage dealt by the move to the opponent pokemon
-            stability = 1.5 if move["type"] in self.types else 1.0
-            critical = 2 if random.random() < (self.base_stats["speed"] / 512) else 1
-            luck = random.uniform(0.85, 1.0)
-            modifier = stability * effect * critical * luck
-            attack = self.base_stats["attack"] if move["category"] == "physical" else self.base_stats["special"]
-            defense = opponent_pokemon.base_stats["defense"] if move["category"] == "physical" else opponent_pokemon.base_stats["special"]
-            damage = math.floor(((2 * self.level + 10) / 250 * (attack / defense) * move["power"] + 2) * modifier)
-
-            # apply the damage to the opponent pokemon
-            opponent_pokemon.curr_hp -= damage
-
-            # # print some information about the move
-            # type_text(f"It dealt a damage of {damage} HP to {opponent_pokemon.name}.\n")
-        
-        # # if the move fails, just print information
-        # else:
-        #     type_text(f"{self.name}'s {move_name} missed!\n")
+        # rules of the type chart, compiled the first time it is used (see battle_core.py)
+        if type_effectiveness is not PokemonCharacter.type_chart:
+            PokemonCharacter.type_chart = type_effectiveness
+            PokemonCharacter.rules = rules_for(type_effectiveness, "base", False)
+
+        # use the move
+        PokemonCharacter.rules.use_move(self, move_name, opponent_pokemon)
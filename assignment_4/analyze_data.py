@@ -1,9 +1,78 @@
 import os
+import sys
+import random
 import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from simulations import load_moves, load_pokemons
+from pokemon_character import PokemonCharacter
+from simulations import load_moves, load_pokemons, load_type_effectiveness, replay_battles, build_encounter_table
+from policies import ExpectedDamageTable, make_policy
+from memory_report import MemoryTracker
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encounters import load_encounter_weights
+
+def row_weights(data):
+    """
+    Computes the weight of each row of the input data in the plots based on the whole simulation.
+    A dataframe with a row for each turn gives weight 1 to each row, except for the turn 0 recorded for the battles ending before any move (see simulations.random_battle), with weight 0.
+    A dataframe with a row for each battle gives to each row the number of turns of the battle,
+    so that the plots are the same as the ones obtained from the data with a row for each turn.
+    If the rows are a sample of the simulation, the weights are multiplied by the column "Sample Weight".
+
+    Parameters:
+    - data: pandas dataframe with data collected from the simulation.
+
+    Returns:
+    - weights: pandas series with the weight of each row.
+    """
+
+    # data with a row for each turn
+    if "Turn" in data.columns:
+        weights = (data["Turn"] > 0).astype(float)
+
+    # data with a row for each battle
+    else:
+        weights = data["Battle Turns"].astype(float)
+
+    # data sampled from the simulation
+    if "Sample Weight" in data.columns:
+        weights = weights * data["Sample Weight"]
+
+    return weights
+
+def weighted_stats(data, by, column, weights):
+    """
+    Computes the weighted mean and standard deviation of a column of the input data for each group, ignoring missing values.
+
+    Parameters:
+    - data: pandas dataframe with the input data.
+    - by: list of strings with the names of the columns to group by.
+    - column: string with the name of the column whose statistics have to be computed.
+    - weights: pandas series with the weight of each row.
+
+    Returns:
+    - stats: dataframe with the columns in by and the columns "mean", "std" and "weight" with the statistics of each group.
+    """
+
+    # keep only the rows where the column has a value and a positive weight
+    valid = data[column].notna() & (weights > 0)
+    frame = data.loc[valid, by].copy()
+    frame["weight"] = weights[valid]
+    frame["value"] = data.loc[valid, column] * frame["weight"]
+    frame["square"] = data.loc[valid, column] ** 2 * frame["weight"]
+
+    # compute the weighted sums for each group
+    stats = frame.groupby(by)[["weight", "value", "square"]].sum().reset_index()
+
+    # compute the mean and the standard deviation, treating the weights as frequencies
+    stats["mean"] = stats["value"] / stats["weight"]
+    stats["std"] = ((stats["square"] - stats["weight"] * stats["mean"] ** 2).clip(lower=0) / (stats["weight"] - 1)) ** 0.5
+
+    return stats[by + ["mean", "std", "weight"]]
 
 def compute_hp_reductions(data):
     """
@@ -53,18 +122,23 @@ def simple_plot(data, save_path):
 
     # compute the hp percentage reduction, both absolute and relative
     data = compute_hp_reductions(data)
+    weights = row_weights(data)
 
     # create a single figure that will have both absolute and relative plots
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
     sns.set_style("whitegrid")
 
     # create the absolute plot
-    sns.pointplot(data=data, x="Turn", y="Absolute HP Reduction %", errorbar="sd", ax=ax1, color="blue")
+    stats = weighted_stats(data, ["Turn"], "Absolute HP Reduction %", weights)
+    ax1.errorbar(stats["Turn"], stats["mean"], yerr=stats["std"], color="blue", marker="o")
+    ax1.set_xlabel("Turn")
     ax1.set_title("Avg % of Initial HP Lost per Turn")
     ax1.set_ylabel("HP Reduction (%)")
 
     # create the relative plot
-    sns.pointplot(data=data, x="Turn", y="Relative HP Reduction %", errorbar="sd", ax=ax2, color="red")
+    stats = weighted_stats(data, ["Turn"], "Relative HP Reduction %", weights)
+    ax2.errorbar(stats["Turn"], stats["mean"], yerr=stats["std"], color="red", marker="o")
+    ax2.set_xlabel("Turn")
     ax2.set_title("Avg % of HP Lost per Turn")
     ax2.set_ylabel("HP Reduction (%)")
 
@@ -84,11 +158,13 @@ def moves_pie_plots(data, save_dir):
     - save_dir: path to the directory where to save all the plots.
     """
 
-    # number of times each attack of each starter pokemon has been used
-    size_groups = data.groupby(["Starter Pokemon", "Starter Move"]).size().reset_index(name="Count")
+    # (weighted) number of times each attack of each starter pokemon has been used
+    data = data[["Starter Pokemon", "Starter Move", "Starter Damage Inflicted"]].assign(Count=row_weights(data))
+    size_groups = data.groupby(["Starter Pokemon", "Starter Move"])["Count"].sum().reset_index(name="Count")
 
-    # total damage inflicted by each attack used by each starter pokemon
-    move_damage = data.groupby(["Starter Pokemon", "Starter Move"])["Starter Damage Inflicted"].sum().reset_index(name="Total Move Damage")
+    # (weighted) total damage inflicted by each attack used by each starter pokemon
+    data["Total Move Damage"] = data["Starter Damage Inflicted"] * data["Count"]
+    move_damage = data.groupby(["Starter Pokemon", "Starter Move"])["Total Move Damage"].sum().reset_index(name="Total Move Damage")
 
     # iterate through the starter pokemons, so to create a different plot for each of them
     for starter in size_groups["Starter Pokemon"].unique():
@@ -122,13 +198,14 @@ def pokemon_types_pie_plot(simulation_data, pokemons, save_dir):
     # dataframe with names and types of the pokemons in the original dataset
     original_types = pokemons[["name", "types"]]
 
-    # dataframe with names and types of the pokemons encountered in the simulation
+    # dataframe with names, types and weights of the pokemons encountered in the simulation
     simulation_types = simulation_data["Wild Pokemon"].to_frame(name="name")
+    simulation_types["weight"] = row_weights(simulation_data)
     simulation_types = simulation_types.merge(original_types, on="name", how="left")
 
     # count the number of occurrences of each type in two dataframes
     original_types = original_types.explode("types")["types"].value_counts(sort=False).sort_index()
-    simulation_types = simulation_types.explode("types")["types"].value_counts(sort=False).sort_index()
+    simulation_types = simulation_types.explode("types").groupby("types")["weight"].sum().sort_index()
 
     # plot the two series with counts
     fig, (ax_1, ax_2) = plt.subplots(1, 2, figsize=(16, 10))
@@ -149,8 +226,9 @@ def damage_bar_plot(data, save_path):
     - save_path: path to the file where to save a single figure with all the plots.
     """
 
-    # compute the average damage inflicted by each starter pokemon grouped by level
-    plot_data = data.groupby(["Starter Pokemon", "Starter Level"])["Starter Damage Inflicted"].mean().reset_index(name="Mean Damage Inflicted")
+    # compute the (weighted) average damage inflicted by each starter pokemon grouped by level
+    plot_data = weighted_stats(data, ["Starter Pokemon", "Starter Level"], "Starter Damage Inflicted", row_weights(data))
+    plot_data = plot_data.rename(columns={"mean": "Mean Damage Inflicted"})
     
     # create a facet plot with the bar plot for each starter pokemon in a different subplot
     sns.set_style("whitegrid")
@@ -171,14 +249,16 @@ def wins_image_plot(data, pokemons, save_dir):
     """
 
     # add a column to the input dataframe with the types of the wild pokemons encountered
-    plot_data = data.copy()
+    plot_data = data[["Starter Pokemon", "Wild Pokemon", "Wild Level", "Battle Outcome"]].copy()
+    plot_data["weight"] = row_weights(data)
+    plot_data["Weighted Outcome"] = plot_data["Battle Outcome"] * plot_data["weight"]
     plot_data = plot_data.rename(columns={"Wild Pokemon": "name"})
     plot_data = plot_data.merge(pokemons[["name", "types"]], on="name", how="left")
 
-    # compute the percentage of wins in function of the wild pokemon's level and types
+    # compute the (weighted) percentage of wins in function of the wild pokemon's level and types
     plot_data = plot_data.explode("types")
-    plot_data = plot_data.groupby(["Starter Pokemon", "types", "Wild Level"])["Battle Outcome"].mean().reset_index(name="Percentage Wins")
-    plot_data["Percentage Wins"] = plot_data["Percentage Wins"] * 100
+    plot_data = plot_data.groupby(["Starter Pokemon", "types", "Wild Level"])[["Weighted Outcome", "weight"]].sum().reset_index()
+    plot_data["Percentage Wins"] = plot_data["Weighted Outcome"] / plot_data["weight"] * 100
 
     # create and save a different plot for each starter pokemon
     starters = plot_data["Starter Pokemon"].unique()
@@ -212,9 +292,24 @@ def parse_args():
 
     # arguments
     parser.add_argument("-i", "--input_data", type=str, required=False, default=os.path.join("results", "collected_data.csv"), help="Path to the file with the collected data.")
+    parser.add_argument("-b", "--input_battles", type=str, required=False, default=None, help="Path to the file with a row for each battle, if the file with the collected data has only a sample of the turns.")
     parser.add_argument("-o", "--output_dir", type=str, required=False, default=os.path.join("results"), help="Path to the folder where to save the plots.")
     parser.add_argument("--moves", type=str, required=False, default=os.path.join("..", "data", "moves.json"), help="Path to the file with pokemon moves.")
     parser.add_argument("--pokemons", type=str, required=False, default=os.path.join("..", "data", "pokemons.json"), help="Path to the file with all pokemons.")
+    parser.add_argument("--type_effectiveness", type=str, required=False, default=os.path.join("..", "data", "type_effectiveness.json"), help="Path to the file with type effectiveness pairs.")
+    parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed used in the simulation, needed to load the same pokemons and replay the battles.")
+    parser.add_argument("--memory_report", action="store_true", help="Record the memory used by each phase and save a report in the output folder.")
+    parser.add_argument("--wild_levels", type=int, nargs=2, required=False, default=[1, 20], help="Minimum and maximum level of the wild pokemons used in the simulation, needed to replay the battles.")
+    parser.add_argument("--encounters", type=str, required=False, default=os.path.join("..", "data", "encounters.json"), help="Path to the file with the encounter weights of each habitat.")
+    parser.add_argument("--habitat", type=str, required=False, default=None, help="Habitat used in the simulation, if any, needed to replay the battles.")
+    parser.add_argument("--starter_policy", type=str, required=False, default="random", choices=["random", "greedy", "epsilon_greedy", "softmax", "search"], help="Policy of the starter pokemons used in the simulation, needed to replay the battles.")
+    parser.add_argument("--wild_policy", type=str, required=False, default="random", choices=["random", "greedy", "epsilon_greedy", "softmax", "search"], help="Policy of the wild pokemons used in the simulation, needed to replay the battles.")
+    parser.add_argument("--epsilon", type=float, required=False, default=0.1, help="Probability of a random move of the \"epsilon_greedy\" policy used in the simulation.")
+    parser.add_argument("--temperature", type=float, required=False, default=10.0, help="Temperature of the \"softmax\" policy used in the simulation.")
+    parser.add_argument("--search_depth", type=int, required=False, default=1, help="Maximum depth of the \"search\" policy used in the simulation.")
+    parser.add_argument("--search_time", type=float, required=False, default=None, help="Time budget of the \"search\" policy used in the simulation. Battles simulated with a time budget cannot be replayed exactly.")
+    parser.add_argument("--max_turns", type=int, required=False, default=1000, help="Maximum number of turns of each battle used in the simulation, needed to replay the battles.")
+    parser.add_argument("--move_effects", action="store_true", help="Whether the simulation had the effects of the moves, needed to load the same moves and replay the battles.")
                           
     return parser.parse_args()
 
@@ -223,16 +318,45 @@ if __name__ == '__main__':
     # parse command line arguments
     args = parse_args()
 
-    # load data
+    # start tracking the memory used by each phase, if required
+    memory_tracker = MemoryTracker(args.memory_report)
+
+    # load data, setting the random seed and the move effects of the simulation so that pokemons get the same moves
     simulation_data = pd.read_csv(args.input_data)
-    pokemons = load_pokemons(args.pokemons, load_moves(args.moves))
+    PokemonCharacter.set_move_effects(args.move_effects)
+    random.seed(args.random_seed)
+    pokemons = load_pokemons(args.pokemons, load_moves(args.moves, args.move_effects))
+
+    # the turns are a sample of the simulation, so use all battles for the plots that do not need the turns
+    turns_data = simulation_data
+    if args.input_battles is not None:
+        simulation_data = pd.read_csv(args.input_battles)
+    memory_tracker.checkpoint("loading data")
+
+    # the simulation stored only a row for each battle, so replay the turns for the plots that need them
+    if args.input_battles is None and "Turn" not in simulation_data.columns:
+        type_effectiveness = load_type_effectiveness(args.type_effectiveness)
+        encounter_table = build_encounter_table(pokemons, load_encounter_weights(args.encounters)[args.habitat]) if args.habitat is not None else None
+        damage_table = ExpectedDamageTable(type_effectiveness)
+        starter_policy = make_policy(args.starter_policy, damage_table, args.epsilon, args.temperature, args.search_time, args.search_depth) if args.starter_policy != "random" else None
+        wild_policy = make_policy(args.wild_policy, damage_table, args.epsilon, args.temperature, args.search_time, args.search_depth) if args.wild_policy != "random" else None
+        turns_data = replay_battles(simulation_data, pokemons, pokemons, type_effectiveness, args.max_turns, args.wild_levels, encounter_table, starter_policy, wild_policy)
+        memory_tracker.checkpoint("replaying battles")
 
     # create the output folder, if it does not exist
     os.makedirs(args.output_dir, exist_ok=True)
 
     # make some plots
-    simple_plot(simulation_data, os.path.join(args.output_dir, "simple_plot.jpg"))
-    moves_pie_plots(simulation_data, args.output_dir)
+    simple_plot(turns_data, os.path.join(args.output_dir, "simple_plot.jpg"))
+    memory_tracker.checkpoint("simple_plot")
+    moves_pie_plots(turns_data, args.output_dir)
+    memory_tracker.checkpoint("moves_pie_plots")
     pokemon_types_pie_plot(simulation_data, pokemons, args.output_dir)
-    damage_bar_plot(simulation_data, os.path.join(args.output_dir, "damage_bar_plots.jpg"))
-    wins_image_plot(simulation_data, pokemons, args.output_dir)
\ No newline at end of file
+    memory_tracker.checkpoint("pokemon_types_pie_plot")
+    damage_bar_plot(turns_data, os.path.join(args.output_dir, "damage_bar_plots.jpg"))
+    memory_tracker.checkpoint("damage_bar_plot")
+    wins_image_plot(simulation_data, pokemons, args.output_dir)
+    memory_tracker.checkpoint("wins_image_plot")
+
+    # save the memory report with the plots
+    memory_tracker.write(os.path.join(args.output_dir, "memory_report_analysis.json"))
@@ -0,0 +1,87 @@
+import os
+import sys
+import itertools
+import numpy as np
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_core import RuleSet
+
+class BlockRandom:
+    """
+    Class serving the random draws of a simulation from buffers filled in large blocks by numpy, with a separate buffer and generator for each kind of draw.
+    Each kind of draw is an attribute returning the next uniform number in [0, 1) of its own stream, e.g., rng.accuracy(), so drawing is a single call to a C function.
+    The streams are spawned in a fixed order from the seed (see kinds), and each block continues the stream of its generator,
+    so the same seed always gives the same draws of each kind, whatever the block size and however the draws of the different kinds are interleaved.
+    """
+
+    # kinds of draws, in the order in which their streams are spawned from the seed: new kinds must be added at the end to keep the streams of the existing ones
+    kinds = ("starter", "wild", "level", "move", "accuracy", "critical", "luck")
+
+    def __init__(self, seed, block_size=8192):
+        """
+        A BlockRandom is initialized by spawning the generator of each kind of draw from the seed. Blocks are generated only when needed.
+
+        Parameters:
+        - seed: integer with the seed of the simulation.
+        - block_size: integer with the number of draws generated at once for each kind.
+        """
+
+        self.seed = seed
+        self.block_size = block_size
+
+        # one independent generator for each kind of draw
+        children = np.random.SeedSequence(seed).spawn(len(BlockRandom.kinds))
+        self.generators = {kind: np.random.Generator(np.random.PCG64(child)) for kind, child in zip(BlockRandom.kinds, children)}
+
+        # draws served from the buffers
+        for kind in BlockRandom.kinds:
+            setattr(self, kind, self.stream(self.generators[kind]))
+
+    def stream(self, generator):
+        """
+        Builds the function returning the draws of a generator one at a time, refilling its buffer with a new block when it is empty.
+
+        Parameters:
+        - generator: numpy Generator of the kind of draw.
+
+        Returns:
+        - next_draw: function with no arguments returning the next draw, as a Python float.
+        """
+
+        block_size = self.block_size
+        blocks = iter(lambda: generator.random(block_size).tolist(), None)
+        return itertools.chain.from_iterable(blocks).__next__
+
+    def randint(self, kind, low, high):
+        """
+        Draws an integer uniformly at random in [low, high] from the stream of a kind of draw.
+
+        Parameters:
+        - kind: string with the kind of draw.
+        - low: integer with the minimum.
+        - high: integer with the maximum, included.
+
+        Returns:
+        - value: integer drawn.
+        """
+
+        return low + int(getattr(self, kind)() * (high - low + 1))
+
+class BlockRuleSet(RuleSet):
+    """
+    Class with the rules of RuleSet, drawing the accuracy, the critical hits and the luck from the buffers of a BlockRandom instead of the random module.
+    """
+
+    def __init__(self, rng, stat_model="active", type_effectiveness=None, crit_model="speed", track_pps=False, **kwargs):
+        """
+        A BlockRuleSet is initialized by compiling its rules, as a RuleSet, with the streams of the generator of its draws.
+
+        Parameters:
+        - rng: BlockRandom object.
+        - the other parameters are the ones of RuleSet.
+        """
+
+        super().__init__(stat_model, type_effectiveness, crit_model, track_pps, draws=(rng.accuracy, rng.critical, rng.luck), **kwargs)
+        self.rng = rng
@@ -0,0 +1,372 @@
+import os
+import json
+import math
+import time
+import random
+import argparse
+import numpy as np
+from simulations import load_moves, read_pokemons, pokemons_with_moves, load_type_effectiveness, run_simulation, run_parallel_simulation, run_block_simulation
+
+class EngineDriftError(Exception):
+    """
+    Exception raised when the statistics of a candidate engine drift from the ones of the reference engine.
+    """
+
+def reference_engine(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, max_turns, n_workers, random_seed):
+    """
+    Reference engine: the simulation of run_simulation, in a single process, keeping all the battles and all their turns.
+
+    Parameters:
+    - n_games: integer with the number of games.
+    - n_battles: integer with the number of battles of each game.
+    - starter_pokemons: pandas dataframe with the starter pokemons.
+    - wild_pokemons: pandas dataframe with the wild pokemons.
+    - type_effectiveness: pandas dataframe with the effectiveness of a move given its type and the types of the opponent pokemon.
+    - max_turns: integer with the maximum number of turns of each battle.
+    - n_workers: integer with the number of worker processes, not used by this engine.
+    - random_seed: integer with the random seed of the simulation, with which the random generator has already been seeded when loading the data.
+
+    Returns:
+    - battles: pandas dataframe with a row for each battle.
+    - turns: pandas dataframe with a row for each turn.
+    """
+
+    # the sample of turns is as large as the simulation, so that all the turns are kept
+    return run_simulation(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, "sample", n_games * n_battles, max_turns=max_turns)
+
+def parallel_engine(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, max_turns, n_workers, random_seed):
+    """
+    Candidate engine: the simulation of run_parallel_simulation, with games split among worker processes with their own seeds.
+
+    Parameters:
+    - see reference_engine.
+
+    Returns:
+    - see reference_engine.
+    """
+
+    return run_parallel_simulation(n_workers, n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, "sample", n_games * n_battles, max_turns=max_turns)
+
+def block_engine(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, max_turns, n_workers, random_seed):
+    """
+    Candidate engine: the simulation of run_block_simulation, drawing the random numbers from numpy blocks.
+
+    Parameters:
+    - random_seed: integer with the seed of the draws.
+    - the other parameters are the ones of reference_engine.
+
+    Returns:
+    - see reference_engine.
+    """
+
+    return run_block_simulation(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, random_seed, "sample", n_games * n_battles, max_turns)
+
+# engines that can be compared, all meant to be statistically equivalent to the reference one
+engines = {
+    "reference": reference_engine,
+    "parallel": parallel_engine,
+    "block": block_engine
+}
+
+def run_engine(name, config, pokemons, moves_path, type_effectiveness):
+    """
+    Runs an engine on a configuration, loading the moves of the pokemons with the random seed of the configuration as simulations.py does.
+
+    Parameters:
+    - name: string with the name of the engine, a key of engines.
+    - config: dictionary with "n_games", "n_battles", "starters", "max_turns", "n_workers" and "random_seed".
+    - pokemons: list of dictionaries with the pokemons, as returned by read_pokemons.
+    - moves_path: path to the .json file with the moves.
+    - type_effectiveness: pandas dataframe with the type effectiveness.
+
+    Returns:
+    - battles: pandas dataframe with a row for each battle.
+    - turns: pandas dataframe with a row for each turn.
+    - seconds: float with the time spent running the battles, without loading the data.
+    """
+
+    # load the moves and assign them to the pokemons as in simulations.py
+    random.seed(config["random_seed"])
+    all_pokemons = pokemons_with_moves(pokemons, load_moves(moves_path))
+    starter_pokemons = all_pokemons[all_pokemons["name"].isin(config["starters"])]
+
+    # run and time the battles
+    start_time = time.perf_counter()
+    battles, turns = engines[name](config["n_games"], config["n_battles"], starter_pokemons, all_pokemons, type_effectiveness, config["max_turns"], config["n_workers"], config["random_seed"])
+    seconds = time.perf_counter() - start_time
+
+    return battles, turns, seconds
+
+def mean_variance(values, clusters):
+    """
+    Computes the variance of the mean of a sample whose values are correlated within clusters, e.g., the battles of a game, that share the starter pokemon and its level.
+    The variance is the cluster-robust one, that is the variance of the sums of the deviations from the mean within each cluster.
+
+    Parameters:
+    - values: numpy array with the values of the sample.
+    - clusters: numpy array with the cluster of each value.
+
+    Returns:
+    - variance: float with the variance of the mean of the sample.
+    """
+
+    _, cluster_ids = np.unique(clusters, return_inverse=True)
+    n_clusters = cluster_ids.max() + 1
+    if n_clusters < 2:
+        return float(np.var(values) / len(values))
+    sums = np.bincount(cluster_ids, weights=values - values.mean(), minlength=n_clusters)
+    return float(np.sum(sums ** 2) / len(values) ** 2 * n_clusters / (n_clusters - 1))
+
+def design_effect(values, clusters):
+    """
+    Computes the design effect of a clustered sample, i.e., how many times the variance of its mean is larger than with independent values.
+
+    Parameters:
+    - values: numpy array with the values of the sample.
+    - clusters: numpy array with the cluster of each value.
+
+    Returns:
+    - effect: float with the design effect, at least 1.
+    """
+
+    independent_variance = np.var(values) / len(values)
+    if independent_variance == 0:
+        return 1.0
+    return max(1.0, mean_variance(values, clusters) / independent_variance)
+
+def mean_test(reference, candidate):
+    """
+    Two-sided two-sample z-test of the equality of the means of two clustered samples, e.g., of two rates, with cluster-robust variances.
+
+    Parameters:
+    - reference: tuple with the numpy arrays of the values and of the clusters of the reference sample.
+    - candidate: tuple with the numpy arrays of the values and of the clusters of the candidate sample.
+
+    Returns:
+    - difference: float with the difference between the mean of candidate and the one of reference.
+    - p_value: float with the p-value of the test.
+    """
+
+    difference = float(candidate[0].mean() - reference[0].mean())
+    variance = mean_variance(*reference) + mean_variance(*candidate)
+    if variance == 0:
+        return difference, 1.0 if difference == 0 else 0.0
+    return difference, math.erfc(abs(difference) / math.sqrt(2 * variance))
+
+def ks_test(reference, candidate):
+    """
+    Two-sided two-sample Kolmogorov-Smirnov test of the equality of the distributions of two clustered samples, with the asymptotic distribution of the statistic.
+    The size of each sample is divided by its design effect, to account for the correlation of its values. With discrete values (e.g., turns or damages), the test is conservative.
+
+    Parameters:
+    - reference: tuple with the numpy arrays of the values and of the clusters of the reference sample.
+    - candidate: tuple with the numpy arrays of the values and of the clusters of the candidate sample.
+
+    Returns:
+    - statistic: float with the maximum distance between the empirical distribution functions.
+    - p_value: float with the p-value of the test.
+    """
+
+    # maximum distance between the empirical distribution functions, evaluated at all the values of both samples
+    reference_values = np.sort(reference[0])
+    candidate_values = np.sort(candidate[0])
+    values = np.concatenate([reference_values, candidate_values])
+    statistic = float(np.max(np.abs(np.searchsorted(reference_values, values, side="right") / len(reference_values) - np.searchsorted(candidate_values, values, side="right") / len(candidate_values))))
+
+    # asymptotic p-value with the effective sizes of the samples, with the correction of Stephens for small samples
+    n = len(reference_values) / design_effect(*reference)
+    m = len(candidate_values) / design_effect(*candidate)
+    n_effective = n * m / (n + m)
+    x = (math.sqrt(n_effective) + 0.12 + 0.11 / math.sqrt(n_effective)) * statistic
+    if x < 0.2:
+        return statistic, 1.0
+    p_value = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k ** 2 * x ** 2) for k in range(1, 101))
+    return statistic, min(1.0, max(0.0, p_value))
+
+def battle_samples(battles, turns):
+    """
+    Extracts the samples compared by the harness from the data of a simulation, each value with its game as cluster.
+
+    Parameters:
+    - battles: pandas dataframe with a row for each battle.
+    - turns: pandas dataframe with a row for each turn.
+
+    Returns:
+    - rates: dictionary with a tuple of numpy arrays of values (0 or 1) and of games for each compared rate.
+    - distributions: dictionary with a tuple of numpy arrays of values and of games for each compared distribution.
+    """
+
+    # moves used in the turns (the wild pokemon does not move in the turn it is defeated) and the ones that dealt damage
+    starter_turns = turns[turns["Starter Move"].notna()]
+    wild_turns = turns[turns["Wild Move"].notna()]
+    starter_hits = starter_turns[starter_turns["Starter Damage Inflicted"].notna()]
+    wild_hits = wild_turns[wild_turns["Wild Damage Inflicted"].notna()]
+    games = battles["Game"].to_numpy()
+
+    rates = {
+        "win rate": ((battles["Battle Outcome"] == 1).to_numpy(dtype=float), games),
+        "draw rate": ((battles["Battle Draw"] == 1).to_numpy(dtype=float), games),
+        "starter miss rate": (starter_turns["Starter Damage Inflicted"].isna().to_numpy(dtype=float), starter_turns["Game"].to_numpy()),
+        "wild miss rate": (wild_turns["Wild Damage Inflicted"].isna().to_numpy(dtype=float), wild_turns["Game"].to_numpy())
+    }
+    distributions = {
+        "battle turns": (battles["Battle Turns"].to_numpy(dtype=float), games),
+        "residual HP": (battles["Residual HP"].to_numpy(dtype=float), games),
+        "starter damage": (starter_hits["Starter Damage Inflicted"].to_numpy(dtype=float), starter_hits["Game"].to_numpy()),
+        "wild damage": (wild_hits["Wild Damage Inflicted"].to_numpy(dtype=float), wild_hits["Game"].to_numpy())
+    }
+    return rates, distributions
+
+def compare_engines(reference, candidate, alpha=0.01, rate_tolerance=0.01, distribution_tolerance=0.02):
+    """
+    Compares the statistics of a candidate engine with the ones of the reference engine.
+    A statistic drifts if its difference is both significant, with a Bonferroni correction of alpha over all the tests, and larger than its tolerance,
+    so that large simulations do not fail for negligible differences and small ones do not fail by chance.
+    The battles of a game share the starter pokemon and its level, so the tests treat the games as clusters of correlated values.
+
+    Parameters:
+    - reference: tuple with the battles and turns of the reference engine.
+    - candidate: tuple with the battles and turns of the candidate engine.
+    - alpha: float with the overall significance level of the tests.
+    - rate_tolerance: float with the largest absolute difference of a rate that is accepted.
+    - distribution_tolerance: float with the largest Kolmogorov-Smirnov distance between two distributions that is accepted.
+
+    Returns:
+    - results: list of dictionaries, one for each statistic, with its test, the values of both engines, the distance between them, the p-value of the test and whether it drifts.
+    """
+
+    reference_rates, reference_distributions = battle_samples(*reference)
+    candidate_rates, candidate_distributions = battle_samples(*candidate)
+    threshold = alpha / (len(reference_rates) + len(reference_distributions))
+
+    results = []
+
+    # rates, compared with the z-test of two means
+    for name in reference_rates:
+        difference, p_value = mean_test(reference_rates[name], candidate_rates[name])
+        results.append({
+            "statistic": name,
+            "test": "mean z",
+            "reference": float(reference_rates[name][0].mean()),
+            "candidate": float(candidate_rates[name][0].mean()),
+            "distance": abs(difference),
+            "p_value": p_value,
+            "drift": p_value < threshold and abs(difference) > rate_tolerance
+        })
+
+    # distributions, compared with the Kolmogorov-Smirnov test, reporting their means
+    for name in reference_distributions:
+        distance, p_value = ks_test(reference_distributions[name], candidate_distributions[name])
+        results.append({
+            "statistic": name,
+            "test": "Kolmogorov-Smirnov",
+            "reference": float(reference_distributions[name][0].mean()),
+            "candidate": float(candidate_distributions[name][0].mean()),
+            "distance": distance,
+            "p_value": p_value,
+            "drift": p_value < threshold and distance > distribution_tolerance
+        })
+
+    return results
+
+def validate(candidate, config, pokemons, moves_path, type_effectiveness, alpha=0.01, rate_tolerance=0.01, distribution_tolerance=0.02, independent_seeds=False):
+    """
+    Runs the reference engine and a candidate engine on the same configuration, and compares their statistics and speeds.
+
+    Parameters:
+    - candidate: string with the name of the candidate engine, a key of engines.
+    - config: dictionary with the configuration of the simulation (see run_engine).
+    - pokemons, moves_path, type_effectiveness: see run_engine.
+    - alpha, rate_tolerance, distribution_tolerance: see compare_engines.
+    - independent_seeds: boolean indicating whether the candidate uses a different random seed than the reference, to check the tests on independent samples.
+
+    Returns:
+    - report: dictionary with the configuration, the results of the tests, the number of battles per second of both engines and the speedup of the candidate.
+    """
+
+    # run both engines
+    reference_battles, reference_turns, reference_seconds = run_engine("reference", config, pokemons, moves_path, type_effectiveness)
+    candidate_config = dict(config, random_seed=config["random_seed"] + 1) if independent_seeds else config
+    candidate_battles, candidate_turns, candidate_seconds = run_engine(candidate, candidate_config, pokemons, moves_path, type_effectiveness)
+
+    # compare their statistics
+    results = compare_engines((reference_battles, reference_turns), (candidate_battles, candidate_turns), alpha, rate_tolerance, distribution_tolerance)
+
+    return {
+        "candidate": candidate,
+        "config": config,
+        "independent_seeds": independent_seeds,
+        "results": results,
+        "reference_battles_per_second": len(reference_battles) / reference_seconds,
+        "candidate_battles_per_second": len(candidate_battles) / candidate_seconds,
+        "speedup": reference_seconds / candidate_seconds
+    }
+
+def print_report(report):
+    """
+    Prints the results of the tests and the speeds of the engines.
+
+    Parameters:
+    - report: dictionary returned by validate.
+    """
+
+    print(f"reference vs {report['candidate']} ({report['config']['n_games'] * report['config']['n_battles']} battles each)")
+    print(f"{'statistic':<20}{'test':<20}{'reference':>12}{'candidate':>12}{'distance':>10}{'p-value':>10}  result")
+    for result in report["results"]:
+        print(f"{result['statistic']:<20}{result['test']:<20}{result['reference']:>12.4f}{result['candidate']:>12.4f}{result['distance']:>10.4f}{result['p_value']:>10.4f}  {'DRIFT' if result['drift'] else 'ok'}")
+    print(f"reference: {report['reference_battles_per_second']:.0f} battles/s | {report['candidate']}: {report['candidate_battles_per_second']:.0f} battles/s | speedup: {report['speedup']:.2f}x")
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Checks that a candidate engine has the same statistics as the reference simulation, and measures its speedup.")
+
+    # arguments
+    parser.add_argument("--candidate", type=str, required=False, default="parallel", choices=[name for name in engines if name != "reference"], help="Engine to compare with the reference one.")
+    parser.add_argument("--n_games", type=int, required=False, default=500, help="Number of games run by each engine. The battles of a game are correlated, so many short games give more powerful tests than a few long ones.")
+    parser.add_argument("--n_battles", type=int, required=False, default=20, help="Number of battles in each game.")
+    parser.add_argument("--starters", type=str, nargs="+", required=False, default=["bulbasaur", "charmander", "squirtle", "pikachu"], help="Names of the starter pokemons.")
+    parser.add_argument("--max_turns", type=int, required=False, default=1000, help="Maximum number of turns of each battle.")
+    parser.add_argument("--n_workers", type=int, required=False, default=4, help="Number of worker processes of the engines that use them.")
+    parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed of both engines.")
+    parser.add_argument("--independent_seeds", action="store_true", help="Run the candidate with a different random seed than the reference.")
+    parser.add_argument("--alpha", type=float, required=False, default=0.01, help="Overall significance level of the tests.")
+    parser.add_argument("--rate_tolerance", type=float, required=False, default=0.01, help="Largest accepted absolute difference of a rate.")
+    parser.add_argument("--distribution_tolerance", type=float, required=False, default=0.02, help="Largest accepted Kolmogorov-Smirnov distance between two distributions.")
+    parser.add_argument("--input_pokemons", type=str, required=False, default=os.path.join("..", "data", "pokemons.json"), help="Path to the dataset with pokemons.")
+    parser.add_argument("--input_moves", type=str, required=False, default=os.path.join("..", "data", "moves.json"), help="Path to the dataset with moves.")
+    parser.add_argument("--input_type_effectiveness", type=str, required=False, default=os.path.join("..", "data", "type_effectiveness.json"), help="Path to the dataset with type effectiveness pairs.")
+    parser.add_argument("--output_report", type=str, required=False, default=None, help="Path to the .json file where to save the report.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # load the data shared by both engines
+    pokemons = read_pokemons(args.input_pokemons)
+    type_effectiveness = load_type_effectiveness(args.input_type_effectiveness)
+
+    # run and compare the engines
+    config = {"n_games": args.n_games, "n_battles": args.n_battles, "starters": args.starters, "max_turns": args.max_turns, "n_workers": args.n_workers, "random_seed": args.random_seed}
+    report = validate(args.candidate, config, pokemons, args.input_moves, type_effectiveness, args.alpha, args.rate_tolerance, args.distribution_tolerance, args.independent_seeds)
+    print_report(report)
+
+    # save the report
+    if args.output_report is not None:
+        os.makedirs(os.path.dirname(args.output_report) or ".", exist_ok=True)
+        with open(args.output_report, "w") as file:
+            json.dump(report, file, indent=4)
+
+    # fail loudly if any statistic drifted
+    drifted = [result["statistic"] for result in report["results"] if result["drift"]]
+    if drifted:
+        raise EngineDriftError(f"The {report['candidate']} engine drifts from the reference one on: {', '.join(drifted)}.")
@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+import multiprocessing
+import pandas as pd
+from pokemon_character import PokemonCharacter
+from simulations import load_moves, read_pokemons, pokemons_with_moves, load_type_effectiveness, run_simulation, build_encounter_table
+from policies import ExpectedDamageTable, make_policy
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encounters import load_encounter_weights
+
+# default configuration of a simulation, the same as the default arguments of simulations.py
+default_config = {
+    "n_games": 1000,
+    "n_battles": 500,
+    "starters": ["bulbasaur", "charmander", "squirtle", "pikachu"],
+    "starter_levels": [1, 20],
+    "wild_levels": [1, 20],
+    "random_seed": 27,
+    "storage_mode": "turns",
+    "turn_sample_size": 1000,
+    "max_turns": 1000,
+    "habitat": None,
+    "starter_policy": "random",
+    "wild_policy": "random",
+    "epsilon": 0.1,
+    "temperature": 10.0,
+    "search_depth": 1,
+    "search_time": None,
+    "move_effects": False
+}
+
+def load_spec(path):
+    """
+    Loads the specification of the experiments from a .json file.
+    The file must contain a dictionary with:
+    - "experiments": list of dictionaries, each with a unique "name" and the parameters of a simulation that differ from the defaults;
+    - "defaults" (optional): dictionary with the parameters shared by all experiments, overriding default_config.
+    The parameters are the keys of default_config.
+
+    Parameters:
+    - path: path to the .json file with the specification.
+
+    Returns:
+    - configs: list of dictionaries with the complete configuration of each experiment.
+    """
+
+    # read the specification
+    with open(path, "r") as file:
+        spec = json.load(file)
+
+    # defaults shared by all experiments
+    defaults = {**default_config, **spec.get("defaults", {})}
+
+    # build the complete configuration of each experiment, checking its parameters
+    configs = []
+    names = set()
+    for experiment in spec["experiments"]:
+        if "name" not in experiment:
+            raise ValueError("Each experiment must have a name.")
+        if experiment["name"] in names:
+            raise ValueError(f"The name {experiment['name']} is used by more than one experiment.")
+        unknown = [key for key in experiment if key != "name" and key not in default_config]
+        if unknown:
+            raise ValueError(f"Unknown parameters {unknown} in experiment {experiment['name']}.")
+        names.add(experiment["name"])
+        configs.append({**defaults, **experiment})
+
+    return configs
+
+def file_hash(path):
+    """
+    Computes the SHA-256 hash of a file, used to record which data an experiment has been run on.
+
+    Parameters:
+    - path: path to the file.
+
+    Returns:
+    - digest: string with the hexadecimal hash of the file.
+    """
+
+    # hash the file by chunks
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+# data shared by all the experiments run by a worker process, set once by init_experiment_worker
+worker_data = {}
+
+def init_experiment_worker(pokemons, moves, type_effectiveness, encounter_weights, output_dir, provenance):
+    """
+    Initializes a worker process of run_experiments, storing the data loaded once by the main process.
+
+    Parameters:
+    - pokemons: list of dictionaries with the pokemons, as returned by read_pokemons.
+    - moves: dictionary with the pandas dataframe of the moves loaded without (False) and, if needed, with (True) move effects.
+    - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+    - encounter_weights: dictionary with the encounter weights of each habitat, as returned by load_encounter_weights.
+    - output_dir: path to the folder where to save the results of the experiments.
+    - provenance: dictionary with the information about the data and the environment shared by all experiments.
+    """
+
+    # store the data in the global dictionary of the worker
+    worker_data.update(pokemons=pokemons, moves=moves, type_effectiveness=type_effectiveness, encounter_weights=encounter_weights, output_dir=output_dir, provenance=provenance)
+
+def run_experiment(config):
+    """
+    Runs the simulation of an experiment and saves its results, together with its configuration and provenance.
+    With the same configuration, the collected data is the same as the one of simulations.py with the same arguments.
+
+    Parameters:
+    - config: dictionary with the complete configuration of the experiment.
+
+    Returns:
+    - record: dictionary with the configuration, the provenance and the output files of the experiment.
+    """
+
+    # set the move effects and the random seed and draw the moves of the pokemons, as done by simulations.py
+    start_time = time.time()
+    PokemonCharacter.set_move_effects(config["move_effects"])
+    random.seed(config["random_seed"])
+    pokemons = pokemons_with_moves(worker_data["pokemons"], worker_data["moves"][config["move_effects"]])
+    starter_pokemons = pokemons[pokemons["name"].isin(config["starters"])]
+
+    # check that all starter pokemons exist
+    missing = set(config["starters"]) - set(starter_pokemons["name"])
+    if missing:
+        raise ValueError(f"Unknown starter pokemons {sorted(missing)} in experiment {config['name']}.")
+
+    # table to sample the wild pokemons of the habitat, if any
+    encounter_table = build_encounter_table(pokemons, worker_data["encounter_weights"][config["habitat"]]) if config["habitat"] is not None else None
+
+    # policies choosing the moves, sharing the table of expected damages (None stands for the original uniform choice)
+    damage_table = ExpectedDamageTable(worker_data["type_effectiveness"])
+    starter_policy = make_policy(config["starter_policy"], damage_table, config["epsilon"], config["temperature"], config["search_time"], config["search_depth"]) if config["starter_policy"] != "random" else None
+    wild_policy = make_policy(config["wild_policy"], damage_table, config["epsilon"], config["temperature"], config["search_time"], config["search_depth"]) if config["wild_policy"] != "random" else None
+
+    # run the simulation
+    collected_data = run_simulation(
+        config["n_games"],
+        config["n_battles"],
+        starter_pokemons,
+        pokemons,
+        worker_data["type_effectiveness"],
+        config["storage_mode"],
+        config["turn_sample_size"],
+        config["random_seed"],
+        config["max_turns"],
+        starter_levels=tuple(config["starter_levels"]),
+        wild_levels=tuple(config["wild_levels"]),
+        encounter_table=encounter_table,
+        starter_policy=starter_policy,
+        wild_policy=wild_policy
+    )
+
+    # save the collected data in the folder of the experiment
+    experiment_dir = os.path.join(worker_data["output_dir"], config["name"])
+    os.makedirs(experiment_dir, exist_ok=True)
+    outputs = {}
+    if config["storage_mode"] == "sample":
+        collected_battles, collected_data = collected_data
+        outputs["battles"] = os.path.join(experiment_dir, "collected_battles.csv")
+        collected_battles.to_csv(outputs["battles"], index=False)
+    outputs["data"] = os.path.join(experiment_dir, "collected_data.csv")
+    collected_data.to_csv(outputs["data"], index=False)
+
+    # save the configuration and the provenance of the results
+    record = {
+        "config": config,
+        "provenance": {**worker_data["provenance"], "pid": os.getpid(), "start_time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start_time)), "duration_seconds": time.time() - start_time},
+        "outputs": outputs
+    }
+    with open(os.path.join(experiment_dir, "config.json"), "w") as file:
+        json.dump(record, file, indent=4)
+
+    return record
+
+def run_experiments(configs, pokemons_path, moves_path, type_effectiveness_path, encounters_path, output_dir, n_workers=1, spec_path=None):
+    """
+    Runs all the input experiments in a pool of worker processes.
+    The data files are read once and sent once to each worker, instead of being read again for each experiment.
+
+    Parameters:
+    - configs: list of dictionaries with the complete configuration of each experiment, as returned by load_spec.
+    - pokemons_path: path to the .json file with the pokemons.
+    - moves_path: path to the .json file with the moves.
+    - type_effectiveness_path: path to the .json file with the type effectiveness pairs.
+    - encounters_path: path to the .json file with the encounter weights of each habitat.
+    - output_dir: path to the folder where to save the results, with a subfolder for each experiment.
+    - n_workers: integer with the number of worker processes.
+    - spec_path: path to the file with the specification of the experiments, recorded in the provenance.
+
+    Returns:
+    - records: list of dictionaries with the configuration, the provenance and the output files of each experiment.
+    """
+
+    # load the data once, with the moves with their effects only if an experiment needs them
+    moves = {False: load_moves(moves_path)}
+    if any(config["move_effects"] for config in configs):
+        moves[True] = load_moves(moves_path, True)
+    pokemons = read_pokemons(pokemons_path)
+    type_effectiveness = load_type_effectiveness(type_effectiveness_path)
+    encounter_weights = load_encounter_weights(encounters_path)
+
+    # information about the data and the environment shared by all experiments
+    provenance = {
+        "spec": spec_path,
+        "data": {path: file_hash(path) for path in [pokemons_path, moves_path, type_effectiveness_path, encounters_path]},
+        "python_version": platform.python_version(),
+        "pandas_version": pd.__version__,
+        "command": " ".join(sys.argv)
+    }
+
+    # run the experiments in the worker processes, or in the main process with a single worker
+    init_args = (pokemons, moves, type_effectiveness, encounter_weights, output_dir, provenance)
+    if n_workers <= 1:
+        init_experiment_worker(*init_args)
+        records = [run_experiment(config) for config in configs]
+    else:
+        with multiprocessing.Pool(n_workers, initializer=init_experiment_worker, initargs=init_args) as pool:
+            records = pool.map(run_experiment, configs, chunksize=1)
+
+    # save the list of all experiments
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "experiments.json"), "w") as file:
+        json.dump(records, file, indent=4)
+
+    return records
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Runs many simulations described in a .json specification, loading the data only once.")
+
+    # arguments
+    parser.add_argument("-s", "--spec", type=str, required=True, help="Path to the .json file with the specification of the experiments.")
+    parser.add_argument("-o", "--output_dir", type=str, required=False, default=os.path.join("results", "experiments"), help="Path to the folder where to save the results.")
+    parser.add_argument("--n_workers", type=int, required=False, default=1, help="Number of worker processes running the experiments.")
+    parser.add_argument("--input_pokemons", type=str, required=False, default=os.path.join("..", "data", "pokemons.json"), help="Path to the dataset with pokemons.")
+    parser.add_argument("--input_moves", type=str, required=False, default=os.path.join("..", "data", "moves.json"), help="Path to the dataset with moves.")
+    parser.add_argument("--input_type_effectiveness", type=str, required=False, default=os.path.join("..", "data", "type_effectiveness.json"), help="Path to the dataset with type effectiveness pairs.")
+    parser.add_argument("--input_encounters", type=str, required=False, default=os.path.join("..", "data", "encounters.json"), help="Path to the dataset with the encounter weights of each habitat.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # load the specification and run the experiments
+    configs = load_spec(args.spec)
+    records = run_experiments(configs, args.input_pokemons, args.input_moves, args.input_type_effectiveness, args.input_encounters, args.output_dir, args.n_workers, args.spec)
+
+    # print where the results have been saved
+    for record in records:
+        print(f"{record['config']['name']}: {record['outputs']['data']} ({record['provenance']['duration_seconds']:.1f} s)")
@@ -0,0 +1,434 @@
+import os
+import json
+import random
+import socket
+import asyncio
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from simulations import load_moves, load_pokemons, load_type_effectiveness, compute_can_damage, to_pokemon_character, run_battle
+from moveset_optimizer import wilson_interval
+from policies import ExpectedDamageTable
+
+class LRUCache:
+    """
+    Class to store the results of the most recent queries, discarding the least recently used one when full.
+    """
+
+    def __init__(self, max_size=10000):
+        """
+        An LRUCache is initialized empty.
+
+        Parameters:
+        - max_size: integer with the maximum number of results stored.
+        """
+
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns the result stored with a key, marking it as the most recently used one.
+
+        Parameters:
+        - key: hashable key of the query.
+
+        Returns:
+        - result: the stored result, or None if there is none.
+        """
+
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, result):
+        """
+        Stores the result of a query, discarding the least recently used result if the cache is full.
+
+        Parameters:
+        - key: hashable key of the query.
+        - result: result of the query.
+        """
+
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+# data shared by all the queries answered by a worker process, set once by init_service_worker
+worker_data = {}
+
+def init_service_worker(pokemons, type_effectiveness):
+    """
+    Initializes a worker process of the service, keeping the pokemons and the tables in memory.
+
+    Parameters:
+    - pokemons: pandas dataframe with the pokemons, each with its moves.
+    - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+    """
+
+    worker_data.update(
+        records={pokemon["name"]: pokemon for pokemon in pokemons.to_dict(orient="records")},
+        type_effectiveness=type_effectiveness,
+        can_damage=compute_can_damage(pokemons, type_effectiveness),
+        damage_table=ExpectedDamageTable(type_effectiveness)
+    )
+
+def simulate_matchup(starter_name, starter_level, wild_name, wild_level, n_battles, seed, max_turns):
+    """
+    Estimates the outcome distribution of a matchup by simulating battles, with moves chosen uniformly at random.
+
+    Parameters:
+    - starter_name: string with the name of the pokemon moving first.
+    - starter_level: integer with its level.
+    - wild_name: string with the name of the opponent pokemon.
+    - wild_level: integer with its level.
+    - n_battles: integer with the number of battles.
+    - seed: integer with the random seed of the battles.
+    - max_turns: integer with the maximum number of turns of a battle, after which it is a draw.
+
+    Returns:
+    - result: dictionary with the rates of wins, losses and draws, the 95% interval of the win rate and the mean number of turns.
+    """
+
+    random.seed(seed)
+    records = worker_data["records"]
+    counts = {"win": 0, "loss": 0, "draw": 0}
+    total_turns = 0
+    for _ in range(n_battles):
+        starter = to_pokemon_character({**records[starter_name], "level": starter_level})
+        wild = to_pokemon_character({**records[wild_name], "level": wild_level})
+        outcome, n_turns, _, _, is_draw = run_battle(starter, wild, worker_data["type_effectiveness"], worker_data["can_damage"], max_turns)
+        counts["draw" if is_draw else "win" if outcome else "loss"] += 1
+        total_turns += n_turns
+
+    low, high = wilson_interval(counts["win"], n_battles)
+    return {
+        "method": "simulation",
+        "n_battles": n_battles,
+        "win": counts["win"] / n_battles,
+        "loss": counts["loss"] / n_battles,
+        "draw": counts["draw"] / n_battles,
+        "win_interval": [low, high],
+        "mean_turns": total_turns / n_battles
+    }
+
+def exact_matchup(starter_name, starter_level, wild_name, wild_level):
+    """
+    Computes the outcome distribution of a matchup exactly, with moves chosen uniformly at random and no limit of turns.
+    The damage of each move is distributed exactly over accuracy, critical hits and its uniform luck (see ExpectedDamageTable.exact_outcomes).
+    The win probability W(a, b) of the pokemon moving first with a hps against an opponent with b hps is computed for all smaller hps by dynamic programming,
+    solving the self-loop of the turns where both pokemons deal no damage, and combining the damages of the opponent once for each hps of the first pokemon.
+
+    Parameters:
+    - starter_name: string with the name of the pokemon moving first.
+    - starter_level: integer with its level.
+    - wild_name: string with the name of the opponent pokemon.
+    - wild_level: integer with its level.
+
+    Returns:
+    - result: dictionary with the probabilities of a win, a loss and a draw.
+    """
+
+    records = worker_data["records"]
+    damage_table = worker_data["damage_table"]
+    starter = to_pokemon_character({**records[starter_name], "level": starter_level})
+    wild = to_pokemon_character({**records[wild_name], "level": wild_level})
+
+    # damage distribution of a turn of each pokemon, mixing its moves uniformly
+    def turn_distribution(attacker, defender):
+        probabilities = {}
+        for move in attacker.moves:
+            for probability, damage in damage_table.exact_outcomes(attacker, move, defender):
+                probabilities[damage] = probabilities.get(damage, 0.0) + probability / len(attacker.moves)
+        return probabilities
+
+    starter_turn = turn_distribution(starter, wild)
+    wild_turn = turn_distribution(wild, starter)
+    no_damage = starter_turn.get(0, 0.0) * wild_turn.get(0, 0.0)
+
+    # no pokemon can damage the other one, so the battle never ends
+    if no_damage >= 1 - 1e-12:
+        return {"method": "exact", "win": 0.0, "loss": 0.0, "draw": 1.0}
+
+    # damages of each pokemon in increasing order, and probability that the starter deals at least each damage
+    hp_starter, hp_wild = starter.curr_hp, wild.curr_hp
+    starter_damages = sorted(starter_turn.items())
+    wild_damages = sorted(wild_turn.items())
+    at_least = [sum(p_starter for d_starter, p_starter in starter_damages if d_starter >= b) for b in range(hp_wild + 1)]
+    wild_misses = wild_turn.get(0, 0.0)
+
+    # win probability for all hps, in increasing order so that the states reached after a turn are already computed
+    win = [[0.0] * (hp_wild + 1) for _ in range(hp_starter + 1)]
+    for a in range(1, hp_starter + 1):
+
+        # win probability after a turn where the wild pokemon deals damage without defeating the starter, for each hps of the wild pokemon
+        after_wild = [0.0] * (hp_wild + 1)
+        for d_wild, p_wild in wild_damages:
+            if 0 < d_wild < a:
+                row = win[a - d_wild]
+                for b in range(1, hp_wild + 1):
+                    after_wild[b] += p_wild * row[b]
+
+        # the starter wins if it defeats the wild pokemon, otherwise the battle continues unless both pokemons deal no damage
+        row = win[a]
+        for b in range(1, hp_wild + 1):
+            value = at_least[b]
+            for d_starter, p_starter in starter_damages:
+                if d_starter >= b:
+                    break
+                value += p_starter * (after_wild[b - d_starter] + (wild_misses * row[b - d_starter] if d_starter > 0 else 0.0))
+            row[b] = value / (1 - no_damage)
+
+    # the battle ends with probability 1, so what is not a win is a loss (bounding the rounding errors of the sums)
+    win_probability = min(win[hp_starter][hp_wild], 1.0)
+    return {"method": "exact", "win": win_probability, "loss": 1 - win_probability, "draw": 0.0}
+
+def answer(query):
+    """
+    Answers a matchup query in a worker process.
+
+    Parameters:
+    - query: dictionary with the validated query.
+
+    Returns:
+    - result: dictionary with the outcome distribution of the matchup.
+    """
+
+    if query["method"] == "exact":
+        return exact_matchup(query["starter"], query["starter_level"], query["wild"], query["wild_level"])
+    return simulate_matchup(query["starter"], query["starter_level"], query["wild"], query["wild_level"], query["n_battles"], query["seed"], query["max_turns"])
+
+class MatchupService:
+    """
+    Class implementing a long-lived service that answers matchup queries sent as lines of json over a local socket.
+    The queries are answered by a pool of worker processes with the data already loaded, and their results are kept in an LRU cache.
+    Concurrent identical queries are computed once.
+    """
+
+    def __init__(self, pokemons, type_effectiveness, n_workers=2, cache_size=10000, max_battles=10000, max_turns=1000, max_exact_states=20000):
+        """
+        A MatchupService is initialized with the data and the limits of the queries.
+
+        Parameters:
+        - pokemons: pandas dataframe with the pokemons, each with its moves.
+        - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+        - n_workers: integer with the number of worker processes.
+        - cache_size: integer with the maximum number of results in the cache.
+        - max_battles: integer with the maximum number of battles of a simulation query.
+        - max_turns: integer with the maximum number of turns of a simulated battle.
+        - max_exact_states: integer with the maximum product of the hps of the pokemons of an exact query, whose time and memory grow with it.
+        """
+
+        self.species = set(pokemons["name"])
+        self.records = {pokemon["name"]: pokemon for pokemon in pokemons.to_dict(orient="records")}
+        self.executor = ProcessPoolExecutor(n_workers, initializer=init_service_worker, initargs=(pokemons, type_effectiveness))
+        self.cache = LRUCache(cache_size)
+        self.in_flight = {}
+        self.max_battles = max_battles
+        self.max_turns = max_turns
+        self.max_exact_states = max_exact_states
+        self.n_queries = 0
+
+    def validate(self, request):
+        """
+        Checks a query and fills its default values.
+
+        Parameters:
+        - request: dictionary with the query received from a client.
+
+        Returns:
+        - query: dictionary with the complete query.
+        """
+
+        query = {
+            "method": request.get("method", "simulation"),
+            "starter": request.get("starter"),
+            "starter_level": int(request.get("starter_level", 1)),
+            "wild": request.get("wild"),
+            "wild_level": int(request.get("wild_level", 1)),
+            "n_battles": int(request.get("n_battles", 1000)),
+            "seed": int(request.get("seed", 0)),
+            "max_turns": self.max_turns
+        }
+        if query["method"] not in ["simulation", "exact"]:
+            raise ValueError("The method must be \"simulation\" or \"exact\".")
+        for key in ["starter", "wild"]:
+            if query[key] not in self.species:
+                raise ValueError(f"Unknown pokemon {query[key]}.")
+        for key in ["starter_level", "wild_level"]:
+            if not 1 <= query[key] <= 100:
+                raise ValueError(f"The {key.replace('_', ' ')} must be between 1 and 100.")
+        if not 1 <= query["n_battles"] <= self.max_battles:
+            raise ValueError(f"The number of battles must be between 1 and {self.max_battles}.")
+        if query["method"] == "exact":
+
+            # the exact method computes the win probability for all pairs of hps, so it is limited to small enough pokemons
+            hp_starter = to_pokemon_character({**self.records[query["starter"]], "level": query["starter_level"]}).curr_hp
+            hp_wild = to_pokemon_character({**self.records[query["wild"]], "level": query["wild_level"]}).curr_hp
+            if hp_starter * hp_wild > self.max_exact_states:
+                raise ValueError(f"The product of the hps of the pokemons ({hp_starter} x {hp_wild}) must be at most {self.max_exact_states} with the exact method, use the simulation method.")
+            query["n_battles"] = query["seed"] = None
+        return query
+
+    async def query(self, request):
+        """
+        Answers a query, from the cache if possible.
+
+        Parameters:
+        - request: dictionary with the query received from a client.
+
+        Returns:
+        - response: dictionary with the result and whether it comes from the cache.
+        """
+
+        # the result of a query depends only on the matchup, the method and the seed
+        query = self.validate(request)
+        key = tuple(query.values())
+        self.n_queries += 1
+        result = self.cache.get(key)
+        if result is not None:
+            return {"ok": True, "cached": True, "result": result}
+
+        # wait for the same query if another client already asked it, otherwise compute it in a worker process
+        if key not in self.in_flight:
+            self.in_flight[key] = asyncio.get_running_loop().run_in_executor(self.executor, answer, query)
+        try:
+            result = await asyncio.shield(self.in_flight[key])
+        finally:
+            self.in_flight.pop(key, None)
+        self.cache.put(key, result)
+        return {"ok": True, "cached": False, "result": result}
+
+    def stats(self):
+        """
+        Returns the statistics of the service.
+
+        Returns:
+        - stats: dictionary with the number of queries and the state of the cache.
+        """
+
+        return {"ok": True, "queries": self.n_queries, "cache_size": len(self.cache.entries), "cache_hits": self.cache.hits, "cache_misses": self.cache.misses}
+
+    async def handle_client(self, reader, writer):
+        """
+        Serves a client, answering each line of json it sends with a line of json.
+
+        Parameters:
+        - reader: asyncio StreamReader of the connection.
+        - writer: asyncio StreamWriter of the connection.
+        """
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    response = self.stats() if request.get("command") == "stats" else await self.query(request)
+                except Exception as error:
+                    response = {"ok": False, "error": str(error)}
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+async def serve(service, host="127.0.0.1", port=8765, unix_socket=None):
+    """
+    Runs the service until it is interrupted.
+
+    Parameters:
+    - service: MatchupService object.
+    - host: string with the local address to listen on.
+    - port: integer with the port to listen on.
+    - unix_socket: path to a UNIX socket to listen on instead of host and port.
+    """
+
+    if unix_socket is not None:
+        server = await asyncio.start_unix_server(service.handle_client, path=unix_socket)
+    else:
+        server = await asyncio.start_server(service.handle_client, host, port)
+    print(f"Matchup service listening on {unix_socket if unix_socket is not None else f'{host}:{port}'}")
+    async with server:
+        await server.serve_forever()
+
+def send_queries(requests, host="127.0.0.1", port=8765, unix_socket=None):
+    """
+    Sends queries to a running service and returns its responses, for tools that do not use asyncio.
+
+    Parameters:
+    - requests: list of dictionaries with the queries.
+    - host: string with the address of the service.
+    - port: integer with the port of the service.
+    - unix_socket: path to the UNIX socket of the service, used instead of host and port.
+
+    Returns:
+    - responses: list of dictionaries with the responses.
+    """
+
+    # connect to the service
+    if unix_socket is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(unix_socket)
+    else:
+        connection = socket.create_connection((host, port))
+
+    # send all queries, then read a response for each of them
+    with connection, connection.makefile("rwb") as stream:
+        for request in requests:
+            stream.write((json.dumps(request) + "\n").encode())
+        stream.flush()
+        return [json.loads(stream.readline()) for _ in requests]
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Runs a local service answering matchup queries, sent as lines of json, with the data kept in memory.")
+
+    # arguments
+    parser.add_argument("--host", type=str, required=False, default="127.0.0.1", help="Local address to listen on.")
+    parser.add_argument("--port", type=int, required=False, default=8765, help="Port to listen on.")
+    parser.add_argument("--unix_socket", type=str, required=False, default=None, help="Path to a UNIX socket to listen on instead of host and port.")
+    parser.add_argument("--n_workers", type=int, required=False, default=2, help="Number of worker processes answering the queries.")
+    parser.add_argument("--cache_size", type=int, required=False, default=10000, help="Maximum number of results kept in the cache.")
+    parser.add_argument("--max_battles", type=int, required=False, default=10000, help="Maximum number of battles of a simulation query.")
+    parser.add_argument("--max_turns", type=int, required=False, default=1000, help="Maximum number of turns of a simulated battle, after which it is a draw.")
+    parser.add_argument("--max_exact_states", type=int, required=False, default=20000, help="Maximum product of the hps of the pokemons of an exact query.")
+    parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed used to draw the moves of the pokemons.")
+    parser.add_argument("--input_pokemons", type=str, required=False, default=os.path.join("..", "data", "pokemons.json"), help="Path to the dataset with pokemons.")
+    parser.add_argument("--input_moves", type=str, required=False, default=os.path.join("..", "data", "moves.json"), help="Path to the dataset with moves.")
+    parser.add_argument("--input_type_effectiveness", type=str, required=False, default=os.path.join("..", "data", "type_effectiveness.json"), help="Path to the dataset with type effectiveness pairs.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # load the data once, drawing the moves of the pokemons as done by simulations.py
+    random.seed(args.random_seed)
+    moves = load_moves(args.input_moves)
+    pokemons = load_pokemons(args.input_pokemons, moves)
+    type_effectiveness = load_type_effectiveness(args.input_type_effectiveness)
+
+    # run the service
+    service = MatchupService(pokemons, type_effectiveness, args.n_workers, args.cache_size, args.max_battles, args.max_turns, args.max_exact_states)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.executor.shutdown()
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    resource = None         # not available on Windows, where the RSS is not reported
+
+def current_rss():
+    """
+    Reads the current resident set size (RSS) of the process.
+
+    Returns:
+    - rss: integer with the current RSS in bytes, or None if it cannot be read on this OS.
+    """
+
+    # on Linux, the second field of /proc/self/statm is the number of resident pages
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss():
+    """
+    Reads the peak resident set size (RSS) of the process since its start.
+
+    Returns:
+    - rss: integer with the peak RSS in bytes, or None if it cannot be read on this OS.
+    """
+
+    # the resource module is not available
+    if resource is None:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+class MemoryTracker:
+    """
+    Class to record the memory used by the phases of a script.
+    At the end of each phase, checkpoint records the current and peak memory allocated by Python since the previous checkpoint (with tracemalloc),
+    the current and peak RSS of the process, and the lines of code with the largest allocations still alive.
+    If the tracker is not enabled, checkpoint does nothing, so that the tracker can always be passed around at no cost.
+    """
+
+    def __init__(self, enabled=True, n_top_sites=10):
+        """
+        A MemoryTracker is initialized by starting tracemalloc, if enabled.
+
+        Parameters:
+        - enabled: boolean indicating whether memory has to be tracked. tracemalloc slows down the script, so tracking is opt-in.
+        - n_top_sites: integer with the number of largest allocation sites to be recorded at each checkpoint.
+        """
+
+        # options of the tracker
+        self.enabled = enabled
+        self.n_top_sites = n_top_sites
+
+        # list of the records of the phases
+        self.phases = []
+
+        # start tracing the allocations
+        if self.enabled:
+            tracemalloc.start()
+            self.phase_start = time.time()
+
+    def checkpoint(self, phase_name):
+        """
+        Records the memory used by the phase that has just ended and starts a new phase.
+
+        Parameters:
+        - phase_name: string with the name of the phase that has just ended.
+        """
+
+        # nothing to do if the tracker is not enabled
+        if not self.enabled:
+            return
+
+        # current and peak memory allocated by Python during the phase
+        current, peak = tracemalloc.get_traced_memory()
+
+        # largest allocation sites still alive at the end of the phase
+        statistics = tracemalloc.take_snapshot().statistics("lineno")
+        top_sites = [
+            {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "size_bytes": stat.size, "count": stat.count}
+            for stat in statistics[:self.n_top_sites]
+        ]
+
+        # record the phase
+        self.phases.append({
+            "phase": phase_name,
+            "duration_seconds": time.time() - self.phase_start,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "rss_current_bytes": current_rss(),
+            "rss_peak_bytes": peak_rss(),
+            "top_allocation_sites": top_sites
+        })
+
+        # start the next phase, with the peak measured from now on
+        tracemalloc.reset_peak()
+        self.phase_start = time.time()
+
+    def write(self, path):
+        """
+        Stops tracing and writes the report with all phases to a .json file.
+
+        Parameters:
+        - path: path to the .json file where to write the report.
+        """
+
+        # nothing to do if the tracker is not enabled
+        if not self.enabled:
+            return
+
+        # stop tracing the allocations
+        tracemalloc.stop()
+
+        # write the report
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({"phases": self.phases}, file, indent=4)
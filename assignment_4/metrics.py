@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+import threading
+import multiprocessing
+from tqdm import tqdm
+
+class SimulationMetrics:
+    """
+    Class to keep the progress of a simulation in counters shared among processes.
+    Workers add their progress to the counters, while a MetricsReporter reads them to show and publish the progress.
+    """
+
+    # names of the counters, in the order in which they are stored in the shared array
+    counter_names = ["games", "battles", "turns"]
+
+    def __init__(self, total_games, total_battles):
+        """
+        SimulationMetrics are initialized with all counters set to 0.
+
+        Parameters:
+        - total_games: integer with the number of games to be run in the simulation.
+        - total_battles: integer with the number of battles to be run in the simulation.
+        """
+
+        # expected totals, used to compute the estimated time to the end of the simulation
+        self.total_games = total_games
+        self.total_battles = total_battles
+
+        # shared array with the counters, protected by its own lock
+        self.counters = multiprocessing.Array("q", len(SimulationMetrics.counter_names))
+
+        # time at which the simulation started
+        self.start_time = time.time()
+
+    def add(self, games=0, battles=0, turns=0):
+        """
+        Adds the input progress to the shared counters.
+        To keep the overhead low, it should be called once per game rather than once per turn.
+
+        Parameters:
+        - games: integer with the number of games completed.
+        - battles: integer with the number of battles completed.
+        - turns: integer with the number of turns completed.
+        """
+
+        # update all counters at once
+        with self.counters.get_lock():
+            self.counters[0] += games
+            self.counters[1] += battles
+            self.counters[2] += turns
+
+    def snapshot(self):
+        """
+        Reads the counters and computes the throughput of the simulation.
+
+        Returns:
+        - snapshot: dictionary with the completed games, battles and turns, the elapsed seconds, the battles per second and the estimated seconds to the end.
+        """
+
+        # read all counters at once
+        with self.counters.get_lock():
+            snapshot = dict(zip(SimulationMetrics.counter_names, self.counters[:]))
+
+        # compute the throughput and the estimated time to the end
+        snapshot["elapsed_seconds"] = time.time() - self.start_time
+        snapshot["battles_per_second"] = snapshot["battles"] / snapshot["elapsed_seconds"] if snapshot["elapsed_seconds"] > 0 else 0.0
+        remaining_battles = max(self.total_battles - snapshot["battles"], 0)
+        snapshot["eta_seconds"] = remaining_battles / snapshot["battles_per_second"] if snapshot["battles_per_second"] > 0 else float("nan")
+
+        return snapshot
+
+    def to_prometheus(self):
+        """
+        Formats the current metrics in the Prometheus text exposition format.
+
+        Returns:
+        - text: string with a sample for each metric.
+        """
+
+        # read the current metrics
+        snapshot = self.snapshot()
+
+        # name, type, description and value of each metric
+        metrics = [
+            ("pokemon_simulation_games_completed", "counter", "Number of games completed.", snapshot["games"]),
+            ("pokemon_simulation_battles_completed", "counter", "Number of battles completed.", snapshot["battles"]),
+            ("pokemon_simulation_turns_completed", "counter", "Number of turns completed.", snapshot["turns"]),
+            ("pokemon_simulation_games_total", "gauge", "Number of games to be run.", self.total_games),
+            ("pokemon_simulation_battles_total", "gauge", "Number of battles to be run.", self.total_battles),
+            ("pokemon_simulation_elapsed_seconds", "gauge", "Seconds since the start of the simulation.", snapshot["elapsed_seconds"]),
+            ("pokemon_simulation_battles_per_second", "gauge", "Average number of battles completed per second.", snapshot["battles_per_second"]),
+            ("pokemon_simulation_eta_seconds", "gauge", "Estimated seconds to the end of the simulation.", snapshot["eta_seconds"])
+        ]
+
+        # write the help line, the type line and the sample of each metric
+        lines = []
+        for name, metric_type, description, value in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Writes the current metrics to a text file in the Prometheus format.
+        The file is replaced atomically, so that readers never see a partially written file.
+
+        Parameters:
+        - path: path to the file where to write the metrics.
+        """
+
+        # write to a temporary file, in the folder of the file, and then replace the old file
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+class MetricsReporter(threading.Thread):
+    """
+    Thread that periodically reads the SimulationMetrics to update a progress bar and to publish them to a text file.
+    It never touches the simulation loop, so that monitoring does not slow down the simulation.
+    """
+
+    def __init__(self, metrics, output_path=None, interval=1.0, show_bar=True):
+        """
+        A MetricsReporter is initialized with the metrics to be read and where to report them.
+
+        Parameters:
+        - metrics: SimulationMetrics object with the counters to be read.
+        - output_path: path to the text file where to publish the metrics. If None, the metrics are not published.
+        - interval: float with the number of seconds between two reports.
+        - show_bar: boolean indicating whether to show a progress bar in the terminal.
+        """
+
+        # run as a daemon, so that the thread never keeps the program alive
+        super().__init__(daemon=True)
+
+        # metrics to be reported and where to report them
+        self.metrics = metrics
+        self.output_path = output_path
+        self.interval = interval
+
+        # whether writing the metrics has failed, to warn only once
+        self.write_failed = False
+
+        # progress bar over the battles of the simulation
+        self.bar = tqdm(total=metrics.total_battles, desc="Running the Simulation", unit="battle") if show_bar else None
+
+        # event used to stop the thread
+        self.stop_event = threading.Event()
+
+    def report(self):
+        """
+        Updates the progress bar and publishes the metrics once.
+        """
+
+        # update the progress bar with the battles completed since the last report
+        if self.bar is not None:
+            snapshot = self.metrics.snapshot()
+            self.bar.update(snapshot["battles"] - self.bar.n)
+            self.bar.set_postfix(games=snapshot["games"], turns=snapshot["turns"])
+
+        # publish the metrics, warning only once if they cannot be written, so that a monitoring failure never stops the simulation or loses its results
+        if self.output_path is not None:
+            try:
+                self.metrics.write(self.output_path)
+            except OSError as error:
+                if not self.write_failed:
+                    print(f"Warning: the metrics cannot be written to {self.output_path}: {error}", file=sys.stderr)
+                self.write_failed = True
+
+    def run(self):
+        """
+        Reports the metrics every interval seconds until the thread is stopped.
+        """
+
+        # wait for the interval and report, until the thread is stopped
+        while not self.stop_event.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        """
+        Stops the thread, reporting the final metrics and closing the progress bar.
+        """
+
+        # stop the thread and wait for it to end
+        self.stop_event.set()
+        self.join()
+
+        # report the final metrics
+        self.report()
+        if self.bar is not None:
+            self.bar.close()
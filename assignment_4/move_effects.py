@@ -0,0 +1,390 @@
+import os
+import sys
+import re
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_core import RuleSet, draw, floor
+
+# codes of the opcodes of the move effects, each one the index of its handler in the dispatch table of EffectRuleSet
+OP_STAGES = 0
+OP_STATUS = 1
+OP_TRAP = 2
+OP_DRAIN = 3
+OP_RECOIL = 4
+OP_HEAL = 5
+OP_FAINT_USER = 6
+
+# major statuses, of which a pokemon can have only one at a time, and the types that are immune to them
+major_statuses = {"paralysis", "sleep", "freeze", "burn", "poison", "badly poison"}
+status_immunities = {"paralysis": "electric", "freeze": "ice", "burn": "fire", "poison": "poison", "badly poison": "poison"}
+
+# multipliers of the stats and of the accuracy for each stage from -6 to +6, indexed by stage + 6
+stat_multipliers = tuple(max(2, 2 + stage) / max(2, 2 - stage) for stage in range(-6, 7))
+accuracy_multipliers = tuple(max(3, 3 + stage) / max(3, 3 - stage) for stage in range(-6, 7))
+
+# equally likely numbers of hits of the moves striking 2-5 times (2 and 3 hits with probability 3/8, 4 and 5 hits with probability 1/8)
+two_to_five_hits = (2, 2, 2, 3, 3, 3, 4, 5)
+
+# sentences of the descriptions of the moves that are compiled into opcodes
+drain_pattern = re.compile(r"recover (\d+)% of the HP drained")
+trap_pattern = re.compile(r"lose 1⁄(\d+) of their maximum HP after each turn, for (\d+)-(\d+) turns")
+recoil_pattern = re.compile(r"receives 1⁄(\d+) of the damage")
+heal_pattern = re.compile(r"(?:restores|recovers) up to (\d+)% of the user's maximum HP")
+poison_pattern = re.compile(r"(\d+)% chance of poisoning")
+
+def compile_effects(move):
+    """
+    Compiles the effects of a move, as described in the dataset of moves, into the number of hits of the move and a list of opcodes run when the move hits.
+    The descriptions are read only here, at load time, so that using a move never inspects strings.
+    Effects that cannot be compiled (e.g., two-turn moves, disable, transform) are ignored.
+
+    Parameters:
+    - move: dictionary with a move, with the keys "effect", "effects" and "changes" when they are in the dataset.
+
+    Returns:
+    - hits: tuple with the equally likely numbers of hits of the move, empty for status moves, that deal no damage.
+    - opcodes: tuple of opcodes, each one a tuple with the code of the opcode and a tuple with its arguments.
+    """
+
+    # text of the descriptions of the effects and of their changes across generations
+    effects_text = " ".join(move.get("effects", []))
+    changes_text = " ".join(move.get("changes", []))
+
+    # number of hits: status moves do not hit, moves striking twice always hit twice, the other multi-hit moves hit 2-5 times
+    if move["category"] == "status":
+        hits = ()
+    elif "strike twice" in effects_text:
+        hits = (2,)
+    elif "each hit will always deal the same damage" in changes_text:
+        hits = two_to_five_hits
+    else:
+        hits = (1,)
+
+    opcodes = []
+
+    # stat stages and status conditions, with the probability of applying them (None if they are always applied)
+    # stages are raised for the user and lowered for the opponent
+    effect = move.get("effect")
+    if effect is not None:
+        if "stat" in effect:
+            opcodes.append((OP_STAGES, (effect["stages"] > 0, effect["stat"], effect["stages"], effect.get("chance"))))
+        if "statusCondition" in effect:
+            opcodes.append((OP_STATUS, (effect["statusCondition"], effect.get("chance"))))
+
+    # effects described only in the text
+    match = poison_pattern.search(effects_text)
+    if match is not None:
+        opcodes.append((OP_STATUS, ("poison", int(match.group(1)) / 100)))
+    match = trap_pattern.search(effects_text)
+    if match is not None:
+        opcodes.append((OP_TRAP, (int(match.group(2)), int(match.group(3)), 1 / int(match.group(1)))))
+    match = drain_pattern.search(effects_text)
+    if match is not None:
+        opcodes.append((OP_DRAIN, (int(match.group(1)) / 100,)))
+    match = recoil_pattern.search(effects_text)
+    if match is not None:
+        opcodes.append((OP_RECOIL, (1 / int(match.group(1)),)))
+    match = heal_pattern.search(effects_text)
+    if match is not None:
+        opcodes.append((OP_HEAL, (int(match.group(1)) / 100,)))
+    if "causes the user to faint" in effects_text:
+        opcodes.append((OP_FAINT_USER, ()))
+
+    return hits, tuple(opcodes)
+
+class EffectRuleSet(RuleSet):
+    """
+    Class with the rules of a battle where moves have effects: stat stages, status conditions, multiple hits, traps, draining, recoil, healing, high critical hit ratio.
+    The effects of each move are compiled at load time into opcodes (see compile_effects), kept in the keys "hits" and "opcodes" of the move,
+    and are run with a dispatch table, so that moves without effects only pay a check of their opcodes.
+    The state of the battle is kept in the fields of the pokemons (see PokemonCharacter.reset_battle_state), and is checked only for the pokemons marked as affected by an effect.
+    """
+
+    def __init__(self, stat_model="active", type_effectiveness=None, crit_model="speed", track_pps=False, **kwargs):
+        """
+        An EffectRuleSet is initialized by compiling its rules, as a RuleSet, and its dispatch table.
+
+        Parameters:
+        - see RuleSet.
+        """
+
+        super().__init__(stat_model, type_effectiveness, crit_model, track_pps, **kwargs)
+
+        # handler of each opcode, indexed by its code
+        self.handlers = (self.apply_stages, self.apply_status, self.apply_trap, self.apply_drain, self.apply_recoil, self.apply_heal, self.apply_faint_user)
+
+    def compile_terms(self, attacker, move, defender):
+        """
+        Compiles the terms of a move that do not depend on the random draws nor on the state of the battle.
+
+        Parameters:
+        - attacker: PokemonCharacter object using the move.
+        - move: dictionary representing the move, loaded with its effects.
+        - defender: PokemonCharacter object receiving the move.
+
+        Returns:
+        - terms: tuple with the terms of RuleSet.compile_terms (base damage None for status moves), the stats used by the damage formula, the hits and the opcodes of the move.
+        """
+
+        # status moves only run their opcodes
+        if not move["hits"]:
+            return move["accuracy"], None, None, None, None, None, move["hits"], move["opcodes"]
+
+        # damage terms, with 8 times the probability of a critical hit for moves with a high critical hit ratio
+        accuracy, critical_probability, base, stability_effect = super().compile_terms(attacker, move, defender)
+        if critical_probability is not None and move["highCriticalHitRatio"]:
+            critical_probability = min(critical_probability * 8, 255 / 256)
+        attack_stat, defense_stat = ("attack", "defense") if move["category"] == "physical" else ("special", "special")
+
+        return accuracy, critical_probability, base, stability_effect, attack_stat, defense_stat, move["hits"], move["opcodes"]
+
+    def can_act(self, pokemon):
+        """
+        Checks whether a pokemon can use its move, given its status, updating the counters of the status.
+
+        Parameters:
+        - pokemon: PokemonCharacter object about to use a move.
+
+        Returns:
+        - can_act: boolean indicating whether the pokemon uses its move.
+        """
+
+        # a flinched pokemon loses its move
+        if pokemon.flinched:
+            pokemon.flinched = False
+            return False
+
+        # major statuses: sleep lasts a fixed number of turns, a frozen pokemon thaws with probability 0.2, a paralyzed one cannot move with probability 0.25
+        status = pokemon.status
+        if status == "sleep":
+            if pokemon.status_turns > 0:
+                pokemon.status_turns -= 1
+                return False
+            pokemon.status = None
+        elif status == "freeze":
+            if draw() >= 0.2:
+                return False
+            pokemon.status = None
+        elif status == "paralysis" and draw() < 0.25:
+            return False
+
+        # a confused pokemon hurts itself with probability 0.5, with a typeless physical move of power 40
+        if pokemon.confusion_turns > 0:
+            pokemon.confusion_turns -= 1
+            if pokemon.confusion_turns > 0 and draw() < 0.5:
+                stats = self.stats(pokemon)
+                pokemon.curr_hp -= floor((2 * pokemon.level + 10) / 250 * (stats["attack"] / stats["defense"]) * 40 + 2)
+                return False
+
+        return True
+
+    def use_move(self, attacker, move_name, defender):
+        """
+        Makes the attacker use a move against the defender, with the effects of the move and of the state of the battle.
+        With no status, no stage and a move without effects, the draws are the same of RuleSet.use_move.
+
+        Parameters:
+        - attacker: PokemonCharacter object using the move.
+        - move_name: string with the name of the move.
+        - defender: PokemonCharacter object receiving the move.
+
+        Returns:
+        - damage: integer with the damage dealt to the defender (0 for status moves), or None if the move missed or the attacker could not move.
+        """
+
+        # compiled terms of the move
+        key = (attacker.name, attacker.level, move_name, defender.name, defender.level)
+        terms = self.compiled.get(key)
+        if terms is None:
+            if len(self.compiled) >= self.max_compiled:
+                self.compiled.clear()
+            terms = self.compiled[key] = self.compile_move(attacker, move_name, defender)
+        accuracy, critical_probability, base, stability_effect, attack_stat, defense_stat, hits, opcodes = terms
+
+        # reduce the pps of the move, independently of whether the move succeeds or not
+        if self.track_pps:
+            attacker.curr_pps[move_name] -= 1
+
+        # the state of the battle changes the move only if a pokemon is affected by stages or statuses
+        if attacker.affected or defender.affected:
+
+            # the status of the attacker can prevent it from moving
+            if not self.can_act(attacker):
+                return None
+            accuracy, base = self.apply_state(attacker, defender, accuracy, base, attack_stat, defense_stat)
+
+        # the move succeeds with a probability equal to its accuracy
+        if draw() >= accuracy:
+            return None
+
+        # status moves deal no damage
+        if not hits:
+            damage = 0
+
+        # deal the damage of a single hit, as in RuleSet.use_move
+        elif hits[0] == 1:
+            critical = 2 if critical_probability is not None and draw() < critical_probability else 1
+            damage = floor(base * (stability_effect * critical * (self.luck_min + self.luck_width * draw())))
+            defender.curr_hp -= damage
+
+        # deal the damage of each of multiple hits, stopping when the defender is defeated: the critical hit and the luck are drawn once, so each hit deals the same damage
+        else:
+            n_hits = hits[0] if len(hits) == 1 else hits[floor(draw() * len(hits))]
+            critical = 2 if critical_probability is not None and draw() < critical_probability else 1
+            hit = floor(base * (stability_effect * critical * (self.luck_min + self.luck_width * draw())))
+            damage = 0
+            for _ in range(n_hits):
+                defender.curr_hp -= hit
+                damage += hit
+                if defender.curr_hp <= 0:
+                    break
+
+        # run the effects of the move
+        if opcodes:
+            handlers = self.handlers
+            for code, args in opcodes:
+                handlers[code](attacker, defender, damage, args)
+
+        return damage
+
+    def apply_state(self, attacker, defender, accuracy, base, attack_stat, defense_stat):
+        """
+        Changes the accuracy of a move by the accuracy stage of the attacker and the evasiveness stage of the defender,
+        and its base damage by the stages of the stats of the damage formula, halving the physical attack of a burned attacker.
+
+        Parameters:
+        - attacker: PokemonCharacter object using the move.
+        - defender: PokemonCharacter object receiving the move.
+        - accuracy, base, attack_stat, defense_stat: compiled terms of the move (see compile_terms).
+
+        Returns:
+        - accuracy: float with the accuracy of the move.
+        - base: float with the base damage of the move, or None for status moves.
+        """
+
+        attacker_stages = attacker.stages
+        defender_stages = defender.stages
+        stage = attacker_stages.get("accuracy", 0) - defender_stages.get("evasiveness", 0)
+        accuracy *= accuracy_multipliers[max(-6, min(6, stage)) + 6]
+        if base is not None:
+            ratio = stat_multipliers[attacker_stages.get(attack_stat, 0) + 6] / stat_multipliers[defender_stages.get(defense_stat, 0) + 6]
+            if attacker.status == "burn" and attack_stat == "attack":
+                ratio *= 0.5
+            base = (base - 2) * ratio + 2
+        return accuracy, base
+
+    def apply_stages(self, attacker, defender, damage, args):
+        """
+        Opcode changing a stat stage of the attacker or of the defender, between -6 and +6.
+        """
+
+        to_attacker, stat, stages, chance = args
+        if chance is None or draw() < chance:
+            pokemon = attacker if to_attacker else defender
+            pokemon.stages[stat] = max(-6, min(6, pokemon.stages.get(stat, 0) + stages))
+            pokemon.affected = True
+
+    def apply_status(self, attacker, defender, damage, args):
+        """
+        Opcode inflicting a status condition to the defender, unless it already has one or its types are immune to it.
+        The defender is marked as affected even when the status is not inflicted, which only costs the checks of the state.
+        """
+
+        status, chance = args
+        if chance is not None and draw() >= chance:
+            return
+
+        # volatile statuses
+        defender.affected = True
+        if status == "flinch":
+            defender.flinched = True
+        elif status == "confused":
+            if defender.confusion_turns == 0:
+                defender.confusion_turns = 2 + floor(draw() * 4)
+
+        # major statuses, with the number of turns of sleep and the counter of bad poison
+        elif status in major_statuses and defender.status is None and status_immunities.get(status) not in defender.types:
+            defender.status = status
+            defender.status_turns = 1 + floor(draw() * 7) if status == "sleep" else 0
+
+    def apply_trap(self, attacker, defender, damage, args):
+        """
+        Opcode trapping the defender, that loses a fraction of its maximum HP at the end of each turn.
+        """
+
+        min_turns, max_turns, fraction = args
+        if defender.trap_turns == 0:
+            defender.trap_turns = min_turns + floor(draw() * (max_turns - min_turns + 1))
+            defender.trap_damage = max(1, floor(self.stats(defender)["hp"] * fraction))
+
+    def apply_drain(self, attacker, defender, damage, args):
+        """
+        Opcode restoring to the attacker a fraction of the damage dealt.
+        """
+
+        if damage > 0:
+            attacker.curr_hp = min(self.stats(attacker)["hp"], attacker.curr_hp + max(1, floor(damage * args[0])))
+
+    def apply_recoil(self, attacker, defender, damage, args):
+        """
+        Opcode hurting the attacker with a fraction of the damage dealt.
+        """
+
+        if damage > 0:
+            attacker.curr_hp -= max(1, floor(damage * args[0]))
+
+    def apply_heal(self, attacker, defender, damage, args):
+        """
+        Opcode restoring to the attacker a fraction of its maximum HP.
+        """
+
+        max_hp = self.stats(attacker)["hp"]
+        attacker.curr_hp = min(max_hp, attacker.curr_hp + floor(max_hp * args[0]))
+
+    def apply_faint_user(self, attacker, defender, damage, args):
+        """
+        Opcode making the attacker faint.
+        """
+
+        attacker.curr_hp = 0
+
+    def end_turn(self, pokemon):
+        """
+        Applies the residual damages at the end of a turn: burn and poison (1/16 of the maximum HP, n/16 at the n-th turn of bad poison) and traps.
+
+        Parameters:
+        - pokemon: PokemonCharacter object.
+        """
+
+        pokemon.flinched = False
+        status = pokemon.status
+        if status == "burn" or status == "poison":
+            pokemon.curr_hp -= max(1, floor(self.stats(pokemon)["hp"] / 16))
+        elif status == "badly poison":
+            pokemon.status_turns += 1
+            pokemon.curr_hp -= max(1, floor(self.stats(pokemon)["hp"] * pokemon.status_turns / 16))
+        if pokemon.trap_turns > 0:
+            pokemon.trap_turns -= 1
+            pokemon.curr_hp -= pokemon.trap_damage
+
+# rule sets with effects compiled for each type chart, kept with the type chart so that its id is not reused
+compiled_effect_rules = {}
+
+def effect_rules_for(type_effectiveness):
+    """
+    Returns the rule set with effects of a type chart, with active stats and no pps consumed, compiling it the first time.
+
+    Parameters:
+    - type_effectiveness: type chart (see battle_core.compile_effectiveness), or None.
+
+    Returns:
+    - rules: EffectRuleSet object.
+    """
+
+    key = id(type_effectiveness)
+    entry = compiled_effect_rules.get(key)
+    if entry is None:
+        entry = compiled_effect_rules[key] = (type_effectiveness, EffectRuleSet("active", type_effectiveness))
+    return entry[1]
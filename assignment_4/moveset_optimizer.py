@@ -0,0 +1,366 @@
+import os
+import sys
+import math
+import random
+import argparse
+import pandas as pd
+from simulations import load_moves, read_pokemons, pokemons_with_moves, load_type_effectiveness, build_encounter_table, to_pokemon_character, run_battle
+from policies import ExpectedDamageTable, GreedyPolicy
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encounters import EncounterTable, load_encounter_weights
+
+def sample_opponents(opponent_table, n_opponents, seed):
+    """
+    Samples the opponents of the target distribution, merging the repeated ones.
+
+    Parameters:
+    - opponent_table: EncounterTable object whose samples are the dictionaries of the opponents, with their levels.
+    - n_opponents: integer with the number of opponents to sample.
+    - seed: integer with the random seed of the sample.
+
+    Returns:
+    - opponents: list of tuples (pokemon, weight), where pokemon is a PokemonCharacter and weight the fraction of the sample it represents.
+    """
+
+    # sample the opponents and count the repeated ones
+    rng = random.Random(seed)
+    counts = {}
+    records = {}
+    for _ in range(n_opponents):
+        record, level = opponent_table.sample(rng)
+        counts[(record["name"], level)] = counts.get((record["name"], level), 0) + 1
+        records[(record["name"], level)] = record
+
+    return [(to_pokemon_character({**records[key], "level": key[1]}), count / n_opponents) for key, count in counts.items()]
+
+class MatchupTable:
+    """
+    Class to score movesets of a species against the opponents of the target distribution, without simulating battles.
+    The value of a move against an opponent is the fraction of the hps of the opponent it removes per turn, on average, computed once and cached.
+    With the greedy policy the score of a moveset is the weighted mean over the opponents of the value of its best move, with the random policy of the mean value of its moves.
+    """
+
+    def __init__(self, pokemon, pool, opponents, damage_table, policy="greedy"):
+        """
+        A MatchupTable is initialized by computing the value of each move of the pool against each opponent.
+
+        Parameters:
+        - pokemon: PokemonCharacter object representing the species whose moveset is optimized, at its level.
+        - pool: list of dictionaries with the moves that the species can learn.
+        - opponents: list of tuples (pokemon, weight) returned by sample_opponents.
+        - damage_table: ExpectedDamageTable object.
+        - policy: string with the policy choosing the moves of the species, "greedy" or "random".
+        """
+
+        # value of each move against each opponent
+        self.policy = policy
+        self.weights = [weight for _, weight in opponents]
+        values = [[damage_table.get(pokemon, move, opponent) / opponent.active_stats["hp"] for opponent, _ in opponents] for move in pool]
+
+        # sort the moves by their mean value, so that good movesets are found early and the bounds prune more
+        mean_values = [sum(w * v for w, v in zip(self.weights, row)) for row in values]
+        order = sorted(range(len(pool)), key=lambda i: -mean_values[i])
+        self.pool = [pool[i] for i in order]
+        self.values = [values[i] for i in order]
+        self.mean_values = [mean_values[i] for i in order]
+
+        # best value against each opponent among the moves from index i on, used by the bounds of the greedy score
+        self.suffix_best = [[0.0] * len(opponents) for _ in range(len(pool) + 1)]
+        for i in range(len(pool) - 1, -1, -1):
+            self.suffix_best[i] = [max(a, b) for a, b in zip(self.values[i], self.suffix_best[i + 1])]
+
+    def score(self, indices):
+        """
+        Computes the score of a moveset.
+
+        Parameters:
+        - indices: list of integers with the indices of the moves of the moveset in self.pool.
+
+        Returns:
+        - score: float with the score of the moveset.
+        """
+
+        if self.policy == "random":
+            return sum(self.mean_values[i] for i in indices) / len(indices)
+        return sum(w * max(self.values[i][k] for i in indices) for k, w in enumerate(self.weights))
+
+    def bound(self, indices, best_per_opponent, size):
+        """
+        Computes an upper bound of the score of all movesets that extend a partial moveset with moves of larger index.
+
+        Parameters:
+        - indices: list of integers with the indices of the moves of the partial moveset.
+        - best_per_opponent: list with the best value against each opponent among the moves of the partial moveset.
+        - size: integer with the number of moves of a complete moveset.
+
+        Returns:
+        - bound: float with the upper bound.
+        """
+
+        # the remaining moves are at best the next ones in the order of the mean values
+        start = indices[-1] + 1 if indices else 0
+        if self.policy == "random":
+            remaining = size - len(indices)
+            return (sum(self.mean_values[i] for i in indices) + sum(self.mean_values[start:start + remaining])) / size
+
+        # against each opponent, the moveset is at best as good as the best remaining move
+        return sum(w * max(b, s) for w, b, s in zip(self.weights, best_per_opponent, self.suffix_best[start]))
+
+    def top_movesets(self, n_movesets, size=4):
+        """
+        Finds the movesets with the highest scores with a branch-and-bound search over the combinations of moves.
+
+        Parameters:
+        - n_movesets: integer with the number of movesets to return.
+        - size: integer with the number of moves of a moveset.
+
+        Returns:
+        - movesets: list of tuples (score, indices), sorted by decreasing score.
+        - n_scored: integer with the number of complete movesets whose score has been computed.
+        """
+
+        best = []
+        n_scored = 0
+
+        def extend(indices, best_per_opponent):
+            nonlocal n_scored
+
+            # score a complete moveset and keep the best ones
+            if len(indices) == size:
+                n_scored += 1
+                best.append((self.score(indices), list(indices)))
+                best.sort(key=lambda item: -item[0])
+                del best[n_movesets:]
+                return
+
+            # extend the partial moveset with each move of larger index, leaving room for the missing moves
+            start = indices[-1] + 1 if indices else 0
+            for i in range(start, len(self.pool) - (size - len(indices)) + 1):
+                extended = indices + [i]
+                extended_best = [max(b, v) for b, v in zip(best_per_opponent, self.values[i])]
+
+                # prune the branch if it cannot enter the best movesets
+                if len(best) == n_movesets and self.bound(extended, extended_best, size) <= best[-1][0]:
+                    continue
+                extend(extended, extended_best)
+
+        extend([], [0.0] * len(self.weights))
+        return best, n_scored
+
+def wilson_interval(wins, n, z=1.96):
+    """
+    Computes the Wilson score interval of a win rate.
+
+    Parameters:
+    - wins: number of battles won.
+    - n: integer with the number of battles.
+    - z: float with the quantile of the standard normal distribution of the confidence level. The default is 1.96, i.e., 95%.
+
+    Returns:
+    - low: float with the lower end of the interval.
+    - high: float with the upper end of the interval.
+    """
+
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+    half_width = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n)
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+def simulate_moveset(species, moves, level, opponent_table, type_effectiveness, seeds, policy, max_turns):
+    """
+    Simulates battles of a species with a moveset against opponents sampled from the target distribution.
+    The battle with a given seed has the same opponent for all movesets (common random numbers), so that movesets are compared on the same battles.
+
+    Parameters:
+    - species: dictionary with the species.
+    - moves: list of dictionaries with the moves of the moveset.
+    - level: integer with the level of the species.
+    - opponent_table: EncounterTable object whose samples are the dictionaries of the opponents, with their levels.
+    - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+    - seeds: list of integers with the seeds of the battles.
+    - policy: policy object choosing the moves of the species, or None for random moves.
+    - max_turns: integer with the maximum number of turns of a battle, after which it is a draw.
+
+    Returns:
+    - wins: integer with the number of battles won.
+    """
+
+    wins = 0
+    for seed in seeds:
+        random.seed(seed)
+        record, opponent_level = opponent_table.sample()
+        pokemon = to_pokemon_character({**species, "moves": moves, "level": level})
+        opponent = to_pokemon_character({**record, "level": opponent_level})
+        wins += run_battle(pokemon, opponent, type_effectiveness, max_turns=max_turns, starter_policy=policy)[0]
+
+    return wins
+
+def successive_halving(species, candidates, level, opponent_table, type_effectiveness, policy, initial_battles=50, eta=2, max_turns=200, random_seed=27):
+    """
+    Ranks candidate movesets with successive halving: all candidates play a few battles, then only the best 1/eta of them play eta times as many, and so on.
+    The battles of a candidate are never simulated twice: each rung only adds the battles that the candidate has not played yet.
+
+    Parameters:
+    - species: dictionary with the species.
+    - candidates: list of lists of move dictionaries with the candidate movesets.
+    - level: integer with the level of the species.
+    - opponent_table: EncounterTable object whose samples are the dictionaries of the opponents, with their levels.
+    - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+    - policy: policy object choosing the moves of the species, or None for random moves.
+    - initial_battles: integer with the number of battles of each candidate in the first rung.
+    - eta: integer with the ratio between the number of candidates of consecutive rungs.
+    - max_turns: integer with the maximum number of turns of a battle, after which it is a draw.
+    - random_seed: integer with the random seed of the battles.
+
+    Returns:
+    - results: list of dictionaries with the rung reached by each candidate, its battles and its wins.
+    """
+
+    # seeds of the battles, shared by all candidates and extended when needed
+    rng = random.Random(random_seed)
+    seeds = []
+    results = [{"candidate": i, "rung": 0, "battles": 0, "wins": 0} for i in range(len(candidates))]
+    alive = list(range(len(candidates)))
+    n_battles = initial_battles
+    rung = 0
+
+    while alive:
+        rung += 1
+        seeds.extend(rng.getrandbits(32) for _ in range(n_battles - len(seeds)))
+
+        # play the missing battles of each candidate still alive
+        for i in alive:
+            results[i]["wins"] += simulate_moveset(species, candidates[i], level, opponent_table, type_effectiveness, seeds[results[i]["battles"]:n_battles], policy, max_turns)
+            results[i]["battles"] = n_battles
+            results[i]["rung"] = rung
+
+        # keep the best candidates for the next rung
+        if len(alive) == 1:
+            break
+        alive = sorted(alive, key=lambda i: -results[i]["wins"])[:max(1, len(alive) // eta)]
+        n_battles *= eta
+
+    return results
+
+def optimize_moveset(species, pool, level, opponents, opponent_table, type_effectiveness, policy="greedy", n_candidates=32, initial_battles=50, eta=2, max_turns=200, random_seed=27):
+    """
+    Finds the best movesets of a species against a target distribution of opponents.
+    Candidates are the movesets with the highest scores in the matchup table, then ranked by simulation with successive halving.
+
+    Parameters:
+    - species: dictionary with the species.
+    - pool: list of dictionaries with the moves that the species can learn.
+    - level: integer with the level of the species.
+    - opponents: list of tuples (pokemon, weight) returned by sample_opponents, used by the matchup table.
+    - opponent_table: EncounterTable object of the target distribution, used by the simulations.
+    - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+    - policy: string with the policy choosing the moves of the species, "greedy" or "random".
+    - n_candidates: integer with the number of candidates ranked by simulation.
+    - initial_battles: integer with the number of battles of each candidate in the first rung.
+    - eta: integer with the ratio between the number of candidates of consecutive rungs.
+    - max_turns: integer with the maximum number of turns of a battle, after which it is a draw.
+    - random_seed: integer with the random seed of the battles.
+
+    Returns:
+    - ranking: pandas dataframe with a row for each candidate, sorted by rung reached and win rate.
+    - n_scored: integer with the number of movesets scored by the branch-and-bound search.
+    """
+
+    # best movesets according to the matchup table
+    damage_table = ExpectedDamageTable(type_effectiveness)
+    pokemon = to_pokemon_character({**species, "moves": pool, "level": level})
+    matchup_table = MatchupTable(pokemon, pool, opponents, damage_table, policy)
+    top, n_scored = matchup_table.top_movesets(n_candidates)
+    candidates = [[matchup_table.pool[i] for i in indices] for _, indices in top]
+
+    # rank the candidates by simulation
+    battle_policy = GreedyPolicy(damage_table) if policy == "greedy" else None
+    results = successive_halving(species, candidates, level, opponent_table, type_effectiveness, battle_policy, initial_battles, eta, max_turns, random_seed)
+
+    # collect the ranking, with the 95% confidence interval of each win rate
+    rows = []
+    for result, (score, _), moves in zip(results, top, candidates):
+        low, high = wilson_interval(result["wins"], result["battles"])
+        rows.append({
+            "Moves": ", ".join(move["name"] for move in moves),
+            "Matchup Score": score,
+            "Rung": result["rung"],
+            "Battles": result["battles"],
+            "Win Rate": result["wins"] / result["battles"],
+            "CI Low": low,
+            "CI High": high
+        })
+    ranking = pd.DataFrame(rows).sort_values(["Rung", "Win Rate"], ascending=False, ignore_index=True)
+    ranking.insert(0, "Rank", range(1, len(ranking) + 1))
+
+    return ranking, n_scored
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Finds the best four-move sets of a species against a target distribution of opponents.")
+
+    # arguments
+    parser.add_argument("-s", "--species", type=str, required=True, help="Name of the species whose moveset is optimized.")
+    parser.add_argument("--level", type=int, required=False, default=10, help="Level of the species.")
+    parser.add_argument("--wild_levels", type=int, nargs=2, required=False, default=[1, 20], help="Minimum and maximum level of the opponents, sampled uniformly with the species if no habitat is given.")
+    parser.add_argument("--habitat", type=str, required=False, default=None, help="Habitat whose encounter weights give the opponents and their levels.")
+    parser.add_argument("--policy", type=str, required=False, default="greedy", choices=["greedy", "random"], help="Policy choosing the moves of the species in battle.")
+    parser.add_argument("--n_opponents", type=int, required=False, default=1000, help="Number of opponents sampled to compute the matchup scores.")
+    parser.add_argument("--n_candidates", type=int, required=False, default=32, help="Number of movesets with the best matchup scores ranked by simulation.")
+    parser.add_argument("--initial_battles", type=int, required=False, default=50, help="Number of battles of each candidate in the first rung of successive halving.")
+    parser.add_argument("--eta", type=int, required=False, default=2, help="Ratio between the number of candidates of consecutive rungs.")
+    parser.add_argument("--max_turns", type=int, required=False, default=200, help="Maximum number of turns of a battle, after which it is a draw.")
+    parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed, used to draw the moves of the opponents and the battles.")
+    parser.add_argument("--input_pokemons", type=str, required=False, default=os.path.join("..", "data", "pokemons.json"), help="Path to the dataset with pokemons.")
+    parser.add_argument("--input_moves", type=str, required=False, default=os.path.join("..", "data", "moves.json"), help="Path to the dataset with moves.")
+    parser.add_argument("--input_type_effectiveness", type=str, required=False, default=os.path.join("..", "data", "type_effectiveness.json"), help="Path to the dataset with type effectiveness pairs.")
+    parser.add_argument("--encounters", type=str, required=False, default=os.path.join("..", "data", "encounters.json"), help="Path to the dataset with the encounter weights of each habitat.")
+    parser.add_argument("-o", "--output", type=str, required=False, default=os.path.join("results", "movesets.csv"), help="Path to the .csv file where to save the ranked movesets.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # load the data, drawing the moves of the opponents as done by simulations.py
+    random.seed(args.random_seed)
+    moves = load_moves(args.input_moves)
+    records = read_pokemons(args.input_pokemons)
+    pokemons = pokemons_with_moves(records, moves)
+    type_effectiveness = load_type_effectiveness(args.input_type_effectiveness)
+
+    # species and pool of moves it can learn, with the same type rule of pokemons_with_moves
+    species = {record["name"]: record for record in records}.get(args.species)
+    if species is None:
+        raise ValueError(f"Unknown species {args.species}.")
+    pool = moves[(moves["type"] == "normal") | (moves["type"].isin(species["types"]))].to_dict(orient="records")
+
+    # target distribution of the opponents
+    if args.habitat is not None:
+        opponent_table = build_encounter_table(pokemons, load_encounter_weights(args.encounters)[args.habitat])
+    else:
+        opponent_table = EncounterTable([{"pokemon": record, "levels": args.wild_levels} for record in pokemons.to_dict(orient="records")])
+    opponents = sample_opponents(opponent_table, args.n_opponents, args.random_seed)
+
+    # optimize the moveset
+    ranking, n_scored = optimize_moveset(species, pool, args.level, opponents, opponent_table, type_effectiveness, args.policy, args.n_candidates, args.initial_battles, args.eta, args.max_turns, args.random_seed)
+
+    # save the ranking
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    ranking.to_csv(args.output, index=False)
+    print(f"{n_scored} of {math.comb(len(pool), 4)} movesets of {args.species} scored after pruning.")
+    print(ranking.head(10).to_string(index=False))
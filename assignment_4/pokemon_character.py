@@ -1,5 +1,12 @@
-import random
+import os
+import sys
 import math
+from move_effects import effect_rules_for
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_core import rules_for
 # from utils import type_text
 
 class PokemonCharacter:
@@ -7,6 +14,13 @@ class PokemonCharacter:
     Class to represent a pokemon in the pokemon game.
     """
 
+    # last type chart used by a move and its compiled rules: active stats, critical hits and no pps consumed (see use_move)
+    type_chart = None
+    rules = None
+
+    # whether moves have their effects (see move_effects.py), which requires the moves loaded with their effects compiled
+    move_effects = False
+
     def __init__(self, name, base_stats, moves, national_pokedex_number, types=["normal"], level=1):
         """
         A pokemon character is initialized by setting the parameters below.
@@ -61,6 +75,38 @@ class PokemonCharacter:
         self.curr_pps = {}
         for move in self.moves:
             self.curr_pps[move["name"]] = move["pp"]
+
+        # initialize the state of the pokemon in a battle with move effects
+        self.reset_battle_state()
+
+    @staticmethod
+    def set_move_effects(enabled):
+        """
+        Enables or disables the effects of the moves for all pokemons.
+
+        Parameters:
+        - enabled: boolean indicating whether moves have their effects.
+        """
+
+        PokemonCharacter.move_effects = enabled
+
+        # force the rules to be compiled again at the next move
+        PokemonCharacter.type_chart = None
+
+    def reset_battle_state(self):
+        """
+        Resets the state of the pokemon in a battle with move effects, e.g., after a battle or at the pokemon center.
+        """
+
+        # whether stages or statuses have been changed by moves, stages of the stats, status condition and counters of the turns of sleep or bad poison, of confusion and of traps
+        self.affected = False
+        self.stages = {}
+        self.status = None
+        self.status_turns = 0
+        self.confusion_turns = 0
+        self.trap_turns = 0
+        self.trap_damage = 0
+        self.flinched = False
     
     def __compute_active_stats(self):
         """
@@ -93,47 +139,13 @@ class PokemonCharacter:
         - type_effectiveness: pandas dataframe with type effectivenesses of moves.
         
         Returns:
-        - damage: integer with the damage inflicted by the move.
+        - damage: integer with the damage inflicted by the move, or None if the move missed (or, with move effects, if the pokemon could not move).
         """
 
-        # get the selected move from the moves of the pokemon
-        move = None
-        for m in self.moves:
-            if m["name"] == move_name:
-                move = m
-                break
-
-        # # print some information about the move
-        # type_text(f"{self.name} uses {move_name}!\n")
-
-        # # reduce the power points (pp) of the move, independently of whether the move succeeds or not
-        # self.curr_pps[move_name] -= 1
-
-        # the move succeeds with a probability equal to its accuracy
-        if random.random() < move["accuracy"]:
-
-            # compute the effect modifier based on the move type and on the opponent pokemon type
-            effect = 1
-            for opponent_type in opponent_pokemon.types:
-                effect *= type_effectiveness[(type_effectiveness["attack"] == move["type"]) & (type_effectiveness["defend"] == opponent_type)]["effectiveness"].iloc[0]
-
-            # compute the damage dealt by the move to the opponent pokemon
-            stability = 1.5 if move["type"] in self.types else 1.0
-            critical = 2 if random.random() < (self.active_stats["speed"] / 512) else 1
-            luck = random.uniform(0.85, 1.0)
-            modifier = stability * effect * critical * luck
-            attack = self.active_stats["attack"] if move["category"] == "physical" else self.active_stats["special"]
-            defense = opponent_pokemon.active_stats["defense"] if move["category"] == "physical" else opponent_pokemon.active_stats["special"]
-            damage = math.floor(((2 * self.level + 10) / 250 * (attack / defense) * move["power"] + 2) * modifier)
-
-            # apply the damage to the opponent pokemon
-            opponent_pokemon.curr_hp -= damage
-
-            # # print some information about the move
-            # type_text(f"It dealt a damage of {damage} HP to {opponent_pokemon.name}.\n")
-        
-        # # if the move fails, just print information
-        # else:
-        #     type_text(f"{self.name}'s {move_name} missed!\n")
+        # rules of the type chart, compiled the first time it is used (see battle_core.py)
+        if type_effectiveness is not PokemonCharacter.type_chart:
+            PokemonCharacter.type_chart = type_effectiveness
+            PokemonCharacter.rules = effect_rules_for(type_effectiveness) if PokemonCharacter.move_effects else rules_for(type_effectiveness, "active", False)
 
-            return damage
+        # use the move
+        return PokemonCharacter.rules.use_move(self, move_name, opponent_pokemon)
@@ -0,0 +1,378 @@
+import os
+import sys
+import math
+import random
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from battle_core import rules_for
+from search import ExpectimaxSearch
+from pokemon_character import PokemonCharacter
+from move_effects import effect_rules_for
+
+def critical_hits(critical_probability):
+    """
+    Lists the multipliers of the damage for a critical hit and a normal hit, with their probabilities.
+
+    Parameters:
+    - critical_probability: float with the probability of a critical hit, or None if there are no critical hits.
+
+    Returns:
+    - critical_hits: list of tuples (multiplier, probability).
+    """
+
+    if critical_probability is None:
+        return [(1, 1.0)]
+    return [(2, critical_probability), (1, 1 - critical_probability)]
+
+class ExpectedDamageTable:
+    """
+    Class to compute the expected damage of a move with the terms of the damage formula compiled by the rules of PokemonCharacter.use_move (see battle_core.RuleSet.compile_terms).
+    Each value is computed once and cached, so that policies pay a dictionary lookup per turn.
+    """
+
+    # number of luck values used to average the damage over the uniform luck of the rules
+    n_luck_values = 16
+
+    # number of luck values of the damage distributions used by the search, kept small to limit its branching
+    n_outcome_luck_values = 4
+
+    def __init__(self, type_effectiveness):
+        """
+        An ExpectedDamageTable is initialized with an empty cache, after setting whether moves have their effects (see PokemonCharacter.set_move_effects).
+
+        Parameters:
+        - type_effectiveness: pandas dataframe with the effectiveness of a move given its type and the types of the opponent pokemon.
+        """
+
+        # rules of the battles with the type chart, the same used by PokemonCharacter.use_move, with the effects of the moves if they are simulated
+        self.rules = effect_rules_for(type_effectiveness) if PokemonCharacter.move_effects else rules_for(type_effectiveness, "active", False)
+        luck_min, luck_width = self.rules.luck_min, self.rules.luck_width
+
+        # luck values at the midpoints of n_luck_values equal intervals of the luck range
+        self.luck_values = [luck_min + luck_width * (i + 0.5) / ExpectedDamageTable.n_luck_values for i in range(ExpectedDamageTable.n_luck_values)]
+
+        # cache with the expected damage of each move of each attacker against each defender, at their levels
+        self.cache = {}
+
+        # luck values and cache of the damage distributions
+        self.outcome_luck_values = [luck_min + luck_width * (i + 0.5) / ExpectedDamageTable.n_outcome_luck_values for i in range(ExpectedDamageTable.n_outcome_luck_values)]
+        self.outcome_cache = {}
+
+        # cache of the exact damage distributions
+        self.exact_outcome_cache = {}
+
+    def terms(self, attacker, move, defender):
+        """
+        Compiles the terms of the damage formula of a move that do not depend on the random draws, with the rules of use_move.
+
+        Parameters:
+        - attacker: PokemonCharacter object representing the pokemon using the move.
+        - move: dictionary representing the move.
+        - defender: PokemonCharacter object representing the pokemon receiving the move.
+
+        Returns:
+        - terms: tuple with the accuracy, the probability of a critical hit (None if there are no critical hits), the base damage, the product of the stab and effectiveness multipliers
+                 and the equally likely numbers of hits of the move (see move_effects.compile_effects), empty for status moves and (1,) without move effects.
+        """
+
+        terms = self.rules.compile_terms(attacker, move, defender)
+        return terms[:4] + (move.get("hits", (1,)),)
+
+    def compute(self, attacker, move, defender):
+        """
+        Computes the expected damage of a move, averaging over accuracy, critical hits and luck.
+
+        Parameters:
+        - attacker: PokemonCharacter object representing the pokemon using the move.
+        - move: dictionary representing the move.
+        - defender: PokemonCharacter object representing the pokemon receiving the move.
+
+        Returns:
+        - expected_damage: float with the expected damage of the move.
+        """
+
+        # terms of the damage formula that do not depend on the random draws
+        accuracy, critical_probability, base, stability_effect, hits = self.terms(attacker, move, defender)
+
+        # status moves deal no damage
+        if not hits:
+            return 0.0
+
+        # average the damage of a hit over critical hits and luck values, multiplying in the order of use_move
+        expected_damage = 0
+        for critical, probability in critical_hits(critical_probability):
+            mean_damage = sum(math.floor(base * (stability_effect * critical * luck)) for luck in self.luck_values) / len(self.luck_values)
+            expected_damage += probability * mean_damage
+
+        # the move deals damage only if it hits the defender, with the same damage at each of its hits
+        return accuracy * sum(hits) / len(hits) * expected_damage
+
+    def get(self, attacker, move, defender):
+        """
+        Returns the expected damage of a move, computing it only the first time.
+
+        Parameters:
+        - attacker: PokemonCharacter object representing the pokemon using the move.
+        - move: dictionary representing the move.
+        - defender: PokemonCharacter object representing the pokemon receiving the move.
+
+        Returns:
+        - expected_damage: float with the expected damage of the move.
+        """
+
+        # the expected damage depends only on the species, the levels and the move
+        key = (attacker.name, attacker.level, move["name"], defender.name, defender.level)
+        if key not in self.cache:
+            self.cache[key] = self.compute(attacker, move, defender)
+
+        return self.cache[key]
+
+    def outcomes(self, attacker, move, defender):
+        """
+        Returns the distribution of the damage of a move over accuracy, critical hits and luck, computing it only the first time.
+
+        Parameters:
+        - attacker: PokemonCharacter object representing the pokemon using the move.
+        - move: dictionary representing the move.
+        - defender: PokemonCharacter object representing the pokemon receiving the move.
+
+        Returns:
+        - outcomes: list of tuples (probability, damage), one for each distinct damage.
+        """
+
+        # the distribution depends only on the species, the levels and the move
+        key = (attacker.name, attacker.level, move["name"], defender.name, defender.level)
+        if key not in self.outcome_cache:
+
+            # the move misses with probability 1 - accuracy, and status moves deal no damage
+            accuracy, critical_probability, base, stability_effect, hits = self.terms(attacker, move, defender)
+            probabilities = {0: 1 - accuracy if hits else 1.0}
+
+            # otherwise, each critical hit, luck value and number of hits gives a damage, merging the equal ones
+            for critical, probability in critical_hits(critical_probability) if hits else []:
+                for luck in self.outcome_luck_values:
+                    damage = math.floor(base * (stability_effect * critical * luck))
+                    for n_hits in hits:
+                        probabilities[n_hits * damage] = probabilities.get(n_hits * damage, 0.0) + accuracy * probability / len(self.outcome_luck_values) / len(hits)
+
+            self.outcome_cache[key] = [(probability, damage) for damage, probability in probabilities.items() if probability > 0]
+
+        return self.outcome_cache[key]
+
+    def luck_distribution(self, scale):
+        """
+        Computes the exact distribution of the damage floor(scale * luck), with the luck uniform in the luck range of the rules.
+        The probability of each damage is the length of the interval of luck values giving it.
+
+        Parameters:
+        - scale: float with the product of the terms of the damage formula multiplying the luck.
+
+        Returns:
+        - distribution: list of tuples (probability, damage), one for each possible damage.
+        """
+
+        # range of the damage before rounding it down
+        low = scale * self.rules.luck_min
+        high = scale * (self.rules.luck_min + self.rules.luck_width)
+        if high <= low:
+            return [(1.0, math.floor(low))]
+
+        # fraction of the range mapped to each damage
+        return [((min(high, damage + 1) - max(low, damage)) / (high - low), damage) for damage in range(math.floor(low), math.ceil(high))]
+
+    def exact_outcomes(self, attacker, move, defender):
+        """
+        Returns the exact distribution of the damage of a move over accuracy, critical hits and luck, computing it only the first time.
+        Unlike outcomes, whose few luck values limit the branching of the search, the luck is not discretized.
+
+        Parameters:
+        - attacker: PokemonCharacter object representing the pokemon using the move.
+        - move: dictionary representing the move.
+        - defender: PokemonCharacter object representing the pokemon receiving the move.
+
+        Returns:
+        - outcomes: list of tuples (probability, damage), one for each distinct damage.
+        """
+
+        # the distribution depends only on the species, the levels and the move
+        key = (attacker.name, attacker.level, move["name"], defender.name, defender.level)
+        if key not in self.exact_outcome_cache:
+
+            # the move misses with probability 1 - accuracy, and status moves deal no damage
+            accuracy, critical_probability, base, stability_effect, hits = self.terms(attacker, move, defender)
+            probabilities = {0: 1 - accuracy if hits else 1.0}
+
+            # otherwise, each critical hit, damage of a hit and number of hits gives a damage, merging the equal ones
+            for critical, probability in critical_hits(critical_probability) if hits else []:
+                for luck_probability, damage in self.luck_distribution(base * (stability_effect * critical)):
+                    for n_hits in hits:
+                        probabilities[n_hits * damage] = probabilities.get(n_hits * damage, 0.0) + accuracy * probability * luck_probability / len(hits)
+
+            self.exact_outcome_cache[key] = [(probability, damage) for damage, probability in probabilities.items() if probability > 0]
+
+        return self.exact_outcome_cache[key]
+
+class RandomPolicy:
+    """
+    Policy choosing a move uniformly at random, as in the original battles.
+    """
+
+    def choose(self, attacker, defender):
+        """
+        Chooses the move of the attacker.
+
+        Parameters:
+        - attacker: PokemonCharacter object representing the pokemon that has to choose a move.
+        - defender: PokemonCharacter object representing the opponent pokemon.
+
+        Returns:
+        - move_name: string with the name of the chosen move.
+        """
+
+        # same draw of the original battles, so that the battles do not change
+        return random.choice([move["name"] for move in attacker.moves])
+
+class GreedyPolicy:
+    """
+    Policy choosing the move with the highest expected damage.
+    """
+
+    def __init__(self, damage_table):
+        """
+        A GreedyPolicy is initialized with the table of expected damages.
+
+        Parameters:
+        - damage_table: ExpectedDamageTable object.
+        """
+
+        # table of expected damages
+        self.damage_table = damage_table
+
+    def choose(self, attacker, defender):
+        """
+        Chooses the move of the attacker. See RandomPolicy.choose.
+        """
+
+        # move with the highest expected damage, the first one in case of ties
+        return max(attacker.moves, key=lambda move: self.damage_table.get(attacker, move, defender))["name"]
+
+class EpsilonGreedyPolicy(GreedyPolicy):
+    """
+    Policy choosing a move uniformly at random with probability epsilon, and the move with the highest expected damage otherwise.
+    """
+
+    def __init__(self, damage_table, epsilon=0.1):
+        """
+        An EpsilonGreedyPolicy is initialized with the table of expected damages and the exploration probability.
+
+        Parameters:
+        - damage_table: ExpectedDamageTable object.
+        - epsilon: float with the probability of choosing a move uniformly at random.
+        """
+
+        # table of expected damages and exploration probability
+        super().__init__(damage_table)
+        self.epsilon = epsilon
+
+    def choose(self, attacker, defender):
+        """
+        Chooses the move of the attacker. See RandomPolicy.choose.
+        """
+
+        # explore with probability epsilon
+        if random.random() < self.epsilon:
+            return random.choice([move["name"] for move in attacker.moves])
+
+        # otherwise, choose greedily
+        return super().choose(attacker, defender)
+
+class SoftmaxPolicy:
+    """
+    Policy choosing each move with a probability proportional to exp(expected damage / temperature).
+    """
+
+    def __init__(self, damage_table, temperature=10.0):
+        """
+        A SoftmaxPolicy is initialized with the table of expected damages and the temperature.
+
+        Parameters:
+        - damage_table: ExpectedDamageTable object.
+        - temperature: float with the temperature, in HP. Low temperatures are close to greedy, high ones to random.
+        """
+
+        # table of expected damages and temperature
+        self.damage_table = damage_table
+        self.temperature = temperature
+
+    def choose(self, attacker, defender):
+        """
+        Chooses the move of the attacker. See RandomPolicy.choose.
+        """
+
+        # expected damages of the moves, shifted by their maximum for numerical stability
+        damages = [self.damage_table.get(attacker, move, defender) for move in attacker.moves]
+        highest = max(damages)
+        weights = [math.exp((damage - highest) / self.temperature) for damage in damages]
+
+        # sample a move with probability proportional to its weight
+        return random.choices(attacker.moves, weights=weights)[0]["name"]
+
+class SearchPolicy:
+    """
+    Policy choosing the move that maximizes the probability of winning, searching ahead with expectimax against an opponent choosing at random.
+    The search is anytime: with a time budget, each decision returns the best move found when the budget expires.
+    Without a time budget the search always reaches the maximum depth, so that battles can be replayed from their seeds.
+    """
+
+    def __init__(self, damage_table, time_budget=None, max_depth=1):
+        """
+        A SearchPolicy is initialized with the table of damages and the limits of the search.
+
+        Parameters:
+        - damage_table: ExpectedDamageTable object, providing the damage distributions of the moves.
+        - time_budget: float with the maximum number of seconds of a decision, or None.
+        - max_depth: integer with the maximum number of moves to look ahead.
+        """
+
+        # search over hps only, since battles of the simulations have neither pps nor items
+        self.search = ExpectimaxSearch(damage_table.outcomes, lambda pokemon: pokemon.active_stats["hp"], time_budget, max_depth, track_pps=False)
+
+    def choose(self, attacker, defender):
+        """
+        Chooses the move of the attacker. See RandomPolicy.choose.
+        """
+
+        return self.search.choose(attacker, defender)
+
+def make_policy(name, damage_table=None, epsilon=0.1, temperature=10.0, time_budget=None, max_depth=1):
+    """
+    Builds a policy from its name.
+
+    Parameters:
+    - name: string with the name of the policy. It can be "random", "greedy", "epsilon_greedy", "softmax" or "search".
+    - damage_table: ExpectedDamageTable object, needed by all policies except "random".
+    - epsilon: float with the exploration probability of "epsilon_greedy".
+    - temperature: float with the temperature of "softmax".
+    - time_budget: float with the maximum number of seconds of a decision of "search", or None.
+    - max_depth: integer with the maximum number of moves to look ahead of "search".
+
+    Returns:
+    - policy: policy object with a method choose(attacker, defender).
+    """
+
+    # build the policy with the input name
+    if name == "random":
+        return RandomPolicy()
+    if damage_table is None:
+        raise ValueError(f"The policy {name} needs a table of expected damages.")
+    if name == "greedy":
+        return GreedyPolicy(damage_table)
+    if name == "epsilon_greedy":
+        return EpsilonGreedyPolicy(damage_table, epsilon)
+    if name == "softmax":
+        return SoftmaxPolicy(damage_table, temperature)
+    if name == "search":
+        return SearchPolicy(damage_table, time_budget, max_depth)
+    raise ValueError(f"Unknown policy {name}. It must be \"random\", \"greedy\", \"epsilon_greedy\", \"softmax\" or \"search\".")
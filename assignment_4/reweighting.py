@@ -0,0 +1,270 @@
+import os
+import json
+import argparse
+import pandas as pd
+from simulations import read_pokemons
+from analyze_data import compute_hp_reductions, row_weights
+
+def uniform_probability(values, low, high):
+    """
+    Computes the probability of each value under a uniform distribution over the integers in [low, high].
+
+    Parameters:
+    - values: pandas series with integer values.
+    - low: integer with the minimum value of the distribution.
+    - high: integer with the maximum value of the distribution.
+
+    Returns:
+    - probabilities: pandas series with the probability of each value.
+    """
+
+    # values outside the range have probability 0
+    return values.between(low, high).astype(float) / (high - low + 1)
+
+def categorical_probability(values, weights, categories):
+    """
+    Computes the probability of each value under a categorical distribution over the input categories.
+
+    Parameters:
+    - values: pandas series with the values.
+    - weights: dictionary with the (unnormalized) weight of each category. Categories that are not in the dictionary have weight 1.
+    - categories: list with all categories of the distribution.
+
+    Returns:
+    - probabilities: pandas series with the probability of each value.
+    """
+
+    # normalize the weights over all categories
+    all_weights = {category: float(weights.get(category, 1.0)) for category in categories}
+    total = sum(all_weights.values())
+
+    # values that are not among the categories have probability 0
+    return values.map(lambda value: all_weights.get(value, 0.0) / total)
+
+def species_weights(pokemons, target):
+    """
+    Computes the weight of each wild species under the target distribution.
+    The weight of a species is its entry in target["species_weights"] (default 1), multiplied by the largest entry of target["type_weights"] among its types (default 1).
+
+    Parameters:
+    - pokemons: list of dictionaries with the pokemons that can be encountered, as returned by read_pokemons.
+    - target: dictionary with the target distribution.
+
+    Returns:
+    - weights: dictionary with the weight of each species.
+    """
+
+    # weights of the species and of the types
+    by_species = target.get("species_weights", {})
+    by_type = target.get("type_weights", {})
+
+    # combine the two weights for each species
+    return {pokemon["name"]: by_species.get(pokemon["name"], 1.0) * max(by_type.get(t, 1.0) for t in pokemon["types"]) for pokemon in pokemons}
+
+def importance_weights(battles, pokemons, source, target):
+    """
+    Computes the importance weight of each battle, that is, the ratio between its probability under the target and the source distributions.
+    The random variables of a battle are the starter pokemon, its level, the wild pokemon and its level.
+
+    Parameters:
+    - battles: pandas dataframe with a row for each battle.
+    - pokemons: list of dictionaries with the pokemons that can be encountered, as returned by read_pokemons.
+    - source: dictionary with the distribution the battles have been simulated under, with keys "starters", "starter_levels" and "wild_levels".
+    - target: dictionary with the target distribution. It can override "starter_levels" and "wild_levels", and add "starter_weights", "species_weights" and "type_weights".
+
+    Returns:
+    - weights: pandas series with the importance weight of each battle.
+    """
+
+    # all species that can be encountered
+    species = [pokemon["name"] for pokemon in pokemons]
+
+    # probability of each battle under the source distribution, where everything is sampled uniformly
+    source_probability = (
+        categorical_probability(battles["Starter Pokemon"], {}, source["starters"])
+        * uniform_probability(battles["Starter Level"], *source["starter_levels"])
+        * categorical_probability(battles["Wild Pokemon"], {}, species)
+        * uniform_probability(battles["Wild Level"], *source["wild_levels"])
+    )
+
+    # probability of each battle under the target distribution
+    target_probability = (
+        categorical_probability(battles["Starter Pokemon"], target.get("starter_weights", {}), source["starters"])
+        * uniform_probability(battles["Starter Level"], *target.get("starter_levels", source["starter_levels"]))
+        * categorical_probability(battles["Wild Pokemon"], species_weights(pokemons, target), species)
+        * uniform_probability(battles["Wild Level"], *target.get("wild_levels", source["wild_levels"]))
+    )
+
+    return target_probability / source_probability
+
+def unsupported_mass(source, target):
+    """
+    Computes the probability mass of the target distribution on levels that the source distribution never generates.
+    The reweighted statistics say nothing about this part of the target distribution.
+
+    Parameters:
+    - source: dictionary with the source distribution.
+    - target: dictionary with the target distribution.
+
+    Returns:
+    - mass: float with the probability of the target distribution outside the support of the source distribution.
+    """
+
+    # fraction of the target levels covered by the source levels, for both starters and wild pokemons
+    covered = 1.0
+    for key in ["starter_levels", "wild_levels"]:
+        low, high = target.get(key, source[key])
+        overlap = max(0, min(high, source[key][1]) - max(low, source[key][0]) + 1)
+        covered *= overlap / (high - low + 1)
+
+    return 1.0 - covered
+
+def effective_sample_size(weights):
+    """
+    Computes Kish's effective sample size of a set of weights.
+
+    Parameters:
+    - weights: pandas series with the weights.
+
+    Returns:
+    - ess: float with the effective sample size.
+    """
+
+    # no positive weight means no useful sample
+    if weights.sum() <= 0:
+        return 0.0
+
+    return weights.sum() ** 2 / (weights ** 2).sum()
+
+def weighted_summary(data, column, weights, by=None):
+    """
+    Computes the weighted mean of a column, with the effective sample size, overall or for each group.
+    Rows where the column is missing are ignored.
+
+    Parameters:
+    - data: pandas dataframe with the data.
+    - column: string with the name of the column.
+    - weights: pandas series with the weight of each row.
+    - by: string with the name of the column to group by. If None, a single summary is computed.
+
+    Returns:
+    - summary: dictionary with the mean and the effective sample size, or a dictionary of them for each group.
+    """
+
+    # keep only the rows where the column has a value
+    valid = data[column].notna()
+    values = data.loc[valid, column].astype(float)
+    weights = weights[valid]
+
+    # compute the summary of all rows
+    if by is None:
+        mean = (values * weights).sum() / weights.sum() if weights.sum() > 0 else float("nan")
+        return {"mean": mean, "ess": effective_sample_size(weights), "n": int(valid.sum())}
+
+    # compute the summary of each group
+    return {str(group): weighted_summary(data.loc[valid][data.loc[valid, by] == group], column, weights[data.loc[valid, by] == group]) for group in sorted(data.loc[valid, by].unique())}
+
+def reweight(battles, turns, pokemons, source, target):
+    """
+    Estimates the statistics of a simulation under the target distribution from the battles simulated under the source distribution.
+
+    Parameters:
+    - battles: pandas dataframe with a row for each battle.
+    - turns: pandas dataframe with a row for each turn (possibly a sample with a "Sample Weight" column), or None.
+    - pokemons: list of dictionaries with the pokemons that can be encountered, as returned by read_pokemons.
+    - source: dictionary with the source distribution.
+    - target: dictionary with the target distribution.
+
+    Returns:
+    - report: dictionary with the reweighted statistics and the diagnostics.
+    """
+
+    # compute the importance weights of the battles
+    weights = importance_weights(battles, pokemons, source, target)
+
+    # diagnostics of the weights
+    report = {
+        "diagnostics": {
+            "n_battles": len(battles),
+            "ess": effective_sample_size(weights),
+            "ess_fraction": effective_sample_size(weights) / len(battles),
+            "max_weight_share": weights.max() / weights.sum() if weights.sum() > 0 else float("nan"),
+            "unsupported_target_mass": unsupported_mass(source, target)
+        },
+        "win_rate": weighted_summary(battles, "Battle Outcome", weights),
+        "win_rate_per_starter": weighted_summary(battles, "Battle Outcome", weights, by="Starter Pokemon"),
+        "turns_per_battle": weighted_summary(battles, "Battle Turns", weights)
+    }
+
+    # statistics that need the turns
+    if turns is not None:
+
+        # each turn gets the importance weight of its battle, times its own weight in the log, without the turns 0 of the battles ending before any move
+        turns = compute_hp_reductions(turns[turns["Turn"] > 0])
+        battle_weights = battles[["Game", "Battle"]].assign(**{"Importance Weight": weights.values})
+        turns = turns.merge(battle_weights, on=["Game", "Battle"], how="left")
+        turn_weights = turns["Importance Weight"].fillna(0.0) * row_weights(turns)
+
+        # damage and hp curves
+        report["damage_per_starter"] = weighted_summary(turns, "Starter Damage Inflicted", turn_weights, by="Starter Pokemon")
+        report["hp_curve"] = weighted_summary(turns, "Absolute HP Reduction %", turn_weights, by="Turn")
+
+    return report
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Reweights the data of a simulation to estimate its statistics under a different sampling distribution.")
+
+    # arguments
+    parser.add_argument("-t", "--target", type=str, required=True, help="Path to the .json file with the target distribution.")
+    parser.add_argument("-i", "--input_data", type=str, required=False, default=os.path.join("results", "collected_data.csv"), help="Path to the file with the collected data, with a row for each turn or for each battle.")
+    parser.add_argument("-b", "--input_battles", type=str, required=False, default=None, help="Path to the file with a row for each battle, if the collected data has only a sample of the turns.")
+    parser.add_argument("-o", "--output", type=str, required=False, default=os.path.join("results", "reweighted.json"), help="Path to the .json file where to save the reweighted statistics.")
+    parser.add_argument("--pokemons", type=str, required=False, default=os.path.join("..", "data", "pokemons.json"), help="Path to the file with all pokemons, that are the wild pokemons of the simulation.")
+    parser.add_argument("--starters", type=str, nargs="+", required=False, default=["bulbasaur", "charmander", "squirtle", "pikachu"], help="Names of the starter pokemons of the simulation.")
+    parser.add_argument("--starter_levels", type=int, nargs=2, required=False, default=[1, 20], help="Minimum and maximum level of the starter pokemons of the simulation.")
+    parser.add_argument("--wild_levels", type=int, nargs=2, required=False, default=[1, 20], help="Minimum and maximum level of the wild pokemons of the simulation.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # load the target distribution and describe the source one
+    with open(args.target, "r") as file:
+        target = json.load(file)
+    source = {"starters": args.starters, "starter_levels": args.starter_levels, "wild_levels": args.wild_levels}
+
+    # load the data, with a row for each battle and, if available, a row for each turn
+    data = pd.read_csv(args.input_data)
+    turns = data if "Turn" in data.columns else None
+    if args.input_battles is not None:
+        battles = pd.read_csv(args.input_battles)
+    elif turns is not None:
+        battles = data.drop_duplicates(subset=["Game", "Battle"])
+    else:
+        battles = data
+
+    # reweight the data
+    report = reweight(battles.reset_index(drop=True), turns, read_pokemons(args.pokemons), source, target)
+
+    # save the reweighted statistics
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=4)
+
+    # print the main results
+    diagnostics = report["diagnostics"]
+    print(f"Reweighted win rate: {report['win_rate']['mean'] * 100:.2f}%")
+    print(f"Effective sample size: {diagnostics['ess']:.0f} of {diagnostics['n_battles']} battles ({diagnostics['ess_fraction'] * 100:.1f}%)")
+    if diagnostics["unsupported_target_mass"] > 0:
+        print(f"Warning: {diagnostics['unsupported_target_mass'] * 100:.1f}% of the target distribution is never simulated, so it is not represented in the estimates.")
@@ -1,11 +1,22 @@
 import os
+import sys
 import json
 from copy import deepcopy
 import random
 import argparse
+import multiprocessing
 import pandas as pd
-from tqdm import tqdm
 from pokemon_character import PokemonCharacter
+from metrics import SimulationMetrics, MetricsReporter
+from memory_report import MemoryTracker
+from policies import ExpectedDamageTable, make_policy
+from move_effects import compile_effects, effect_rules_for
+from block_rng import BlockRandom, BlockRuleSet
+
+# the modules shared by all the assignments (battle_core, encounters and search) are in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encounters import EncounterTable, load_encounter_weights
 
 def to_pokemon_character(row_df):
     """
@@ -31,13 +42,15 @@ def to_pokemon_character(row_df):
     # return the PokemonCharacter object
     return pokemon
 
-def load_moves(path):
+def load_moves(path, move_effects=False):
     """
     Loads a dataset of moves from a .json file.
     It removes the moves with "power" equal to null and the keys "effect", "effects", "changes".
+    With move effects, it keeps the status moves whose effects can be compiled, compiling the effects of each move (see move_effects.compile_effects).
 
     Parameters:
     - path: path to the .json file with the moves to be loaded.
+    - move_effects: boolean indicating whether to keep and compile the effects of the moves.
 
     Returns:
     - moves: pandas dataframe with each entry that is a different move.
@@ -58,8 +71,23 @@ def load_moves(path):
             # convert the string into a dictionary
             move = json.loads(line)
 
+            # with move effects, add the damaging moves with a power and the status moves with compiled effects, treating a missing accuracy as 1
+            if move_effects:
+                hits, opcodes = compile_effects(move)
+                if (move["power"] is not None or move["category"] == "status") and (hits or opcodes):
+                    move = {key: value for key, value in move.items() if key not in keys_to_remove}
+                    move.update(
+                        power=move["power"] if move["power"] is not None else 0,
+                        accuracy=move["accuracy"] if move["accuracy"] is not None else 1.0,
+                        highCriticalHitRatio=move.get("highCriticalHitRatio", False),
+                        priority=move.get("priority", 0),
+                        hits=hits,
+                        opcodes=opcodes
+                    )
+                    moves.append(move)
+
             # add the move only if the value of "power" and "accuracy" are not None
-            if move["power"] is not None and move["accuracy"] is not None:
+            elif move["power"] is not None and move["accuracy"] is not None:
                 
                 # remove the entries with key in keys_to_remove
                 move = {key: value for key, value in move.items() if key not in keys_to_remove}
@@ -70,42 +98,70 @@ def load_moves(path):
     # return the loaded moves in a pandas dataframe
     return pd.DataFrame(moves)
 
-def load_pokemons(path, moves):
+def read_pokemons(path):
     """
-    Loads a dataset of pokemons from a .json file.
+    Reads a dataset of pokemons from a .json file, without assigning them any move.
+
+    Parameters:
+    - path: path to the .json file with the pokemons to be read.
+
+    Returns:
+    - pokemons: list of dictionaries with each dictionary that represents a different pokemon.
+    """
+
+    # open the .json file and convert each line into a dictionary representing a pokemon
+    with open(path, "r") as file:
+        return [json.loads(line) for line in file]
+
+def pokemons_with_moves(pokemons, moves):
+    """
+    Builds the dataset of pokemons used in the battles from the pokemons read by read_pokemons.
     It adds the entry with key "level" and value 1 to each dictionary representing a pokemon.
-    It also adds two moves to each pokemon by sampling them at random from the input moves such that type coherence is respected.
+    It also adds four moves to each pokemon by sampling them at random from the input moves such that type coherence is respected.
+    The input pokemons are not modified, so that they can be reused to draw different moves.
 
     Parameters:
-    - path: path to the .json file with the pokemons to be loaded.
+    - pokemons: list of dictionaries with the pokemons, as returned by read_pokemons.
+    - moves: pandas dataframe with the moves, as returned by load_moves.
 
     Returns:
     - pokemons: dataframe with each entry that represents a different pokemon.
     """
 
-    # initialize the list that will contain the loaded pokemons
-    pokemons = []
+    # initialize the list that will contain the pokemons with their moves
+    pokemons_list = []
 
-    # open the .json file
-    with open(path, "r") as file:
-        
-        # iterate through lines
-        for line in file:
+    # iterate through the pokemons
+    for pokemon in pokemons:
+
+        # copy the pokemon and add the entry ("level", 1)
+        curr_pokemon = dict(pokemon)
+        curr_pokemon["level"] = 1
 
-            # convert the line into a dictionary representing a pokemon
-            curr_pokemon = json.loads(line)
+        # add to the pokemon 4 moves sampled uniformly at random from the input moves that have the same types of the current pokemon or of type "normal"
+        curr_pokemon["moves"] = moves[(moves["type"] == "normal") | (moves["type"].isin(curr_pokemon["types"]))].sample(n=4, random_state=random.randint(0, 10000)).to_dict(orient="records")
 
-            # add the entry ("level", 1)
-            curr_pokemon["level"] = 1
+        # append the current pokemon to the list of pokemons
+        pokemons_list.append(curr_pokemon)
 
-            # add to the loaded pokemon 4 moves sampled uniformly at random from the input moves that have the same types of the current pokemon or of type "normal"
-            curr_pokemon["moves"] = moves[(moves["type"] == "normal") | (moves["type"].isin(curr_pokemon["types"]))].sample(n=4, random_state=random.randint(0, 10000)).to_dict(orient="records")
-            
-            # append the current pokemon to the list of pokemons
-            pokemons.append(curr_pokemon)
+    # return the pokemons as a pandas dataframe
+    return pd.DataFrame(pokemons_list)
+
+def load_pokemons(path, moves):
+    """
+    Loads a dataset of pokemons from a .json file.
+    It adds the entry with key "level" and value 1 to each dictionary representing a pokemon.
+    It also adds two moves to each pokemon by sampling them at random from the input moves such that type coherence is respected.
 
-    # return the loaded pokemons as a pandas dataframe
-    return pd.DataFrame(pokemons)
+    Parameters:
+    - path: path to the .json file with the pokemons to be loaded.
+
+    Returns:
+    - pokemons: dataframe with each entry that represents a different pokemon.
+    """
+
+    # read the pokemons and assign them their moves
+    return pokemons_with_moves(read_pokemons(path), moves)
 
 def load_type_effectiveness(path):
     """
@@ -136,16 +192,75 @@ def load_type_effectiveness(path):
     # return the loaded type effectivenesses after having converted them into a pandas dataframe
     return pd.DataFrame(data)
 
-def random_battle(input_pokemon, wild_pokemons, type_effectiveness):
+def build_encounter_table(wild_pokemons, habitat_entries):
+    """
+    Builds the table to sample the wild pokemons of a habitat in constant time.
+
+    Parameters:
+    - wild_pokemons: pandas dataframe with the wild pokemons.
+    - habitat_entries: list of dictionaries with the entries of the habitat, as returned by load_encounter_weights.
+
+    Returns:
+    - encounter_table: EncounterTable object whose samples are the dictionaries of the wild pokemons, with their levels.
+    """
+
+    # dictionary with each wild pokemon, to find the pokemons of the entries
+    records = {pokemon["name"]: pokemon for pokemon in wild_pokemons.to_dict(orient="records")}
+
+    # check that all pokemons of the habitat exist
+    missing = [entry["name"] for entry in habitat_entries if entry["name"] not in records]
+    if missing:
+        raise ValueError(f"Unknown pokemons {missing} in the encounter weights.")
+
+    # build the table with the dictionaries of the pokemons
+    return EncounterTable([{"pokemon": records[entry["name"]], "weight": entry["weight"], "levels": entry["levels"]} for entry in habitat_entries])
+
+def compute_can_damage(pokemons, type_effectiveness):
     """
-    A wild pokemon is sampled uniformly at random among the list of wild pokemons provided as input.
+    Computes for each pair of pokemons whether the first one can damage the second one with at least one of its moves.
+    A move cannot damage a pokemon if it has no power, as the status moves loaded with the move effects, or if the product of its effectiveness against the types of the pokemon is 0.
+    Otherwise, the move has a positive probability of inflicting at least 1 HP of damage, whatever the levels of the pokemons.
+
+    Parameters:
+    - pokemons: pandas dataframe with the pokemons, each with its moves.
+    - type_effectiveness: pandas dataframe with the effectiveness of a move given its type and the types of the opponent pokemon.
+
+    Returns:
+    - can_damage: dictionary of dictionaries such that can_damage[a][d] is True if the pokemon with name a can damage the pokemon with name d.
+    """
+
+    # convert the type effectiveness dataframe into a dictionary for fast lookups
+    effectiveness = {(row["attack"], row["defend"]): row["effectiveness"] for row in type_effectiveness.to_dict(orient="records")}
+
+    # set of types of the moves with power of each pokemon and set of types of each pokemon
+    move_types = {pokemon["name"]: {move["type"] for move in pokemon["moves"] if move["power"] > 0} for pokemon in pokemons.to_dict(orient="records")}
+    defender_types = {pokemon["name"]: pokemon["types"] for pokemon in pokemons.to_dict(orient="records")}
+
+    # a pokemon can damage another one if at least one of its move types is effective against all the types of the other one
+    can_damage = {}
+    for attacker, attacker_move_types in move_types.items():
+        can_damage[attacker] = {}
+        for defender, types in defender_types.items():
+            can_damage[attacker][defender] = any(all(effectiveness[(move_type, t)] > 0 for t in types) for move_type in attacker_move_types)
+
+    return can_damage
+
+def random_battle(input_pokemon, wild_pokemons, type_effectiveness, can_damage=None, max_turns=None, wild_levels=(1, 20), encounter_table=None, starter_policy=None, wild_policy=None):
+    """
+    A wild pokemon is sampled uniformly at random among the list of wild pokemons provided as input, or from the encounter table if given.
     Once that a wild pokemon is sampled, a battle between the trainer's starter pokemon and the sampled wild pokemon is run.
-    The battle is led randomly by sampling uniformly at random a move at each turn for each of the two pokemons involved.
+    The battle is led randomly by sampling uniformly at random a move at each turn for each of the two pokemons involved, unless policies are given.
 
     Parameters:
     - input_pokemon: PokemonCharacter object representing the pokemon that has to fight against a wild pokemon.
     - wild_pokemons: pandas dataframe representing the wild pokemons that can be encountered.
     - type_effectiveness: pandas dataframe with the effectivenesses of moves given the move type "move_type" and the defender pokemon's types.
+    - can_damage: dictionary returned by compute_can_damage. If given, a battle where no pokemon can damage the other one ends immediately with a draw and 0 turns.
+    - max_turns: integer with the maximum number of turns of the battle, after which the battle ends with a draw. If None, there is no limit.
+    - wild_levels: tuple with the minimum and the maximum level of the wild pokemon. The default is (1, 20).
+    - encounter_table: EncounterTable object returned by build_encounter_table. If given, the wild pokemon and its level are sampled from it.
+    - starter_policy: policy object (see policies.py) choosing the moves of the input pokemon. If None, moves are chosen uniformly at random.
+    - wild_policy: policy object choosing the moves of the wild pokemon. If None, moves are chosen uniformly at random.
 
     Returns:
     - wild_pokemon_name: string with the name of the sampled wild pokemon to fight against the input pokemon.
@@ -155,16 +270,60 @@ def random_battle(input_pokemon, wild_pokemons, type_effectiveness):
     - residual_HP_percentage: float with the percentage of residual HP of the input pokemon after the battle.
     - data_all_turns: list that contains the residual hps of the input pokemon, the attacks perfomed by both pokemons and the damage inflicted by both pokemons at each turn.
                       data_all_turns[i] is a dictionary with all information about turn i.
+                      A battle where no pokemon can damage the other one has a single turn 0 without moves, so that the draw is recorded with the turns.
+    - is_draw: integer with a binary value indicating whether the battle ended with a draw (1) or not (0).
     """
         
-    # sample uniformly at random a wild pokemon and a level in [1, 20], making a copy so to keep modifications only in the current battle
-    sampled_pokemon = deepcopy(wild_pokemons.sample(random_state=random.randint(0, 10000)).iloc[0])
-    sampled_pokemon["level"] = random.randint(1, 20)
+    # sample the wild pokemon and its level from the encounter table, making a copy so to keep modifications only in the current battle
+    if encounter_table is not None:
+        sampled_pokemon, level = encounter_table.sample()
+        sampled_pokemon = dict(sampled_pokemon)
+        sampled_pokemon["level"] = level
+
+    # sample uniformly at random a wild pokemon and a level in wild_levels, making a copy so to keep modifications only in the current battle
+    else:
+        sampled_pokemon = deepcopy(wild_pokemons.sample(random_state=random.randint(0, 10000)).iloc[0])
+        sampled_pokemon["level"] = random.randint(*wild_levels)
     sampled_pokemon = to_pokemon_character(sampled_pokemon)
 
+    # run the battle between the input pokemon and the sampled wild pokemon
+    outcome, n_turns, residual_HP, data_all_turns, is_draw = run_battle(input_pokemon, sampled_pokemon, type_effectiveness, can_damage, max_turns, starter_policy, wild_policy)
+    return sampled_pokemon.name, sampled_pokemon.level, outcome, n_turns, residual_HP, data_all_turns, is_draw
+
+def run_battle(input_pokemon, sampled_pokemon, type_effectiveness, can_damage=None, max_turns=None, starter_policy=None, wild_policy=None):
+    """
+    Runs a battle between two given pokemons, where the input pokemon moves first at each turn.
+    The battle is led randomly by sampling uniformly at random a move at each turn for each of the two pokemons involved, unless policies are given.
+
+    Parameters:
+    - input_pokemon: PokemonCharacter object representing the pokemon that moves first, e.g., the trainer's starter pokemon.
+    - sampled_pokemon: PokemonCharacter object representing the opponent pokemon, e.g., a wild pokemon.
+    - type_effectiveness: pandas dataframe with the effectivenesses of moves given the move type "move_type" and the defender pokemon's types.
+    - can_damage: dictionary returned by compute_can_damage. If given, a battle where no pokemon can damage the other one ends immediately with a draw and 0 turns.
+    - max_turns: integer with the maximum number of turns of the battle, after which the battle ends with a draw. If None, there is no limit.
+    - starter_policy: policy object (see policies.py) choosing the moves of the input pokemon. If None, moves are chosen uniformly at random.
+    - wild_policy: policy object choosing the moves of the opponent pokemon. If None, moves are chosen uniformly at random.
+
+    Returns:
+    - battle_outcome: integer with a binary value indicating whether the battle is won (1) by the input pokemon or not (0).
+    - n_turns: integer with the total number of turns in the battle.
+    - residual_HP_percentage: float with the percentage of residual HP of the input pokemon after the battle.
+    - data_all_turns: list with a dictionary of information for each turn, see random_battle.
+    - is_draw: integer with a binary value indicating whether the battle ended with a draw (1) or not (0).
+    """
+
+    # moves with effects are run by run_effect_battle
+    if PokemonCharacter.move_effects:
+        return run_effect_battle(input_pokemon, sampled_pokemon, type_effectiveness, can_damage, max_turns, starter_policy, wild_policy)
+
     # initialize the lists that will contain data for each turn
     data_all_turns = []
 
+    # no pokemon can damage the other one, so the battle would never end: it is a draw recorded with a single turn 0 without moves
+    if can_damage is not None and not can_damage[input_pokemon.name][sampled_pokemon.name] and not can_damage[sampled_pokemon.name][input_pokemon.name]:
+        data_all_turns.append({"Turn": 0, "Starter Initial HPs": input_pokemon.curr_hp, "Starter Move": None, "Starter Damage Inflicted": None, "Wild Move": None, "Wild Damage Inflicted": None})
+        return 0, 0, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 1
+
     # initialize the number of turns of the battle
     n_turns = 1
 
@@ -174,8 +333,8 @@ def random_battle(input_pokemon, wild_pokemons, type_effectiveness):
         # add the turn number and the current hps of the input pokemon to dictionary with the information related to the current turn
         curr_turn_info = {"Turn": n_turns, "Starter Initial HPs": input_pokemon.curr_hp}
         
-        # make the input pokemon attack the wild pokemon with a move chosen uniformly at random and add the information to the dictionary
-        chosen_move = random.choice([move["name"] for move in input_pokemon.moves])
+        # make the input pokemon attack the wild pokemon with a move chosen by its policy (uniformly at random by default) and add the information to the dictionary
+        chosen_move = random.choice([move["name"] for move in input_pokemon.moves]) if starter_policy is None else starter_policy.choose(input_pokemon, sampled_pokemon)
         curr_turn_info["Starter Move"] = chosen_move
         curr_turn_info["Starter Damage Inflicted"] = input_pokemon.use_move(chosen_move, sampled_pokemon, type_effectiveness)
 
@@ -184,28 +343,224 @@ def random_battle(input_pokemon, wild_pokemons, type_effectiveness):
             curr_turn_info["Wild Move"] = None
             curr_turn_info["Wild Damage Inflicted"] = None
             data_all_turns.append(curr_turn_info)
-            return sampled_pokemon.name, sampled_pokemon.level, 1, n_turns, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns
+            return 1, n_turns, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 0
         
-        # make the wild pokemon attack the input pokemon with a move sampled uniformly at random and add the information to the dictionary
-        chosen_move = random.choice([move["name"] for move in sampled_pokemon.moves])
+        # make the wild pokemon attack the input pokemon with a move chosen by its policy (uniformly at random by default) and add the information to the dictionary
+        chosen_move = random.choice([move["name"] for move in sampled_pokemon.moves]) if wild_policy is None else wild_policy.choose(sampled_pokemon, input_pokemon)
         curr_turn_info["Wild Move"] = chosen_move
         curr_turn_info["Wild Damage Inflicted"] = sampled_pokemon.use_move(chosen_move, input_pokemon, type_effectiveness)
         data_all_turns.append(curr_turn_info)
     
         # check whether the input pokemon is defeated and end the battle in this case
         if input_pokemon.curr_hp <= 0:
-            return sampled_pokemon.name, sampled_pokemon.level, 0, n_turns, 0, data_all_turns
+            return 0, n_turns, 0, data_all_turns, 0
+
+        # the maximum number of turns is reached, so the battle ends with a draw
+        if max_turns is not None and n_turns >= max_turns:
+            return 0, n_turns, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 1
 
         # update the number of turns
         n_turns += 1
 
-def run_simulation(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness):
+def run_effect_battle(input_pokemon, sampled_pokemon, type_effectiveness, can_damage=None, max_turns=None, starter_policy=None, wild_policy=None):
+    """
+    Runs a battle between two given pokemons as run_battle, with the effects of the moves (see move_effects.py).
+    Both pokemons choose their moves at the beginning of each turn, then the move with the higher priority is used first (the input pokemon moves first on ties),
+    and the residual damages of statuses and traps are applied at the end of the turn. The stages and statuses of both pokemons are reset at the end of the battle.
+    Policies choose the moves by their damage only, ignoring their effects.
+
+    Parameters:
+    - see run_battle.
+
+    Returns:
+    - see run_battle.
+    """
+
+    # initialize the lists that will contain data for each turn
+    data_all_turns = []
+
+    # no pokemon can damage the other one, so the battle would never end: it is a draw recorded with a single turn 0 without moves
+    if can_damage is not None and not can_damage[input_pokemon.name][sampled_pokemon.name] and not can_damage[sampled_pokemon.name][input_pokemon.name]:
+        data_all_turns.append({"Turn": 0, "Starter Initial HPs": input_pokemon.curr_hp, "Starter Move": None, "Starter Damage Inflicted": None, "Wild Move": None, "Wild Damage Inflicted": None})
+        return 0, 0, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 1
+
+    # rules applying the residual damages and priorities of the moves of both pokemons
+    rules = effect_rules_for(type_effectiveness)
+    priorities = {move["name"]: move["priority"] for move in list(input_pokemon.moves) + list(sampled_pokemon.moves)}
+
+    # initialize the number of turns of the battle
+    n_turns = 1
+
+    # start the battle and end it when one of the two pokemons has been defeated
+    while True:
+
+        # add the turn number and the current hps of the input pokemon to dictionary with the information related to the current turn
+        curr_turn_info = {"Turn": n_turns, "Starter Initial HPs": input_pokemon.curr_hp, "Starter Move": None, "Starter Damage Inflicted": None, "Wild Move": None, "Wild Damage Inflicted": None}
+
+        # choose the moves of both pokemons with their policies (uniformly at random by default)
+        starter_move = random.choice([move["name"] for move in input_pokemon.moves]) if starter_policy is None else starter_policy.choose(input_pokemon, sampled_pokemon)
+        wild_move = random.choice([move["name"] for move in sampled_pokemon.moves]) if wild_policy is None else wild_policy.choose(sampled_pokemon, input_pokemon)
+
+        # use the moves in order of priority, skipping the move of a pokemon defeated before it moves
+        actions = [(input_pokemon, starter_move, sampled_pokemon, "Starter"), (sampled_pokemon, wild_move, input_pokemon, "Wild")]
+        if priorities[wild_move] > priorities[starter_move]:
+            actions.reverse()
+        for attacker, chosen_move, defender, side in actions:
+            if attacker.curr_hp > 0 and defender.curr_hp > 0:
+                curr_turn_info[f"{side} Move"] = chosen_move
+                curr_turn_info[f"{side} Damage Inflicted"] = attacker.use_move(chosen_move, defender, type_effectiveness)
+
+        # apply the residual damages if both pokemons are still standing
+        if input_pokemon.curr_hp > 0 and sampled_pokemon.curr_hp > 0:
+            rules.end_turn(input_pokemon)
+            rules.end_turn(sampled_pokemon)
+        data_all_turns.append(curr_turn_info)
+
+        # the input pokemon is defeated, also if both pokemons are (e.g., after explosion)
+        if input_pokemon.curr_hp <= 0:
+            outcome = (0, n_turns, 0, data_all_turns, 0)
+
+        # the wild pokemon is defeated
+        elif sampled_pokemon.curr_hp <= 0:
+            outcome = (1, n_turns, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 0)
+
+        # the maximum number of turns is reached, so the battle ends with a draw
+        elif max_turns is not None and n_turns >= max_turns:
+            outcome = (0, n_turns, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 1)
+
+        # update the number of turns
+        else:
+            n_turns += 1
+            continue
+
+        # the effects of the moves last only for the battle
+        input_pokemon.reset_battle_state()
+        sampled_pokemon.reset_battle_state()
+        return outcome
+
+def battle_summary(wild_pokemon_name, wild_pokemon_level, starter, outcome, n_turns, residual_HP, battle_id, game_id, battle_seed, is_draw=0):
+    """
+    Collects the data related to an entire battle in a single dictionary.
+
+    Parameters:
+    - wild_pokemon_name: string with the name of the wild pokemon fought in the battle.
+    - wild_pokemon_level: integer with the level of the wild pokemon.
+    - starter: PokemonCharacter object representing the starter pokemon that fought in the battle.
+    - outcome: integer with a binary value indicating whether the battle is won (1) by the starter pokemon or not (0).
+    - n_turns: integer with the total number of turns in the battle.
+    - residual_HP: float with the percentage of residual HP of the starter pokemon after the battle.
+    - battle_id: integer with the index of the battle in the game.
+    - game_id: integer with the index of the game in the simulation.
+    - battle_seed: integer with the seed of the random generator at the beginning of the battle.
+    - is_draw: integer with a binary value indicating whether the battle ended with a draw (1) or not (0).
+
+    Returns:
+    - summary: dictionary with the information about the battle.
+    """
+
+    # put together all the information about the battle
+    summary = {
+        "Wild Pokemon": wild_pokemon_name,
+        "Wild Level": wild_pokemon_level,
+        "Starter Pokemon": starter.name,
+        "Starter Level": starter.level,
+        "Battle Outcome": outcome,
+        "Battle Draw": is_draw,
+        "Battle Turns": n_turns,
+        "Residual HP": residual_HP,
+        "Battle": battle_id,
+        "Game": game_id,
+        "Battle Seed": battle_seed
+    }
+
+    return summary
+
+class TurnReservoir:
+    """
+    Class to keep the turns of a uniform random sample of the battles of each starter pokemon, with a fixed maximum size.
+    The sample is built with reservoir sampling, so that the battles do not need to be known in advance.
+    """
+
+    def __init__(self, sample_size, seed=0):
+        """
+        A TurnReservoir is initialized with an empty sample for each starter pokemon.
+
+        Parameters:
+        - sample_size: integer with the maximum number of battles whose turns are kept for each starter pokemon.
+        - seed: integer with the seed of the random generator used for sampling, separate from the one of the battles.
+        """
+
+        # maximum number of battles kept for each starter pokemon
+        self.sample_size = sample_size
+
+        # random generator used only to sample the battles, so that the battles are not affected by the sampling
+        self.rng = random.Random(seed)
+
+        # battles kept and number of battles seen for each starter pokemon
+        self.samples = {}
+        self.n_seen = {}
+
+    def add(self, starter_name, turns_data):
+        """
+        Offers the turns of a battle to the sample of the input starter pokemon.
+
+        Parameters:
+        - starter_name: string with the name of the starter pokemon that fought the battle.
+        - turns_data: list of dictionaries with information about each turn of the battle.
+        """
+
+        # update the number of battles seen for the starter pokemon
+        self.n_seen[starter_name] = self.n_seen.get(starter_name, 0) + 1
+        sample = self.samples.setdefault(starter_name, [])
+
+        # the sample is not full yet, so keep the battle
+        if len(sample) < self.sample_size:
+            sample.append(turns_data)
+            return
+
+        # otherwise, the battle replaces a random kept battle with probability sample_size / n_seen
+        i = self.rng.randrange(self.n_seen[starter_name])
+        if i < self.sample_size:
+            sample[i] = turns_data
+
+    def to_dataframe(self):
+        """
+        Collects the kept turns in a single dataframe.
+        Each turn has a column "Sample Weight" with the inverse of the probability that its battle has been kept.
+
+        Returns:
+        - turns: pandas dataframe with a row for each kept turn.
+        """
+
+        # list that will contain all kept turns
+        collected_data = []
+
+        # iterate through the samples of the starter pokemons
+        for starter_name, sample in self.samples.items():
+
+            # each battle of the starter pokemon is kept with probability len(sample) / n_seen
+            weight = self.n_seen[starter_name] / len(sample)
+            for turns_data in sample:
+                for turn in turns_data:
+                    turn["Sample Weight"] = weight
+                collected_data.extend(turns_data)
+
+        # sort the turns as they have been simulated
+        turns = pd.DataFrame(collected_data)
+        if not turns.empty:
+            turns = turns.sort_values(["Game", "Battle", "Turn"], ignore_index=True)
+
+        return turns
+
+def run_simulation(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, storage_mode="turns", turn_sample_size=1000, sample_seed=0, max_turns=None, metrics=None, first_game=1, memory_tracker=None, starter_levels=(1, 20), wild_levels=(1, 20), encounter_table=None, starter_policy=None, wild_policy=None):
     """
     Simulates n_battles battles for each of n_games games against randomly sampled wild pokemons.
     At the beginning of each battle, a starter pokemon is selected uniformly at random among the input ones.
     The starter pokemon selected at the beginning of the game takes part in all the n_battles battles of the game.
     After each battle, the trainer goes to the pokemon center.
     After that n_battles have been completed, the game ends.
+    Before each battle, the random generator is reseeded with a seed drawn from it, which is stored with the battle data.
+    This makes it possible to replay any battle from its seed alone with replay_battles.
 
     Parameters:
     - n_games: integer representing the number of games to run.
@@ -213,47 +568,398 @@ def run_simulation(n_games, n_battles, starter_pokemons, wild_pokemons, type_eff
     - starter_pokemons: pandas Series of dictionaries with information about the starter pokemons that have to be considered.
     - wild_pokemons: pandas dataframe with the wild pokemons.
     - type_effectiveness: pandas dataframe with the effectiveness of a move given its type and the types of the opponent pokemon.
+    - storage_mode: string with the data to be stored for each battle. It can be:
+                    - "turns": a row for each turn of each battle, with the battle data repeated in each row (default);
+                    - "seeds": a single row for each battle with its summary and its seed, from which the turns can be replayed;
+                    - "sample": a single row for each battle as in "seeds", plus the turns of a random sample of the battles of each starter pokemon.
+    - turn_sample_size: integer with the maximum number of battles of each starter pokemon whose turns are kept if storage_mode is "sample".
+    - sample_seed: integer with the seed of the random generator used to sample the battles if storage_mode is "sample".
+    - max_turns: integer with the maximum number of turns of each battle, after which the battle ends with a draw. If None, there is no limit.
+                 Battles where no pokemon can damage the other one always end immediately with a draw and no turns.
+    - metrics: SimulationMetrics object where to add the progress of the simulation after each game. If None, the progress is not tracked.
+    - first_game: integer with the index of the first game, so that games run by different workers have different indices.
+    - memory_tracker: MemoryTracker object where to record the memory used to collect the data, before its conversion into a dataframe.
+    - starter_levels: tuple with the minimum and the maximum level of the starter pokemon. The default is (1, 20).
+    - wild_levels: tuple with the minimum and the maximum level of the wild pokemons. The default is (1, 20).
+    - encounter_table: EncounterTable object to sample the wild pokemons and their levels from. If None, they are sampled uniformly.
+    - starter_policy: policy object choosing the moves of the starter pokemon. If None, moves are chosen uniformly at random.
+    - wild_policy: policy object choosing the moves of the wild pokemons. If None, moves are chosen uniformly at random.
 
     Returns:
     - collected_data: pandas dataframe with all data collected in the simulation.
-                      Each row stores information about a single turn of a battle in a game.
+                      Each row stores information about a single turn of a battle in a game, or about a whole battle if storage_mode is "seeds".
+                      If storage_mode is "sample", a tuple with the dataframe of the battles and the dataframe of the sampled turns is returned.
+                      The sampled turns have a column "Sample Weight" to be used to get unbiased statistics.
     """
 
+    # check that the storage mode is valid
+    if storage_mode not in ["turns", "seeds", "sample"]:
+        raise ValueError(f"Unknown storage mode {storage_mode}. It must be \"turns\", \"seeds\" or \"sample\".")
+
     # list that will contain all useful information across all battles in all games
     collected_data = []
 
+    # sample of the turns to be kept
+    reservoir = TurnReservoir(turn_sample_size, sample_seed)
+
+    # precompute which pokemons can damage which other ones, to detect battles that would never end
+    can_damage = compute_can_damage(pd.concat([starter_pokemons, wild_pokemons]).drop_duplicates(subset="name"), type_effectiveness)
+
     # run n_games games
-    for j in tqdm(range(1, n_games + 1), desc=f"Running the Simulation", unit="game"):
+    for j in range(first_game, first_game + n_games):
+
+        # number of turns of the game, added to the metrics at the end of the game
+        game_turns = 0
 
-        # sample uniformly at random a starter pokemon and set its level to a random value in [1, 20]
+        # sample uniformly at random a starter pokemon and set its level to a random value in starter_levels
         starter = starter_pokemons.sample(random_state=random.randint(0, 10000)).iloc[0]
-        starter["level"] = random.randint(1, 20)
+        starter["level"] = random.randint(*starter_levels)
         starter = to_pokemon_character(starter)
 
         # run n_battles battles before exiting the game
         for k in range(1, n_battles + 1):
 
+            # draw the seed of the battle and reseed the random generator with it, so that the battle can be replayed
+            battle_seed = random.getrandbits(32)
+            random.seed(battle_seed)
+
             # run the battle and collect data
-            wild_pokemon_name, wild_pokemon_level, outcome, n_turns, residual_HP, turns_data = random_battle(starter, wild_pokemons, type_effectiveness)
+            wild_pokemon_name, wild_pokemon_level, outcome, n_turns, residual_HP, turns_data, is_draw = random_battle(starter, wild_pokemons, type_effectiveness, can_damage, max_turns, wild_levels, encounter_table, starter_policy, wild_policy)
+            summary = battle_summary(wild_pokemon_name, wild_pokemon_level, starter, outcome, n_turns, residual_HP, k, j, battle_seed, is_draw)
+            game_turns += n_turns
+
+            # store only the summary of the battle, since turns can be replayed from the seed
+            if storage_mode == "seeds":
+                collected_data.append(summary)
+
+            # store the summary of the battle and offer its turns to the sample
+            elif storage_mode == "sample":
+                collected_data.append(summary)
+                for turn in turns_data:
+                    turn.update(summary)
+                reservoir.add(starter.name, turns_data)
 
             # add the data related to the entire battle to each dictionary with information for a single turn
-            for turn in turns_data:
-                turn["Wild Pokemon"] = wild_pokemon_name
-                turn["Wild Level"] = wild_pokemon_level
-                turn["Starter Pokemon"] = starter.name
-                turn["Starter Level"] = starter.level
-                turn["Battle Outcome"] = outcome
-                turn["Battle Turns"] = n_turns
-                turn["Residual HP"] = residual_HP
-                turn["Battle"] = k
-                turn["Game"] = j
-
-            # extend the list with data for all turns battles with data for the current battle
-            collected_data.extend(turns_data)
+            else:
+                for turn in turns_data:
+                    turn.update(summary)
+
+                # extend the list with data for all turns battles with data for the current battle
+                collected_data.extend(turns_data)
+
+            # make the trainer go to the pokemon center to heal the starter pokemon after the battle
+            starter.curr_hp = starter.active_stats["hp"]
+
+        # add the progress of the game to the metrics
+        if metrics is not None:
+            metrics.add(games=1, battles=n_battles, turns=game_turns)
+
+    # record the memory used by the collected data, before converting it into a dataframe
+    if memory_tracker is not None:
+        memory_tracker.checkpoint("simulating battles")
+
+    # return both the battles and the sampled turns
+    if storage_mode == "sample":
+        return pd.DataFrame(collected_data), reservoir.to_dataframe()
+
+    return pd.DataFrame(collected_data)
+
+# data shared by all the battles run by a worker process, set once by init_simulation_worker
+worker_data = {}
+
+def init_simulation_worker(metrics, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, storage_mode, turn_sample_size, max_turns, starter_levels, wild_levels, encounter_table, starter_policy, wild_policy, move_effects=False):
+    """
+    Initializes a worker process of run_parallel_simulation, storing the data shared by all its games.
+    The data is sent once to each worker, instead of once for each shard.
+
+    Parameters:
+    - metrics: SimulationMetrics object shared among the workers.
+    - move_effects: boolean indicating whether moves have their effects (see PokemonCharacter.set_move_effects), set again since worker processes may not inherit it.
+    - the other parameters are the ones of run_simulation.
+    """
+
+    # enable the effects of the moves as in the main process
+    PokemonCharacter.set_move_effects(move_effects)
+
+    # store the data in the global dictionary of the worker
+    worker_data.update(
+        metrics=metrics,
+        n_battles=n_battles,
+        starter_pokemons=starter_pokemons,
+        wild_pokemons=wild_pokemons,
+        type_effectiveness=type_effectiveness,
+        storage_mode=storage_mode,
+        turn_sample_size=turn_sample_size,
+        max_turns=max_turns,
+        starter_levels=starter_levels,
+        wild_levels=wild_levels,
+        encounter_table=encounter_table,
+        starter_policy=starter_policy,
+        wild_policy=wild_policy
+    )
+
+def simulation_worker(shard):
+    """
+    Runs a shard of the games of run_parallel_simulation in a worker process.
+
+    Parameters:
+    - shard: tuple with the index of the first game, the number of games and the random seed of the shard.
+
+    Returns:
+    - collected_data: data collected in the shard, as returned by run_simulation.
+    """
+
+    # seed the random generator of the worker with the seed of the shard
+    first_game, n_games, seed = shard
+    random.seed(seed)
+
+    # run the games of the shard
+    return run_simulation(
+        n_games,
+        worker_data["n_battles"],
+        worker_data["starter_pokemons"],
+        worker_data["wild_pokemons"],
+        worker_data["type_effectiveness"],
+        worker_data["storage_mode"],
+        worker_data["turn_sample_size"],
+        seed,
+        worker_data["max_turns"],
+        worker_data["metrics"],
+        first_game,
+        starter_levels=worker_data["starter_levels"],
+        wild_levels=worker_data["wild_levels"],
+        encounter_table=worker_data["encounter_table"],
+        starter_policy=worker_data["starter_policy"],
+        wild_policy=worker_data["wild_policy"]
+    )
+
+def run_parallel_simulation(n_workers, n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, storage_mode="turns", turn_sample_size=1000, sample_seed=0, max_turns=None, metrics=None, memory_tracker=None, starter_levels=(1, 20), wild_levels=(1, 20), encounter_table=None, starter_policy=None, wild_policy=None):
+    """
+    Runs the simulation of run_simulation, splitting the games among n_workers worker processes.
+    Each worker runs a shard of consecutive games with its own random seed, drawn from the random generator of the main process.
+    With a single worker, the simulation is run in the main process and is the same as the one of run_simulation.
+    If storage_mode is "sample", each shard keeps its own sample of turns with its own weights, so the union of the samples is still unbiased.
+
+    Parameters:
+    - n_workers: integer with the number of worker processes.
+    - the other parameters are the ones of run_simulation. The metrics are shared among the workers.
+      The memory_tracker records only the memory of the main process, so it is used only with a single worker.
+
+    Returns:
+    - collected_data: data collected in the simulation, as returned by run_simulation.
+    """
+
+    # run the simulation in the main process
+    if n_workers <= 1:
+        return run_simulation(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, storage_mode, turn_sample_size, sample_seed, max_turns, metrics, memory_tracker=memory_tracker, starter_levels=starter_levels, wild_levels=wild_levels, encounter_table=encounter_table, starter_policy=starter_policy, wild_policy=wild_policy)
+
+    # split the games in a shard for each worker
+    shards = []
+    first_game = 1
+    for i in range(n_workers):
+        shard_games = n_games // n_workers + (1 if i < n_games % n_workers else 0)
+        if shard_games > 0:
+            shards.append((first_game, shard_games, random.getrandbits(32)))
+        first_game += shard_games
+
+    # run the shards in the worker processes
+    init_args = (metrics, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, storage_mode, turn_sample_size, max_turns, starter_levels, wild_levels, encounter_table, starter_policy, wild_policy, PokemonCharacter.move_effects)
+    with multiprocessing.Pool(len(shards), initializer=init_simulation_worker, initargs=init_args) as pool:
+        results = pool.map(simulation_worker, shards)
+
+    # concatenate the data of the shards
+    if storage_mode == "sample":
+        return pd.concat([battles for battles, _ in results], ignore_index=True), pd.concat([turns for _, turns in results], ignore_index=True)
+    return pd.concat(results, ignore_index=True)
+
+def run_block_battle(input_pokemon, sampled_pokemon, rules, can_damage=None, max_turns=None):
+    """
+    Runs a battle between two given pokemons as run_battle with uniformly random moves, drawing all the random numbers from the buffers of a BlockRandom.
+
+    Parameters:
+    - input_pokemon: PokemonCharacter object representing the pokemon that moves first, e.g., the trainer's starter pokemon.
+    - sampled_pokemon: PokemonCharacter object representing the opponent pokemon, e.g., a wild pokemon.
+    - rules: BlockRuleSet object with the rules of the battle and the BlockRandom of its draws.
+    - can_damage: see run_battle.
+    - max_turns: see run_battle.
+
+    Returns:
+    - see run_battle.
+    """
+
+    # initialize the lists that will contain data for each turn
+    data_all_turns = []
+
+    # no pokemon can damage the other one, so the battle would never end: it is a draw recorded with a single turn 0 without moves
+    if can_damage is not None and not can_damage[input_pokemon.name][sampled_pokemon.name] and not can_damage[sampled_pokemon.name][input_pokemon.name]:
+        data_all_turns.append({"Turn": 0, "Starter Initial HPs": input_pokemon.curr_hp, "Starter Move": None, "Starter Damage Inflicted": None, "Wild Move": None, "Wild Damage Inflicted": None})
+        return 0, 0, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 1
+
+    # names of the moves of both pokemons, listed once, and the draws of the moves
+    starter_moves = [move["name"] for move in input_pokemon.moves]
+    wild_moves = [move["name"] for move in sampled_pokemon.moves]
+    draw_move = rules.rng.move
+    use_move = rules.use_move
+
+    # initialize the number of turns of the battle
+    n_turns = 1
+
+    # start the battle and end it when one of the two pokemons has been defeated
+    while True:
+
+        # the input pokemon attacks the wild pokemon with a move chosen uniformly at random
+        chosen_move = starter_moves[int(draw_move() * len(starter_moves))]
+        curr_turn_info = {"Turn": n_turns, "Starter Initial HPs": input_pokemon.curr_hp, "Starter Move": chosen_move, "Starter Damage Inflicted": use_move(input_pokemon, chosen_move, sampled_pokemon)}
+
+        # check whether the wild pokemon is defeated and end the battle in this case
+        if sampled_pokemon.curr_hp <= 0:
+            curr_turn_info["Wild Move"] = None
+            curr_turn_info["Wild Damage Inflicted"] = None
+            data_all_turns.append(curr_turn_info)
+            return 1, n_turns, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 0
+
+        # the wild pokemon attacks the input pokemon with a move chosen uniformly at random
+        chosen_move = wild_moves[int(draw_move() * len(wild_moves))]
+        curr_turn_info["Wild Move"] = chosen_move
+        curr_turn_info["Wild Damage Inflicted"] = use_move(sampled_pokemon, chosen_move, input_pokemon)
+        data_all_turns.append(curr_turn_info)
+
+        # check whether the input pokemon is defeated and end the battle in this case
+        if input_pokemon.curr_hp <= 0:
+            return 0, n_turns, 0, data_all_turns, 0
+
+        # the maximum number of turns is reached, so the battle ends with a draw
+        if max_turns is not None and n_turns >= max_turns:
+            return 0, n_turns, input_pokemon.curr_hp / input_pokemon.active_stats["hp"] * 100, data_all_turns, 1
+
+        # update the number of turns
+        n_turns += 1
+
+def run_block_simulation(n_games, n_battles, starter_pokemons, wild_pokemons, type_effectiveness, random_seed, storage_mode="turns", turn_sample_size=1000, max_turns=None, metrics=None, starter_levels=(1, 20), wild_levels=(1, 20), block_size=8192):
+    """
+    Simulates the games of run_simulation with uniformly random moves, drawing all the random numbers from a BlockRandom seeded with random_seed:
+    the starter pokemons, the wild pokemons, their levels, the moves, the accuracy, the critical hits and the luck each come from their own stream.
+    The same seed always gives the same battles, but not the ones of run_simulation, and single battles cannot be replayed from a seed of their own.
+
+    Parameters:
+    - random_seed: integer with the seed of the BlockRandom, which also seeds the sample of turns.
+    - storage_mode: string with the data to be stored, "turns" or "sample" (see run_simulation). The battles have no seed, so "seeds" is not available.
+    - block_size: integer with the number of draws generated at once for each kind of draw.
+    - the other parameters are the ones of run_simulation.
+
+    Returns:
+    - collected_data: data collected in the simulation, as returned by run_simulation.
+    """
+
+    # generator of the draws and rules drawing from it
+    rng = BlockRandom(random_seed, block_size)
+    rules = BlockRuleSet(rng, "active", type_effectiveness)
+
+    # lists of the pokemons, sampled by index
+    starter_records = starter_pokemons.to_dict(orient="records")
+    wild_records = wild_pokemons.to_dict(orient="records")
+
+    # initialize the collected data and the sample of turns
+    collected_data = []
+    reservoir = TurnReservoir(turn_sample_size, random_seed)
+
+    # precompute which pokemons can damage which other ones
+    can_damage = compute_can_damage(pd.concat([starter_pokemons, wild_pokemons]).drop_duplicates(subset="name"), type_effectiveness)
+
+    # run n_games games
+    for j in range(1, n_games + 1):
+
+        # sample uniformly at random a starter pokemon and its level
+        starter = dict(starter_records[int(rng.starter() * len(starter_records))])
+        starter["level"] = rng.randint("level", *starter_levels)
+        starter = to_pokemon_character(starter)
+        game_turns = 0
+
+        # run n_battles battles before exiting the game
+        for k in range(1, n_battles + 1):
+
+            # sample uniformly at random a wild pokemon and its level, and run the battle
+            sampled_pokemon = dict(wild_records[int(rng.wild() * len(wild_records))])
+            sampled_pokemon["level"] = rng.randint("level", *wild_levels)
+            sampled_pokemon = to_pokemon_character(sampled_pokemon)
+            outcome, n_turns, residual_HP, turns_data, is_draw = run_block_battle(starter, sampled_pokemon, rules, can_damage, max_turns)
+            summary = battle_summary(sampled_pokemon.name, sampled_pokemon.level, starter, outcome, n_turns, residual_HP, k, j, None, is_draw)
+            game_turns += n_turns
+
+            # store the summary of the battle and offer its turns to the sample
+            if storage_mode == "sample":
+                collected_data.append(summary)
+                for turn in turns_data:
+                    turn.update(summary)
+                reservoir.add(starter.name, turns_data)
+
+            # add the data related to the entire battle to each turn
+            else:
+                for turn in turns_data:
+                    turn.update(summary)
+                collected_data.extend(turns_data)
 
             # make the trainer go to the pokemon center to heal the starter pokemon after the battle
             starter.curr_hp = starter.active_stats["hp"]
 
+        # add the progress of the game to the metrics
+        if metrics is not None:
+            metrics.add(games=1, battles=n_battles, turns=game_turns)
+
+    # return both the battles and the sampled turns
+    if storage_mode == "sample":
+        return pd.DataFrame(collected_data), reservoir.to_dataframe()
+
+    return pd.DataFrame(collected_data)
+
+def replay_battles(battles, starter_pokemons, wild_pokemons, type_effectiveness, max_turns=None, wild_levels=(1, 20), encounter_table=None, starter_policy=None, wild_policy=None):
+    """
+    Regenerates the turns of the input battles by running random_battle again from the seed stored for each battle.
+    The pokemons must be the same used in the simulation, i.e., loaded after setting the same random seed.
+
+    Parameters:
+    - battles: pandas dataframe with a row for each battle to be replayed, as returned by run_simulation with storage_mode "seeds".
+    - starter_pokemons: pandas dataframe with the starter pokemons used in the simulation.
+    - wild_pokemons: pandas dataframe with the wild pokemons used in the simulation.
+    - type_effectiveness: pandas dataframe with the effectiveness of a move given its type and the types of the opponent pokemon.
+    - max_turns: integer with the maximum number of turns of each battle used in the simulation.
+    - wild_levels: tuple with the minimum and the maximum level of the wild pokemons used in the simulation.
+    - encounter_table: EncounterTable object used in the simulation, if any.
+    - starter_policy: policy object used in the simulation for the starter pokemon, if any.
+    - wild_policy: policy object used in the simulation for the wild pokemons, if any.
+
+    Returns:
+    - collected_data: pandas dataframe with a row for each turn of the input battles, as returned by run_simulation with storage_mode "turns".
+    """
+
+    # list that will contain the data of all turns of all battles
+    collected_data = []
+
+    # precompute which pokemons can damage which other ones, as in the simulation
+    can_damage = compute_can_damage(pd.concat([starter_pokemons, wild_pokemons]).drop_duplicates(subset="name"), type_effectiveness)
+
+    # iterate through the battles to be replayed
+    for battle in battles.to_dict(orient="records"):
+
+        # rebuild the starter pokemon at the level it had in the battle, with full hps as after the pokemon center
+        starter = starter_pokemons[starter_pokemons["name"] == battle["Starter Pokemon"]].iloc[0].copy()
+        starter["level"] = int(battle["Starter Level"])
+        starter = to_pokemon_character(starter)
+
+        # reseed the random generator as in the simulation and run the battle again
+        random.seed(int(battle["Battle Seed"]))
+        wild_pokemon_name, wild_pokemon_level, outcome, n_turns, residual_HP, turns_data, is_draw = random_battle(starter, wild_pokemons, type_effectiveness, can_damage, max_turns, wild_levels, encounter_table, starter_policy, wild_policy)
+
+        # the replayed battle must be the one stored, otherwise the pokemons differ from the ones of the simulation
+        if wild_pokemon_name != battle["Wild Pokemon"] or n_turns != battle["Battle Turns"] or outcome != battle["Battle Outcome"]:
+            raise ValueError(f"Battle {battle['Battle']} of game {battle['Game']} cannot be replayed. Check that the pokemons are loaded with the random seed of the simulation.")
+
+        # add the data related to the entire battle to each turn
+        summary = battle_summary(wild_pokemon_name, wild_pokemon_level, starter, outcome, n_turns, residual_HP, battle["Battle"], battle["Game"], battle["Battle Seed"], is_draw)
+        for turn in turns_data:
+            turn.update(summary)
+        collected_data.extend(turns_data)
+
     return pd.DataFrame(collected_data)
 
 def parse_args():
@@ -275,28 +981,87 @@ def parse_args():
     parser.add_argument("--input_type_effectiveness", type=str, required=False, default=os.path.join("..", "data", "type_effectiveness.json"), help="Path to the dataset with type effectiveness pairs.")
     parser.add_argument("--output_data", type=str, required=False, default=os.path.join("results", "collected_data.csv"), help="Path to the file where to save the collected data.")
     parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed for reproducibility.")
+    parser.add_argument("--storage_mode", type=str, required=False, default="turns", choices=["turns", "seeds", "sample"], help="Store a row for each turn, only a row for each battle with the seed to replay it, or a row for each battle plus the turns of a sample of battles.")
+    parser.add_argument("--starters", type=str, nargs="+", required=False, default=["bulbasaur", "charmander", "squirtle", "pikachu"], help="Names of the starter pokemons.")
+    parser.add_argument("--starter_levels", type=int, nargs=2, required=False, default=[1, 20], help="Minimum and maximum level of the starter pokemons.")
+    parser.add_argument("--wild_levels", type=int, nargs=2, required=False, default=[1, 20], help="Minimum and maximum level of the wild pokemons.")
+    parser.add_argument("--encounters", type=str, required=False, default=os.path.join("..", "data", "encounters.json"), help="Path to the dataset with the encounter weights of each habitat.")
+    parser.add_argument("--habitat", type=str, required=False, default=None, help="Habitat whose encounter weights and levels are used to sample the wild pokemons. If not given, they are sampled uniformly.")
+    parser.add_argument("--starter_policy", type=str, required=False, default="random", choices=["random", "greedy", "epsilon_greedy", "softmax", "search"], help="Policy choosing the moves of the starter pokemons.")
+    parser.add_argument("--wild_policy", type=str, required=False, default="random", choices=["random", "greedy", "epsilon_greedy", "softmax", "search"], help="Policy choosing the moves of the wild pokemons.")
+    parser.add_argument("--epsilon", type=float, required=False, default=0.1, help="Probability of a random move with the \"epsilon_greedy\" policy.")
+    parser.add_argument("--temperature", type=float, required=False, default=10.0, help="Temperature, in HP, of the \"softmax\" policy.")
+    parser.add_argument("--search_depth", type=int, required=False, default=1, help="Maximum number of moves to look ahead of the \"search\" policy.")
+    parser.add_argument("--search_time", type=float, required=False, default=None, help="Maximum number of seconds of a decision of the \"search\" policy. If not set, the search always reaches the maximum depth and the battles can be replayed.")
+    parser.add_argument("--n_workers", type=int, required=False, default=1, help="Number of worker processes among which the games are split.")
+    parser.add_argument("--metrics_output", type=str, required=False, default=None, help="Path to the text file where to publish the progress metrics in the Prometheus format.")
+    parser.add_argument("--memory_report", action="store_true", help="Record the memory used by each phase and save a report next to the collected data.")
+    parser.add_argument("--max_turns", type=int, required=False, default=1000, help="Maximum number of turns of each battle, after which the battle ends with a draw.")
+    parser.add_argument("--turn_sample_size", type=int, required=False, default=1000, help="Number of battles of each starter pokemon whose turns are kept with storage mode \"sample\".")
+    parser.add_argument("--move_effects", action="store_true", help="Simulate the effects of the moves (stat stages, statuses, multiple hits, traps, priority, ...), also using the status moves.")
+    parser.add_argument("--block_rng", action="store_true", help="Draw all the random numbers of the battles from numpy blocks, with a stream for each kind of draw. Only with uniformly random moves, one worker, no habitat, no move effects and storage mode \"turns\" or \"sample\".")
+    parser.add_argument("--block_size", type=int, required=False, default=8192, help="Number of draws generated at once for each kind of draw with --block_rng.")
+    parser.add_argument("--output_battles", type=str, required=False, default=os.path.join("results", "collected_battles.csv"), help="Path to the file where to save the battles with storage mode \"sample\".")
                           
-    return parser.parse_args()
+    # the block random generator only replaces the draws of the default simulation
+    args = parser.parse_args()
+    if args.block_rng and (args.storage_mode == "seeds" or args.n_workers > 1 or args.habitat is not None or args.move_effects or args.starter_policy != "random" or args.wild_policy != "random"):
+        parser.error("--block_rng requires storage mode \"turns\" or \"sample\", one worker, no habitat, no move effects and random policies.")
+
+    return args
 
 if __name__ == '__main__':
 
     # parse command line arguments
     args = parse_args()
 
+    # start tracking the memory used by each phase, if required
+    memory_tracker = MemoryTracker(args.memory_report)
+
     # set a random seed for reproducibility
     random.seed(args.random_seed)
 
-    # load pokemons, moves and type effectiveness data from .json files
-    moves = load_moves(args.input_moves)
+    # load pokemons, moves and type effectiveness data from .json files, compiling the effects of the moves if they are simulated
+    PokemonCharacter.set_move_effects(args.move_effects)
+    moves = load_moves(args.input_moves, args.move_effects)
     pokemons = load_pokemons(args.input_pokemons, moves)
     type_effectiveness = load_type_effectiveness(args.input_type_effectiveness)
 
     # starter pokemons
-    starter_pokemons = pokemons[pokemons["name"].isin(["bulbasaur", "charmander", "squirtle", "pikachu"])]
-
-    # run the simulation
-    collected_data = run_simulation(args.n_games, args.n_battles, starter_pokemons, pokemons, type_effectiveness)
+    starter_pokemons = pokemons[pokemons["name"].isin(args.starters)]
+
+    # table to sample the wild pokemons of the habitat, if any
+    encounter_table = build_encounter_table(pokemons, load_encounter_weights(args.encounters)[args.habitat]) if args.habitat is not None else None
+
+    # policies choosing the moves, sharing the table of expected damages (None stands for the original uniform choice)
+    damage_table = ExpectedDamageTable(type_effectiveness)
+    starter_policy = make_policy(args.starter_policy, damage_table, args.epsilon, args.temperature, args.search_time, args.search_depth) if args.starter_policy != "random" else None
+    wild_policy = make_policy(args.wild_policy, damage_table, args.epsilon, args.temperature, args.search_time, args.search_depth) if args.wild_policy != "random" else None
+    memory_tracker.checkpoint("loading data")
+
+    # start reporting the progress of the simulation, read from the counters updated by the workers
+    metrics = SimulationMetrics(args.n_games, args.n_games * args.n_battles)
+    reporter = MetricsReporter(metrics, args.metrics_output)
+    reporter.start()
+
+    # run the simulation, with the draws from numpy blocks if required
+    if args.block_rng:
+        collected_data = run_block_simulation(args.n_games, args.n_battles, starter_pokemons, pokemons, type_effectiveness, args.random_seed, args.storage_mode, args.turn_sample_size, args.max_turns, metrics, args.starter_levels, args.wild_levels, args.block_size)
+    else:
+        collected_data = run_parallel_simulation(args.n_workers, args.n_games, args.n_battles, starter_pokemons, pokemons, type_effectiveness, args.storage_mode, args.turn_sample_size, args.random_seed, args.max_turns, metrics, memory_tracker, args.starter_levels, args.wild_levels, encounter_table, starter_policy, wild_policy)
+    reporter.stop()
+    memory_tracker.checkpoint("converting to dataframe")
+
+    # save the battles separately from the sampled turns
+    if args.storage_mode == "sample":
+        collected_battles, collected_data = collected_data
+        os.makedirs(os.path.dirname(args.output_battles), exist_ok=True)
+        collected_battles.to_csv(args.output_battles, index=False)
 
     # save the collected data
     os.makedirs(os.path.dirname(args.output_data), exist_ok=True)
     collected_data.to_csv(args.output_data, index=False)
+    memory_tracker.checkpoint("saving to csv")
+
+    # save the memory report next to the collected data
+    memory_tracker.write(os.path.join(os.path.dirname(args.output_data), "memory_report_simulation.json"))
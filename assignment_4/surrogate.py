@@ -0,0 +1,333 @@
+import os
+import json
+import math
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+from simulations import load_moves, load_pokemons, load_type_effectiveness, to_pokemon_character
+from policies import ExpectedDamageTable
+
+class FeatureBuilder:
+    """
+    Class to compute the features of a battle between a starter pokemon and a wild pokemon at given levels.
+    The features only depend on the species, their moves and their levels, so the features of each matchup are computed once and cached.
+    """
+
+    # names of the features, in the order of the columns of the feature matrix
+    feature_names = [
+        "level_difference",
+        "log_hp_ratio",
+        "log_speed_ratio",
+        "starter_log_turns_to_ko",
+        "wild_log_turns_to_ko",
+        "log_turns_to_ko_difference",
+        "starter_best_effectiveness",
+        "wild_best_effectiveness",
+        "starter_cannot_damage",
+        "wild_cannot_damage"
+    ]
+
+    def __init__(self, pokemons, type_effectiveness):
+        """
+        A FeatureBuilder is initialized with the pokemons, with the moves they had in the simulation, and the type effectiveness pairs.
+
+        Parameters:
+        - pokemons: pandas dataframe with the pokemons, each with its moves.
+        - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+        """
+
+        # pokemons by name, table of expected damages and cache of the features
+        self.records = {pokemon["name"]: pokemon for pokemon in pokemons.to_dict(orient="records")}
+        self.damage_table = ExpectedDamageTable(type_effectiveness)
+        self.cache = {}
+
+    def matchup_features(self, starter_name, starter_level, wild_name, wild_level):
+        """
+        Computes the features of a matchup, computing them only the first time.
+
+        Parameters:
+        - starter_name: string with the name of the starter pokemon.
+        - starter_level: integer with the level of the starter pokemon.
+        - wild_name: string with the name of the wild pokemon.
+        - wild_level: integer with the level of the wild pokemon.
+
+        Returns:
+        - features: list of floats, in the order of feature_names.
+        """
+
+        key = (starter_name, starter_level, wild_name, wild_level)
+        if key not in self.cache:
+            starter = to_pokemon_character({**self.records[starter_name], "level": int(starter_level)})
+            wild = to_pokemon_character({**self.records[wild_name], "level": int(wild_level)})
+
+            # expected damage per turn of each pokemon, with moves chosen uniformly at random as in the simulations
+            starter_damage = sum(self.damage_table.get(starter, move, wild) for move in starter.moves) / len(starter.moves)
+            wild_damage = sum(self.damage_table.get(wild, move, starter) for move in wild.moves) / len(wild.moves)
+
+            # expected number of turns needed to defeat the opponent, bounded for pokemons that cannot damage the opponent
+            starter_turns = math.log(wild.active_stats["hp"] / max(starter_damage, 0.1))
+            wild_turns = math.log(starter.active_stats["hp"] / max(wild_damage, 0.1))
+
+            # best type effectiveness of the moves of each pokemon against the other one
+            effectiveness = self.damage_table.effectiveness
+            starter_effectiveness = max(math.prod(effectiveness[(move["type"], t)] for t in wild.types) for move in starter.moves)
+            wild_effectiveness = max(math.prod(effectiveness[(move["type"], t)] for t in starter.types) for move in wild.moves)
+
+            self.cache[key] = [
+                starter.level - wild.level,
+                math.log(starter.active_stats["hp"] / wild.active_stats["hp"]),
+                math.log(starter.active_stats["speed"] / wild.active_stats["speed"]),
+                starter_turns,
+                wild_turns,
+                starter_turns - wild_turns,
+                starter_effectiveness,
+                wild_effectiveness,
+                float(starter_effectiveness == 0),
+                float(wild_effectiveness == 0)
+            ]
+
+        return self.cache[key]
+
+    def features(self, starter_names, starter_levels, wild_names, wild_levels):
+        """
+        Computes the feature matrix of a batch of matchups.
+
+        Parameters:
+        - starter_names: iterable with the names of the starter pokemons.
+        - starter_levels: iterable with the levels of the starter pokemons.
+        - wild_names: iterable with the names of the wild pokemons.
+        - wild_levels: iterable with the levels of the wild pokemons.
+
+        Returns:
+        - X: numpy array of shape (n_matchups, n_features).
+        """
+
+        return np.array([self.matchup_features(*matchup) for matchup in zip(starter_names, starter_levels, wild_names, wild_levels)], dtype=float)
+
+class SurrogateModel:
+    """
+    Logistic regression model of the probability that the starter pokemon wins a battle, fitted with Newton's method and an L2 penalty.
+    The features are standardized, and the model is stored as a handful of numbers in a .npz file.
+    """
+
+    def __init__(self, feature_names, mean=None, std=None, weights=None, bias=0.0):
+        """
+        A SurrogateModel is initialized with the names of its features and, if already fitted, its parameters.
+
+        Parameters:
+        - feature_names: list of strings with the names of the features.
+        - mean: numpy array with the mean of each feature in the training data.
+        - std: numpy array with the standard deviation of each feature in the training data.
+        - weights: numpy array with the weight of each standardized feature.
+        - bias: float with the intercept.
+        """
+
+        self.feature_names = list(feature_names)
+        self.mean = mean
+        self.std = std
+        self.weights = weights
+        self.bias = bias
+
+    def fit(self, X, y, l2=1e-3, n_iterations=50, tolerance=1e-8):
+        """
+        Fits the model by maximizing the penalized log-likelihood with Newton's method.
+
+        Parameters:
+        - X: numpy array of shape (n_battles, n_features) with the features of the battles.
+        - y: numpy array with the outcome of each battle, 1 if the starter pokemon wins and 0 otherwise.
+        - l2: float with the L2 penalty on the weights, not on the intercept.
+        - n_iterations: integer with the maximum number of Newton steps.
+        - tolerance: float with the maximum change of the parameters at convergence.
+
+        Returns:
+        - self: the fitted model.
+        """
+
+        # standardize the features, leaving constant features unscaled
+        self.mean = X.mean(axis=0)
+        self.std = np.where(X.std(axis=0) > 0, X.std(axis=0), 1.0)
+        Z = np.hstack([np.ones((len(X), 1)), (X - self.mean) / self.std])
+
+        # Newton steps on the penalized negative log-likelihood
+        theta = np.zeros(Z.shape[1])
+        penalty = l2 * len(X) * np.eye(Z.shape[1])
+        penalty[0, 0] = 0
+        for _ in range(n_iterations):
+            p = 1 / (1 + np.exp(-Z @ theta))
+            gradient = Z.T @ (p - y) + penalty @ theta
+            hessian = (Z * (p * (1 - p))[:, None]).T @ Z + penalty
+            step = np.linalg.solve(hessian + 1e-9 * np.eye(len(theta)), gradient)
+            theta -= step
+            if np.abs(step).max() < tolerance:
+                break
+
+        self.bias = float(theta[0])
+        self.weights = theta[1:]
+        return self
+
+    def predict_proba(self, X):
+        """
+        Predicts the probability that the starter pokemon wins each battle.
+
+        Parameters:
+        - X: numpy array of shape (n_battles, n_features) with the features of the battles.
+
+        Returns:
+        - p: numpy array with the win probability of each battle.
+        """
+
+        return 1 / (1 + np.exp(-(((X - self.mean) / self.std) @ self.weights + self.bias)))
+
+    def save(self, path, metadata=None):
+        """
+        Saves the model in a compressed .npz file.
+
+        Parameters:
+        - path: path to the .npz file.
+        - metadata: dictionary with information about the training, saved as a json string (e.g., the seed of the moves).
+        """
+
+        np.savez_compressed(path, feature_names=np.array(self.feature_names), mean=self.mean, std=self.std, weights=self.weights, bias=np.array(self.bias), metadata=np.array(json.dumps(metadata or {})))
+
+    @staticmethod
+    def load(path):
+        """
+        Loads a model saved by save.
+
+        Parameters:
+        - path: path to the .npz file.
+
+        Returns:
+        - model: SurrogateModel object.
+        - metadata: dictionary with the information about the training.
+        """
+
+        data = np.load(path)
+        model = SurrogateModel(data["feature_names"].tolist(), data["mean"], data["std"], data["weights"], float(data["bias"]))
+        return model, json.loads(str(data["metadata"]))
+
+def calibration_report(y, p, n_bins=10):
+    """
+    Compares the predicted win probabilities with the observed outcomes.
+
+    Parameters:
+    - y: numpy array with the outcome of each battle.
+    - p: numpy array with the predicted win probability of each battle.
+    - n_bins: integer with the number of equal-width bins of predicted probability.
+
+    Returns:
+    - report: dictionary with the Brier score, the log loss, the expected calibration error and the mean prediction and outcome of each bin.
+    """
+
+    # assign each prediction to its bin
+    bins = np.minimum((p * n_bins).astype(int), n_bins - 1)
+    table = []
+    calibration_error = 0.0
+    for b in range(n_bins):
+        in_bin = bins == b
+        if in_bin.any():
+            table.append({"bin": [b / n_bins, (b + 1) / n_bins], "n": int(in_bin.sum()), "mean_predicted": float(p[in_bin].mean()), "observed": float(y[in_bin].mean())})
+            calibration_error += in_bin.mean() * abs(p[in_bin].mean() - y[in_bin].mean())
+
+    # scores of the predictions
+    clipped = np.clip(p, 1e-12, 1 - 1e-12)
+    return {
+        "n": int(len(y)),
+        "brier_score": float(((p - y) ** 2).mean()),
+        "brier_score_base_rate": float(((y.mean() - y) ** 2).mean()),
+        "log_loss": float(-(y * np.log(clipped) + (1 - y) * np.log(1 - clipped)).mean()),
+        "expected_calibration_error": float(calibration_error),
+        "bins": table
+    }
+
+def parse_query(query):
+    """
+    Parses a matchup query of the form "starter:level,wild:level".
+
+    Parameters:
+    - query: string with the query.
+
+    Returns:
+    - matchup: tuple (starter_name, starter_level, wild_name, wild_level).
+    """
+
+    starter, wild = query.split(",")
+    starter_name, starter_level = starter.split(":")
+    wild_name, wild_level = wild.split(":")
+    return starter_name, int(starter_level), wild_name, int(wild_level)
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Trains and queries a surrogate model of the win probability of a battle.")
+
+    # arguments
+    parser.add_argument("-i", "--input_data", type=str, required=False, default=None, help="Path to the collected data of a simulation, with a row for each turn or for each battle. If given, a new model is trained.")
+    parser.add_argument("-m", "--model", type=str, required=False, default=os.path.join("results", "surrogate.npz"), help="Path to the .npz file of the model.")
+    parser.add_argument("--query", type=str, nargs="+", required=False, default=[], help="Matchups to query, each of the form starter:level,wild:level, e.g., charmander:12,geodude:15.")
+    parser.add_argument("--test_fraction", type=float, required=False, default=0.2, help="Fraction of the games held out to check the calibration of the model.")
+    parser.add_argument("--l2", type=float, required=False, default=1e-3, help="L2 penalty of the logistic regression.")
+    parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed used in the simulation, needed to draw the same moves of the pokemons.")
+    parser.add_argument("--input_pokemons", type=str, required=False, default=os.path.join("..", "data", "pokemons.json"), help="Path to the dataset with pokemons.")
+    parser.add_argument("--input_moves", type=str, required=False, default=os.path.join("..", "data", "moves.json"), help="Path to the dataset with moves.")
+    parser.add_argument("--input_type_effectiveness", type=str, required=False, default=os.path.join("..", "data", "type_effectiveness.json"), help="Path to the dataset with type effectiveness pairs.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # the seed of the moves is the one of the training data, stored with the model
+    random_seed = args.random_seed
+    if args.input_data is None:
+        model, metadata = SurrogateModel.load(args.model)
+        random_seed = metadata["random_seed"]
+
+    # load the data, drawing the moves of the pokemons as done by simulations.py
+    random.seed(random_seed)
+    moves = load_moves(args.input_moves)
+    pokemons = load_pokemons(args.input_pokemons, moves)
+    type_effectiveness = load_type_effectiveness(args.input_type_effectiveness)
+    builder = FeatureBuilder(pokemons, type_effectiveness)
+
+    # train a new model on the battles of the simulation
+    if args.input_data is not None:
+        battles = pd.read_csv(args.input_data).drop_duplicates(subset=["Game", "Battle"]).reset_index(drop=True)
+        X = builder.features(battles["Starter Pokemon"], battles["Starter Level"], battles["Wild Pokemon"], battles["Wild Level"])
+        y = battles["Battle Outcome"].to_numpy(dtype=float)
+
+        # hold out the last games to check the calibration
+        test = (battles["Game"] > battles["Game"].quantile(1 - args.test_fraction)).to_numpy()
+        model = SurrogateModel(FeatureBuilder.feature_names).fit(X[~test], y[~test], args.l2)
+        report = calibration_report(y[test], model.predict_proba(X[test]))
+        report["n_train"] = int((~test).sum())
+
+        # save the model and the calibration check
+        os.makedirs(os.path.dirname(args.model) or ".", exist_ok=True)
+        model.save(args.model, {"random_seed": random_seed, "input_data": args.input_data, "calibration": {key: value for key, value in report.items() if key != "bins"}})
+        with open(os.path.splitext(args.model)[0] + "_calibration.json", "w") as file:
+            json.dump(report, file, indent=4)
+        print(f"Trained on {report['n_train']} battles, checked on {report['n']} held-out battles.")
+        print(f"Brier score {report['brier_score']:.4f} (base rate {report['brier_score_base_rate']:.4f}), log loss {report['log_loss']:.4f}, expected calibration error {report['expected_calibration_error']:.4f}")
+        for row in report["bins"]:
+            print(f"  predicted {row['bin'][0]:.1f}-{row['bin'][1]:.1f}: {row['n']} battles, mean predicted {row['mean_predicted']:.3f}, observed {row['observed']:.3f}")
+
+    # answer the queries in a single batch
+    if args.query:
+        matchups = [parse_query(query) for query in args.query]
+        start_time = time.perf_counter()
+        probabilities = model.predict_proba(builder.features(*zip(*matchups)))
+        elapsed = time.perf_counter() - start_time
+        for (starter_name, starter_level, wild_name, wild_level), probability in zip(matchups, probabilities):
+            print(f"{starter_name} L{starter_level} vs {wild_name} L{wild_level}: {probability * 100:.1f}% win probability")
+        print(f"{len(matchups)} queries in {elapsed * 1e6:.0f} microseconds")
@@ -0,0 +1,286 @@
+import os
+import time
+import random
+import argparse
+import multiprocessing
+import numpy as np
+import pandas as pd
+from simulations import load_moves, load_pokemons, load_type_effectiveness, compute_can_damage, to_pokemon_character, run_battle
+
+class EloRatings:
+    """
+    Class to update the Elo rating of each species incrementally, one battle at a time.
+    """
+
+    def __init__(self, species, k=16.0, initial=1500.0):
+        """
+        EloRatings are initialized with the same rating for all species.
+
+        Parameters:
+        - species: list of strings with the names of the species.
+        - k: float with the maximum change of a rating after a battle.
+        - initial: float with the initial rating of every species.
+        """
+
+        # ratings and update factor
+        self.ratings = {name: initial for name in species}
+        self.k = k
+
+    def update(self, first, second, score):
+        """
+        Updates the ratings of two species after a battle.
+
+        Parameters:
+        - first: string with the name of the first species.
+        - second: string with the name of the second species.
+        - score: float with the score of the first species: 1 for a win, 0.5 for a draw and 0 for a loss.
+        """
+
+        # expected score of the first species given the current ratings
+        expected = 1.0 / (1.0 + 10 ** ((self.ratings[second] - self.ratings[first]) / 400))
+
+        # move both ratings towards the observed score
+        self.ratings[first] += self.k * (score - expected)
+        self.ratings[second] -= self.k * (score - expected)
+
+def bradley_terry(wins, n_iterations=1000, tolerance=1e-9, prior=0.5):
+    """
+    Fits the strengths of a Bradley-Terry model with the minorization-maximization algorithm (Hunter, 2004).
+    The probability that species i beats species j is p_i / (p_i + p_j).
+
+    Parameters:
+    - wins: numpy array of shape (n, n) such that wins[i, j] is the number of battles won by i against j, with draws counted as half a win for each species.
+    - n_iterations: integer with the maximum number of iterations.
+    - tolerance: float with the maximum change of the log-strengths at convergence.
+    - prior: float with the number of virtual wins added in both directions to each pair that has battled, so that species without wins or losses get finite strengths.
+
+    Returns:
+    - ratings: numpy array with the strength of each species on the Elo scale, 400 * log10(p_i) + 1500, with geometric mean of the strengths equal to 1.
+    """
+
+    # add the virtual wins to the pairs that have battled
+    wins = wins.astype(float)
+    battled = (wins + wins.T) > 0
+    wins = wins + prior * battled
+    games = wins + wins.T
+    total_wins = wins.sum(axis=1)
+
+    # iterate the minorization-maximization updates
+    strengths = np.ones(len(wins))
+    for _ in range(n_iterations):
+        denominators = (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+        new_strengths = np.where(denominators > 0, total_wins / np.where(denominators > 0, denominators, 1.0), strengths)
+        new_strengths /= np.exp(np.log(new_strengths).mean())
+        converged = np.abs(np.log(new_strengths) - np.log(strengths)).max() < tolerance
+        strengths = new_strengths
+        if converged:
+            break
+
+    return 400 * np.log10(strengths) + 1500
+
+def rank_correlation(first, second):
+    """
+    Computes the Spearman rank correlation between two ratings of the same species.
+
+    Parameters:
+    - first: numpy array with the first ratings.
+    - second: numpy array with the second ratings.
+
+    Returns:
+    - correlation: float with the rank correlation.
+    """
+
+    return pd.Series(first).rank().corr(pd.Series(second).rank())
+
+# data shared by all the battles run by a worker process, set once by init_tournament_worker
+worker_data = {}
+
+def init_tournament_worker(pokemons, type_effectiveness, can_damage, level, max_turns):
+    """
+    Initializes a worker process of the tournament, storing the data shared by all battles.
+
+    Parameters:
+    - pokemons: list of dictionaries with the species, each with its moves.
+    - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+    - can_damage: dictionary returned by compute_can_damage.
+    - level: integer with the level of all pokemons.
+    - max_turns: integer with the maximum number of turns of a battle.
+    """
+
+    # store the data in the global dictionary of the worker
+    worker_data.update(pokemons=pokemons, type_effectiveness=type_effectiveness, can_damage=can_damage, level=level, max_turns=max_turns)
+
+def play_pairs(job):
+    """
+    Plays a battle for each pair of a chunk, in both orders, since the first pokemon moves first at each turn.
+
+    Parameters:
+    - job: tuple with the list of pairs (i, j) of indices of species and the random seed of the chunk.
+
+    Returns:
+    - results: list of tuples (i, j, score), where score is the score of i when moving first against j.
+    """
+
+    # set the random seed of the chunk
+    pairs, seed = job
+    random.seed(seed)
+    pokemons = worker_data["pokemons"]
+
+    # play the battles, with fresh pokemons at full hp
+    results = []
+    for i, j in pairs:
+        for first, second in [(i, j), (j, i)]:
+            input_pokemon = to_pokemon_character({**pokemons[first], "level": worker_data["level"]})
+            opponent = to_pokemon_character({**pokemons[second], "level": worker_data["level"]})
+            outcome, _, _, _, is_draw = run_battle(input_pokemon, opponent, worker_data["type_effectiveness"], worker_data["can_damage"], worker_data["max_turns"])
+            results.append((first, second, 0.5 if is_draw else float(outcome)))
+
+    return results
+
+def run_tournament(pokemons, type_effectiveness, level=10, max_rounds=20, min_rounds=3, stability=0.999, patience=2, max_turns=1000, random_seed=27, n_workers=1, chunk_size=500, elo_k=16.0):
+    """
+    Runs round-robin rounds between all species until their ranking stabilizes.
+    In each round, every pair of species battles twice, once with each species moving first.
+    Results are streamed in the order of the chunks into Elo ratings, and a Bradley-Terry model is fitted on all results after each round.
+    The tournament stops when the rank correlation between the Bradley-Terry ratings of consecutive rounds is at least stability for patience rounds.
+
+    Parameters:
+    - pokemons: pandas dataframe with the species, each with its moves.
+    - type_effectiveness: pandas dataframe with the type effectiveness pairs.
+    - level: integer with the level of all pokemons.
+    - max_rounds: integer with the maximum number of rounds.
+    - min_rounds: integer with the minimum number of rounds.
+    - stability: float with the rank correlation above which two consecutive rankings are considered the same.
+    - patience: integer with the number of consecutive stable rounds needed to stop.
+    - max_turns: integer with the maximum number of turns of a battle, after which it is a draw.
+    - random_seed: integer with the random seed of the tournament.
+    - n_workers: integer with the number of worker processes.
+    - chunk_size: integer with the number of pairs of a chunk sent to a worker.
+    - elo_k: float with the update factor of the Elo ratings.
+
+    Returns:
+    - ranking: pandas dataframe with a row for each species, sorted by Bradley-Terry rating.
+    - history: list of dictionaries with the statistics of each round.
+    """
+
+    # species and pairs of the round robin
+    records = pokemons.to_dict(orient="records")
+    species = [pokemon["name"] for pokemon in records]
+    n = len(species)
+    pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+
+    # statistics of the tournament
+    elo = EloRatings(species, elo_k)
+    wins = np.zeros((n, n))
+    counts = {"wins": np.zeros(n), "losses": np.zeros(n), "draws": np.zeros(n)}
+    history = []
+    previous = None
+    stable_rounds = 0
+    rng = random.Random(random_seed)
+
+    # run the rounds in the worker processes, or in the main process with a single worker
+    init_args = (records, type_effectiveness, compute_can_damage(pokemons, type_effectiveness), level, max_turns)
+    pool = multiprocessing.Pool(n_workers, initializer=init_tournament_worker, initargs=init_args) if n_workers > 1 else None
+    if pool is None:
+        init_tournament_worker(*init_args)
+    try:
+        for round in range(1, max_rounds + 1):
+            start_time = time.time()
+
+            # chunks of pairs in a new random order, each with its own seed
+            rng.shuffle(pairs)
+            jobs = [(pairs[k:k + chunk_size], rng.getrandbits(32)) for k in range(0, len(pairs), chunk_size)]
+            results = pool.imap(play_pairs, jobs) if pool is not None else map(play_pairs, jobs)
+
+            # stream the results into the ratings
+            for chunk in results:
+                for first, second, score in chunk:
+                    elo.update(species[first], species[second], score)
+                    wins[first, second] += score
+                    wins[second, first] += 1 - score
+                    if score == 0.5:
+                        counts["draws"][[first, second]] += 1
+                    else:
+                        counts["wins"][first if score == 1 else second] += 1
+                        counts["losses"][second if score == 1 else first] += 1
+
+            # fit the Bradley-Terry model on all results and compare the ranking with the previous round
+            ratings = bradley_terry(wins)
+            correlation = rank_correlation(previous, ratings) if previous is not None else float("nan")
+            stable_rounds = stable_rounds + 1 if correlation >= stability else 0
+            previous = ratings
+            history.append({"round": round, "battles": 2 * len(pairs), "rank_correlation": correlation, "seconds": time.time() - start_time})
+            print(f"Round {round}: {2 * len(pairs)} battles in {history[-1]['seconds']:.1f} s, rank correlation with the previous round {correlation:.5f}")
+
+            # stop when the ranking is stable
+            if round >= min_rounds and stable_rounds >= patience:
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # ranking of the species
+    ranking = pd.DataFrame({
+        "Pokemon": species,
+        "Bradley-Terry Rating": ratings,
+        "Elo Rating": [elo.ratings[name] for name in species],
+        "Wins": counts["wins"],
+        "Losses": counts["losses"],
+        "Draws": counts["draws"]
+    }).sort_values("Bradley-Terry Rating", ascending=False, ignore_index=True)
+    ranking.insert(0, "Rank", range(1, n + 1))
+
+    return ranking, history
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    - parser.parse_args(): ArgumentParser object with parsed arguments.
+    """
+
+    # create the argument parser
+    parser = argparse.ArgumentParser(description="Ranks all species with a round-robin tournament, with Elo and Bradley-Terry ratings.")
+
+    # arguments
+    parser.add_argument("--input_pokemons", type=str, required=False, default=os.path.join("..", "data", "pokemons.json"), help="Path to the dataset with pokemons.")
+    parser.add_argument("--input_moves", type=str, required=False, default=os.path.join("..", "data", "moves.json"), help="Path to the dataset with moves.")
+    parser.add_argument("--input_type_effectiveness", type=str, required=False, default=os.path.join("..", "data", "type_effectiveness.json"), help="Path to the dataset with type effectiveness pairs.")
+    parser.add_argument("-o", "--output", type=str, required=False, default=os.path.join("results", "tournament.csv"), help="Path to the .csv file where to save the ranking.")
+    parser.add_argument("--species", type=str, nargs="+", required=False, default=None, help="Names of the species of the tournament. If not set, all species take part.")
+    parser.add_argument("--level", type=int, required=False, default=10, help="Level of all pokemons.")
+    parser.add_argument("--max_rounds", type=int, required=False, default=20, help="Maximum number of round-robin rounds.")
+    parser.add_argument("--min_rounds", type=int, required=False, default=3, help="Minimum number of round-robin rounds.")
+    parser.add_argument("--stability", type=float, required=False, default=0.999, help="Rank correlation between consecutive rounds above which the ranking is considered stable.")
+    parser.add_argument("--patience", type=int, required=False, default=2, help="Number of consecutive stable rounds needed to stop.")
+    parser.add_argument("--max_turns", type=int, required=False, default=1000, help="Maximum number of turns of a battle, after which it is a draw.")
+    parser.add_argument("--random_seed", type=int, required=False, default=27, help="Random seed, used to draw the moves and the battles.")
+    parser.add_argument("--n_workers", type=int, required=False, default=1, help="Number of worker processes.")
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    # parse command line arguments
+    args = parse_args()
+
+    # set the random seed and load the data, drawing the moves of the species
+    random.seed(args.random_seed)
+    moves = load_moves(args.input_moves)
+    pokemons = load_pokemons(args.input_pokemons, moves)
+    type_effectiveness = load_type_effectiveness(args.input_type_effectiveness)
+    if args.species is not None:
+        missing = set(args.species) - set(pokemons["name"])
+        if missing:
+            raise ValueError(f"Unknown species {sorted(missing)}.")
+        pokemons = pokemons[pokemons["name"].isin(args.species)].reset_index(drop=True)
+
+    # run the tournament
+    ranking, history = run_tournament(pokemons, type_effectiveness, args.level, args.max_rounds, args.min_rounds, args.stability, args.patience, args.max_turns, args.random_seed, args.n_workers)
+
+    # save the ranking
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    ranking.to_csv(args.output, index=False)
+    print(ranking.head(10).to_string(index=False))
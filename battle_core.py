@@ -0,0 +1,173 @@
+import math
+import random
+from operator import attrgetter
+
+# functions of the hot path bound once; draw is the method of the global random generator, so random.seed still applies to it
+draw = random.random
+floor = math.floor
+
+def compile_effectiveness(type_effectiveness):
+    """
+    Converts a type chart into a flat dictionary for fast lookups.
+
+    Parameters:
+    - type_effectiveness: type chart as a dictionary of dictionaries, such that type_effectiveness["attack_type"]["defend_type"] is the effectiveness (assignment 3),
+                          as a pandas dataframe with columns "attack", "defend" and "effectiveness" (assignment 4), or None if there is no type chart.
+
+    Returns:
+    - effectiveness: dictionary such that effectiveness[(attack_type, defend_type)] is the effectiveness, or None if there is no type chart.
+    """
+
+    if type_effectiveness is None:
+        return None
+    if isinstance(type_effectiveness, dict):
+        return {(attack_type, defend_type): effect for attack_type, row in type_effectiveness.items() for defend_type, effect in row.items()}
+    return {(row["attack"], row["defend"]): row["effectiveness"] for row in type_effectiveness.to_dict(orient="records")}
+
+class RuleSet:
+    """
+    Class with the precompiled rules of a battle, shared by the PokemonCharacter classes of all the assignments:
+    which stats are used, the type chart, the critical hits and whether pps are consumed.
+    The terms of the damage formula that do not depend on the random draws are compiled once for each attacker, move and defender, and then reused.
+    """
+
+    def __init__(self, stat_model="base", type_effectiveness=None, crit_model="speed", track_pps=True, stab=1.5, luck_range=(0.85, 1.0), max_compiled=200000, draws=None):
+        """
+        A RuleSet is initialized by compiling its rules.
+
+        Parameters:
+        - stat_model: string with the stats used in the damage formula, "base" for base_stats (assignments 1-3) or "active" for active_stats, that depend on the level (assignment 4).
+        - type_effectiveness: type chart (see compile_effectiveness), or None for no type chart (assignments 1-2).
+        - crit_model: string with the model of critical hits, "speed" for a probability of speed / 512 of doubling the damage, or None for no critical hits.
+        - track_pps: boolean indicating whether using a move consumes one of its pps (assignments 1-2).
+        - stab: float with the multiplier of the damage when the type of the move is one of the types of the attacker.
+        - luck_range: tuple with the minimum and maximum random multiplier of the damage.
+        - max_compiled: integer with the maximum number of compiled moves kept, after which they are discarded.
+        - draws: tuple with the functions with no arguments returning the uniform numbers in [0, 1) that decide whether a move hits, whether it is a critical hit and its luck,
+                 or None to draw all of them from the random module (see block_rng.BlockRuleSet for another source).
+        """
+
+        self.stats = attrgetter("base_stats" if stat_model == "base" else "active_stats")
+        self.effectiveness = compile_effectiveness(type_effectiveness)
+        self.crit_model = crit_model
+        self.track_pps = track_pps
+        self.stab = stab
+        self.luck_min = luck_range[0]
+        self.luck_width = luck_range[1] - luck_range[0]
+        self.max_compiled = max_compiled
+        self.compiled = {}
+
+        # functions drawing the accuracy, the critical hits and the luck
+        self.draw_accuracy, self.draw_critical, self.draw_luck = draws if draws is not None else (draw, draw, draw)
+
+    def compile_move(self, attacker, move_name, defender):
+        """
+        Compiles the terms of the damage formula of a move of the attacker that do not depend on the random draws.
+
+        Parameters:
+        - attacker: PokemonCharacter object using the move.
+        - move_name: string with the name of the move.
+        - defender: PokemonCharacter object receiving the move.
+
+        Returns:
+        - terms: tuple returned by compile_terms.
+        """
+
+        # get the selected move from the moves of the attacker
+        move = None
+        for m in attacker.moves:
+            if m["name"] == move_name:
+                move = m
+                break
+
+        return self.compile_terms(attacker, move, defender)
+
+    def compile_terms(self, attacker, move, defender):
+        """
+        Compiles the terms of the damage formula of a move that do not depend on the random draws.
+        They are also used by the policies (see policies.ExpectedDamageTable), so that their damages are the ones of use_move.
+
+        Parameters:
+        - attacker: PokemonCharacter object using the move.
+        - move: dictionary representing the move, not necessarily one of the moves of the attacker.
+        - defender: PokemonCharacter object receiving the move.
+
+        Returns:
+        - terms: tuple with the accuracy of the move, the probability of a critical hit (None if there are no critical hits),
+                 the base damage and the product of the stab and effectiveness multipliers.
+        """
+
+        # effectiveness against the types of the defender
+        effect = 1
+        if self.effectiveness is not None:
+            for defender_type in defender.types:
+                effect *= self.effectiveness[(move["type"], defender_type)]
+
+        # terms of the damage formula, computed in the same order as the original formula so that the damages are the same
+        attacker_stats = self.stats(attacker)
+        defender_stats = self.stats(defender)
+        stability = self.stab if move["type"] in attacker.types else 1.0
+        attack = attacker_stats["attack"] if move["category"] == "physical" else attacker_stats["special"]
+        defense = defender_stats["defense"] if move["category"] == "physical" else defender_stats["special"]
+        base = (2 * attacker.level + 10) / 250 * (attack / defense) * move["power"] + 2
+        critical_probability = attacker_stats["speed"] / 512 if self.crit_model == "speed" else None
+
+        return move["accuracy"], critical_probability, base, stability * effect
+
+    def use_move(self, attacker, move_name, defender):
+        """
+        Makes the attacker use a move against the defender, drawing whether it hits, whether it is a critical hit and its luck, in this order, with the functions in draws.
+
+        Parameters:
+        - attacker: PokemonCharacter object using the move.
+        - move_name: string with the name of the move.
+        - defender: PokemonCharacter object receiving the move.
+
+        Returns:
+        - damage: integer with the damage dealt to the defender, or None if the move missed.
+        """
+
+        # compiled terms of the move
+        key = (attacker.name, attacker.level, move_name, defender.name, defender.level)
+        terms = self.compiled.get(key)
+        if terms is None:
+            if len(self.compiled) >= self.max_compiled:
+                self.compiled.clear()
+            terms = self.compiled[key] = self.compile_move(attacker, move_name, defender)
+        accuracy, critical_probability, base, stability_effect = terms
+
+        # reduce the pps of the move, independently of whether the move succeeds or not
+        if self.track_pps:
+            attacker.curr_pps[move_name] -= 1
+
+        # the move succeeds with a probability equal to its accuracy
+        if self.draw_accuracy() >= accuracy:
+            return None
+
+        # apply the damage to the defender
+        critical = 2 if critical_probability is not None and self.draw_critical() < critical_probability else 1
+        damage = floor(base * (stability_effect * critical * (self.luck_min + self.luck_width * self.draw_luck())))
+        defender.curr_hp -= damage
+        return damage
+
+# rule sets compiled for each type chart, kept with the type chart so that its id is not reused
+compiled_rules = {}
+
+def rules_for(type_effectiveness, stat_model, track_pps):
+    """
+    Returns the rule set of a type chart, compiling it the first time.
+
+    Parameters:
+    - type_effectiveness: type chart (see compile_effectiveness), or None.
+    - stat_model: string with the stats used in the damage formula (see RuleSet).
+    - track_pps: boolean indicating whether using a move consumes one of its pps.
+
+    Returns:
+    - rules: RuleSet object.
+    """
+
+    key = (id(type_effectiveness), stat_model, track_pps)
+    entry = compiled_rules.get(key)
+    if entry is None:
+        entry = compiled_rules[key] = (type_effectiveness, RuleSet(stat_model, type_effectiveness, track_pps=track_pps))
+    return entry[1]
@@ -0,0 +1,135 @@
+import json
+import random
+
+class AliasTable:
+    """
+    Class to sample from a discrete distribution in constant time with the alias method (Walker, Vose).
+    The table is built once in linear time, then each sample needs a single uniform draw.
+    """
+
+    def __init__(self, weights):
+        """
+        An AliasTable is initialized by building the probability and alias of each outcome from its weight.
+
+        Parameters:
+        - weights: list of non-negative numbers with the (unnormalized) weight of each outcome. At least one weight must be positive.
+        """
+
+        # check the weights
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0 or min(weights) < 0:
+            raise ValueError("The weights must be non-negative and their sum must be positive.")
+
+        # scale the probabilities so that their mean is 1
+        scaled = [w * n / total for w in weights]
+
+        # initialize the probability of keeping each outcome and its alias
+        self.n = n
+        self.probabilities = [1.0] * n
+        self.aliases = list(range(n))
+
+        # split the outcomes in those with less and more than the mean probability
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        # fill each small outcome with the mass of a large one
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.probabilities[s] = scaled[s]
+            self.aliases[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # the remaining outcomes have probability 1 up to rounding errors, already set at initialization
+
+    def sample(self, rng=random):
+        """
+        Samples the index of an outcome.
+
+        Parameters:
+        - rng: random generator to draw from. The default is the random module.
+
+        Returns:
+        - index: integer with the index of the sampled outcome.
+        """
+
+        # a single uniform draw gives both the column and the coin flip
+        u = rng.random() * self.n
+        i = int(u)
+        return i if u - i < self.probabilities[i] else self.aliases[i]
+
+class EncounterTable:
+    """
+    Class to sample wild pokemon encounters, with a species and a level, in constant time.
+    """
+
+    def __init__(self, entries):
+        """
+        An EncounterTable is initialized by building the alias table of its entries.
+
+        Parameters:
+        - entries: list of dictionaries, each with:
+                   - "pokemon": the pokemon returned when the entry is sampled (e.g., its name or its record);
+                   - "weight": number with the (unnormalized) probability of the entry. The default is 1;
+                   - "levels": tuple with the minimum and the maximum level of the pokemon, sampled uniformly. If missing, the level is None.
+        """
+
+        # pokemons and level ranges of the entries, stored in lists for constant-time access
+        self.pokemons = [entry["pokemon"] for entry in entries]
+        self.levels = [tuple(entry["levels"]) if entry.get("levels") is not None else None for entry in entries]
+
+        # alias table over the entries
+        self.alias_table = AliasTable([entry.get("weight", 1.0) for entry in entries])
+
+    def sample(self, rng=random):
+        """
+        Samples an encounter.
+
+        Parameters:
+        - rng: random generator to draw from. The default is the random module.
+
+        Returns:
+        - pokemon: the pokemon of the sampled entry.
+        - level: integer with the level of the pokemon, or None if the entry has no level range.
+        """
+
+        # sample the entry and then its level
+        i = self.alias_table.sample(rng)
+        levels = self.levels[i]
+        return self.pokemons[i], (rng.randint(*levels) if levels is not None else None)
+
+def load_encounter_weights(path):
+    """
+    Loads the encounter weights of each habitat from a .json file.
+    Each line of the file is a dictionary with keys "habitat", "name", "weight", "min_level" and "max_level".
+
+    Parameters:
+    - path: path to the .json file with the encounter weights.
+
+    Returns:
+    - habitats: dictionary with, for each habitat, the list of its entries with keys "name", "weight" and "levels".
+    """
+
+    # initialize the dictionary that will contain the entries of each habitat
+    habitats = {}
+
+    # open the .json file
+    with open(path, "r") as file:
+
+        # iterate through lines
+        for line in file:
+
+            # convert the line into a dictionary and add it to the entries of its habitat
+            entry = json.loads(line)
+            habitats.setdefault(entry["habitat"], []).append({
+                "name": entry["name"],
+                "weight": entry["weight"],
+                "levels": (entry["min_level"], entry["max_level"])
+            })
+
+    return habitats
@@ -0,0 +1,284 @@
+import time
+
+class SearchTimeout(Exception):
+    """
+    Exception raised inside the search when the time budget of a decision expires.
+    """
+
+class ExpectimaxSearch:
+    """
+    Class to choose the action of a pokemon by searching ahead over the battle state with expectimax.
+    The searching pokemon maximizes its probability of winning, while the opponent is a chance node choosing uniformly among its available moves,
+    as the opponents of the game do. Every move is a chance node over accuracy, critical hits and luck.
+    The search deepens iteratively until the time budget expires and returns the best action of the deepest completed iteration.
+    Values are stored in a transposition table keyed on a compact encoding of the state: (hps, pps, potions, depth).
+    """
+
+    # index of the action that uses a potion, all other actions are the indices of the moves
+    potion = -1
+
+    def __init__(self, damage_outcomes, max_hp, time_budget=0.05, max_depth=10, track_pps=True, potion_heal=20, max_table_size=500000):
+        """
+        An ExpectimaxSearch is initialized with the rules of the battle and the limits of the search.
+
+        Parameters:
+        - damage_outcomes: function (attacker, move, defender) -> list of tuples (probability, damage) with all possible damages of the move.
+        - max_hp: function (pokemon) -> integer with the maximum hp of the pokemon.
+        - time_budget: float with the maximum number of seconds of a decision. If None, the search always reaches max_depth.
+        - max_depth: integer with the maximum number of moves of the searching pokemon to look ahead.
+        - track_pps: boolean indicating whether using a move consumes one of its pps.
+        - potion_heal: integer with the hps restored by a potion.
+        - max_table_size: integer with the maximum number of entries of the transposition table, cleared when it is full.
+        """
+
+        # rules of the battle
+        self.damage_outcomes = damage_outcomes
+        self.max_hp = max_hp
+        self.track_pps = track_pps
+        self.potion_heal = potion_heal
+
+        # limits of the search
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.max_table_size = max_table_size
+
+        # transposition table, valid only for the pair of pokemons it has been filled for
+        self.table = {}
+        self.context = None
+
+        # statistics of the last decision
+        self.nodes = 0
+        self.depth_reached = 0
+
+    def choose(self, me, opponent, my_pps=None, opponent_pps=None, my_potions=0):
+        """
+        Chooses the action of the searching pokemon in the current state.
+
+        Parameters:
+        - me: PokemonCharacter object representing the searching pokemon.
+        - opponent: PokemonCharacter object representing the opponent pokemon.
+        - my_pps: dictionary with the current pps of the moves of the searching pokemon, as in curr_pps. Ignored if track_pps is False.
+        - opponent_pps: dictionary with the current pps of the moves of the opponent pokemon. Ignored if track_pps is False.
+        - my_potions: integer with the number of potions that the searching pokemon can use.
+
+        Returns:
+        - action: string with the name of the chosen move, or "potion".
+        """
+
+        # the transposition table is valid only for the same pokemons at the same levels
+        context = (me.name, me.level, opponent.name, opponent.level)
+        if context != self.context or len(self.table) > self.max_table_size:
+            self.table = {}
+            self.context = context
+
+        # possible damages of all moves, computed once per decision
+        self.my_outcomes = [self.damage_outcomes(me, move, opponent) for move in me.moves]
+        self.opponent_outcomes = [self.damage_outcomes(opponent, move, me) for move in opponent.moves]
+        self.my_max_hp = self.max_hp(me)
+        self.opponent_max_hp = self.max_hp(opponent)
+
+        # compact encoding of the current state
+        my_pps = tuple(my_pps[move["name"]] for move in me.moves) if self.track_pps else ()
+        opponent_pps = tuple(opponent_pps[move["name"]] for move in opponent.moves) if self.track_pps else ()
+        state = (me.curr_hp, opponent.curr_hp, my_pps, opponent_pps, my_potions)
+
+        # the first available action is the answer if not even the first iteration completes
+        actions = self.actions(state)
+        if not actions:
+            return me.moves[0]["name"]
+        best_action = actions[0]
+
+        # deepen the search until the time budget expires
+        self.deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        self.nodes = 0
+        self.depth_reached = 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                action, value = self.root(state, depth)
+            except SearchTimeout:
+                break
+            best_action = action
+            self.depth_reached = depth
+
+            # the outcome of the battle is certain, so there is no need to look further
+            if value <= 0 or value >= 1:
+                break
+
+        return "potion" if best_action == ExpectimaxSearch.potion else me.moves[best_action]["name"]
+
+    def actions(self, state):
+        """
+        Lists the actions of the searching pokemon in the input state.
+
+        Parameters:
+        - state: tuple with the compact encoding of the state.
+
+        Returns:
+        - actions: list of integers with the indices of the usable moves and, if useful, ExpectimaxSearch.potion.
+        """
+
+        # moves with pps left, or all moves if pps are not tracked
+        my_hp, _, my_pps, _, potions = state
+        actions = [i for i in range(len(self.my_outcomes)) if not self.track_pps or my_pps[i] > 0]
+
+        # a potion is useful only if the pokemon is not at full hps
+        if potions > 0 and my_hp < self.my_max_hp:
+            actions.append(ExpectimaxSearch.potion)
+
+        return actions
+
+    def heuristic(self, state):
+        """
+        Estimates the probability of winning in a state at the search horizon from the fractions of hps left.
+
+        Parameters:
+        - state: tuple with the compact encoding of the state.
+
+        Returns:
+        - value: float in [0, 1].
+        """
+
+        my_hp, opponent_hp = state[0], state[1]
+        return 0.5 + 0.5 * (my_hp / self.my_max_hp - opponent_hp / self.opponent_max_hp)
+
+    def tick(self):
+        """
+        Counts a node and raises SearchTimeout if the time budget has expired, checking the clock once every 256 nodes.
+        """
+
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % 256 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def root(self, state, depth):
+        """
+        Evaluates all actions in the current state.
+
+        Parameters:
+        - state: tuple with the compact encoding of the state.
+        - depth: integer with the number of moves of the searching pokemon to look ahead.
+
+        Returns:
+        - action: integer with the best action.
+        - value: float with the probability of winning with the best action.
+        """
+
+        # evaluate every action and keep the best one, the first one in case of ties
+        best_action, best_value = None, -1.0
+        for action in self.actions(state):
+            value = self.action_value(state, action, depth)
+            if value > best_value:
+                best_action, best_value = action, value
+
+        return best_action, best_value
+
+    def value(self, state, depth):
+        """
+        Computes the probability of winning when the searching pokemon has to act in the input state.
+
+        Parameters:
+        - state: tuple with the compact encoding of the state.
+        - depth: integer with the number of moves of the searching pokemon to look ahead.
+
+        Returns:
+        - value: float with the probability of winning.
+        """
+
+        # look the state up in the transposition table
+        key = (state, depth)
+        if key in self.table:
+            return self.table[key]
+        self.tick()
+
+        # the searching pokemon takes its best action, or lets the opponent act if it has none
+        actions = self.actions(state)
+        if actions:
+            value = max(self.action_value(state, action, depth) for action in actions)
+        else:
+            value = self.opponent_value(state, depth)
+
+        # store the value in the transposition table
+        self.table[key] = value
+        return value
+
+    def action_value(self, state, action, depth):
+        """
+        Computes the probability of winning after the searching pokemon takes the input action.
+
+        Parameters:
+        - state: tuple with the compact encoding of the state.
+        - action: integer with the action.
+        - depth: integer with the number of moves of the searching pokemon to look ahead.
+
+        Returns:
+        - value: float with the probability of winning.
+        """
+
+        my_hp, opponent_hp, my_pps, opponent_pps, potions = state
+
+        # the potion restores the hps of the searching pokemon
+        if action == ExpectimaxSearch.potion:
+            return self.opponent_value((min(my_hp + self.potion_heal, self.my_max_hp), opponent_hp, my_pps, opponent_pps, potions - 1), depth)
+
+        # the move consumes a pp
+        if self.track_pps:
+            my_pps = my_pps[:action] + (my_pps[action] - 1,) + my_pps[action + 1:]
+
+        # expectation over the possible damages of the move
+        value = 0.0
+        for probability, damage in self.my_outcomes[action]:
+            if opponent_hp - damage <= 0:
+                value += probability
+            else:
+                value += probability * self.opponent_value((my_hp, opponent_hp - damage, my_pps, opponent_pps, potions), depth)
+
+        return value
+
+    def opponent_value(self, state, depth):
+        """
+        Computes the probability of winning when the opponent pokemon has to act, choosing uniformly among its usable moves.
+
+        Parameters:
+        - state: tuple with the compact encoding of the state.
+        - depth: integer with the number of moves of the searching pokemon to look ahead, including the current one.
+
+        Returns:
+        - value: float with the probability of winning.
+        """
+
+        my_hp, opponent_hp, my_pps, opponent_pps, potions = state
+
+        # moves that the opponent can use
+        moves = [i for i in range(len(self.opponent_outcomes)) if not self.track_pps or opponent_pps[i] > 0]
+
+        # the opponent cannot act, so the searching pokemon acts again
+        if not moves:
+            return self.next_value(state, depth)
+
+        # expectation over the moves of the opponent and their possible damages
+        value = 0.0
+        for i in moves:
+            next_pps = opponent_pps[:i] + (opponent_pps[i] - 1,) + opponent_pps[i + 1:] if self.track_pps else opponent_pps
+            for probability, damage in self.opponent_outcomes[i]:
+                if my_hp - damage > 0:
+                    value += probability * self.next_value((my_hp - damage, opponent_hp, my_pps, next_pps, potions), depth)
+
+        return value / len(moves)
+
+    def next_value(self, state, depth):
+        """
+        Computes the probability of winning at the beginning of the next move of the searching pokemon.
+
+        Parameters:
+        - state: tuple with the compact encoding of the state.
+        - depth: integer with the number of moves of the searching pokemon to look ahead, including the one just taken.
+
+        Returns:
+        - value: float with the probability of winning.
+        """
+
+        # the horizon is reached, or no pokemon can act anymore
+        if depth <= 1 or (not self.actions(state) and self.track_pps and not any(state[3])):
+            return self.heuristic(state)
+
+        return self.value(state, depth - 1)